@@ -0,0 +1,9 @@
+"""
+Performance benchmarks for text extraction, grading, result listing,
+dashboards and quiz listing.
+
+Run from the backend directory:
+    python -m benchmarks.run
+    python -m benchmarks.run --profile large --repeat 3
+    python -m benchmarks.run --update-baseline
+"""
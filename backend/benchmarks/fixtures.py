@@ -0,0 +1,232 @@
+"""
+Synthetic data for the benchmark suite.
+
+Everything is generated from a seeded RNG so repeated runs measure the same
+workload.
+"""
+
+import json
+import random
+from datetime import timedelta
+
+from django.utils import timezone
+
+from accounts.models import User
+from departments.models import Department
+from quiz.models import Quiz, Question, QuizAttempt
+from students.models import Student
+from teacher.models import Teacher
+
+# Dataset sizes per profile. "small" keeps a full run under a minute for
+# regular use; "large" approximates production volume.
+PROFILES = {
+    'small': {
+        'pdf_pages': 30,
+        'departments': 4,
+        'students': 200,
+        'quizzes': 10,
+        'questions_per_quiz': 100,
+        'attempts': 500,
+    },
+    'large': {
+        'pdf_pages': 300,
+        'departments': 10,
+        'students': 2000,
+        'quizzes': 40,
+        'questions_per_quiz': 300,
+        'attempts': 20000,
+    },
+}
+
+QUESTION_TYPES = ["mcq", "fill", "truefalse", "oneline"]
+
+CLASS_NAME = '10'
+SECTION = 'A'
+
+BULK_BATCH_SIZE = 1000
+
+
+def build_pdf(pages, lines_per_page=45, seed=0):
+    """
+    Build a text PDF with the given number of pages.
+
+    Returns:
+        bytes: PDF file content
+    """
+    import fitz
+
+    rng = random.Random(seed)
+    words = ("photosynthesis chlorophyll energy glucose oxygen carbon dioxide cell membrane "
+             "nucleus enzyme protein reaction molecule atom element compound mixture").split()
+    document = fitz.open()
+    for page_number in range(1, pages + 1):
+        page = document.new_page()
+        page.insert_text((72, 60), f"Chapter {page_number}", fontsize=14)
+        for line in range(lines_per_page):
+            sentence = " ".join(rng.choice(words) for _ in range(12))
+            page.insert_text((72, 84 + line * 15), sentence.capitalize() + ".", fontsize=9)
+    content = document.tobytes()
+    document.close()
+    return content
+
+
+def build_questions(count, rng):
+    """Build a JSON question blob in the format DocumentProcessingService stores."""
+    questions = []
+    for number in range(1, count + 1):
+        question_type = QUESTION_TYPES[number % len(QUESTION_TYPES)]
+        if question_type == 'mcq':
+            options = {letter: f"Option {letter} {number}" for letter in 'ABCD'}
+            answer = options[rng.choice('ABCD')]
+        elif question_type == 'truefalse':
+            options = {}
+            answer = rng.choice(['True', 'False'])
+        else:
+            options = {}
+            answer = f"answer {number}"
+        questions.append({
+            'question': f"Benchmark question {number}?",
+            'type': question_type,
+            'options': options,
+            'correct_answer': answer,
+            'explanation': f"Explanation for question {number}.",
+            'question_number': number,
+            'source_page': str(rng.randint(1, 50)),
+        })
+    return questions
+
+
+def build_dataset(profile='small', seed=0):
+    """
+    Create departments, users, students, quizzes, questions and attempts.
+
+    Returns:
+        dict: Users, the quiz used for grading and its questions, and the profile sizes
+    """
+    sizes = PROFILES[profile]
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    departments = Department.objects.bulk_create([
+        Department(
+            name=f"Department {i}",
+            code=f"D{i}",
+            class_name=CLASS_NAME,
+            section=SECTION,
+            created_by='benchmark@example.com',
+            last_modified_by='benchmark@example.com',
+        )
+        for i in range(sizes['departments'])
+    ])
+    # Not every backend returns primary keys from bulk_create
+    departments = list(Department.objects.order_by('department_id'))
+    department_ids = [d.department_id for d in departments]
+
+    admin = User.objects.create_user(email='bench-admin@example.com', role=User.Role.ADMIN)
+    teacher_user = User.objects.create_user(email='bench-teacher@example.com', role=User.Role.TEACHER)
+    student_user = User.objects.create_user(email='bench-student@example.com', role=User.Role.STUDENT)
+
+    Teacher.objects.create(
+        name='Benchmark Teacher',
+        email=teacher_user.email,
+        department_ids=department_ids,
+        class_name=CLASS_NAME,
+        section=SECTION,
+        join_date=now,
+    )
+
+    Student.objects.bulk_create([
+        Student(
+            register_number=f"REG{i:06d}",
+            class_name=CLASS_NAME,
+            section=SECTION,
+            name=f"Student {i}",
+            email=student_user.email if i == 0 else f"student{i}@example.com",
+            department_id=department_ids[i % len(department_ids)],
+        )
+        for i in range(sizes['students'])
+    ], batch_size=BULK_BATCH_SIZE)
+    students = list(Student.objects.order_by('student_id'))
+
+    Quiz.objects.bulk_create([
+        Quiz(
+            title=f"Benchmark quiz {i}",
+            quiz_type={'easy': sizes['questions_per_quiz']},
+            question_type='mixed',
+            no_of_questions=sizes['questions_per_quiz'],
+            class_name=CLASS_NAME,
+            section=SECTION,
+            department_id=department_ids[i % len(department_ids)],
+            quiz_date=now + timedelta(days=rng.randint(-30, 30)),
+            is_published=True,
+            published_at=now,
+            created_by='bench-teacher@example.com',
+        )
+        for i in range(sizes['quizzes'])
+    ])
+    quizzes = list(Quiz.objects.order_by('quiz_id'))
+
+    question_blobs = {}
+    question_rows = []
+    for quiz in quizzes:
+        blob = build_questions(sizes['questions_per_quiz'], rng)
+        question_blobs[quiz.quiz_id] = blob
+        question_rows.append(Question(
+            quiz=quiz,
+            question=json.dumps(blob),
+            question_type='mixed',
+            difficulty='easy',
+            options={},
+            correct_answer='',
+            explanation='',
+            created_by='bench-teacher@example.com',
+        ))
+    Question.objects.bulk_create(question_rows)
+    question_ids = dict(Question.objects.values_list('quiz_id', 'question_id'))
+
+    attempts = []
+    for _ in range(sizes['attempts']):
+        quiz = rng.choice(quizzes)
+        student = rng.choice(students)
+        question_id = question_ids[quiz.quiz_id]
+        # Scores cluster around 65% with a long tail either side
+        skill = min(max(rng.gauss(0.65, 0.18), 0.0), 1.0)
+        answers = []
+        score = 0
+        for question in question_blobs[quiz.quiz_id]:
+            is_correct = rng.random() < skill
+            score += is_correct
+            answers.append({
+                'question_id': question_id,
+                'question_number': question['question_number'],
+                'question': question['question'],
+                'question_type': question['type'],
+                'answer': question['correct_answer'] if is_correct else 'wrong',
+                'correct_answer': question['correct_answer'],
+                'is_correct': is_correct,
+            })
+        attempts.append(QuizAttempt(
+            student=student,
+            quiz=quiz,
+            question_answer=answers,
+            score=score,
+            result='pass' if score >= sizes['questions_per_quiz'] // 2 else 'fail',
+            created_by=student.email,
+            last_modified_by=student.email,
+        ))
+        if len(attempts) >= BULK_BATCH_SIZE:
+            QuizAttempt.objects.bulk_create(attempts)
+            attempts = []
+    if attempts:
+        QuizAttempt.objects.bulk_create(attempts)
+
+    grading_quiz = quizzes[0]
+    return {
+        'sizes': sizes,
+        'admin': admin,
+        'teacher': teacher_user,
+        'student': student_user,
+        'grading_quiz': grading_quiz,
+        'grading_question_id': question_ids[grading_quiz.quiz_id],
+        'grading_questions': question_blobs[grading_quiz.quiz_id],
+    }
@@ -0,0 +1,249 @@
+"""
+Standalone benchmark runner.
+
+Builds a synthetic dataset in a throwaway test database, times each
+benchmark, records its query count and compares both against
+benchmarks/baseline.json. Exits non-zero when a benchmark regresses.
+Wall time may exceed the baseline by --tolerance, or by --min-slack-ms
+when that is more (millisecond-scale benchmarks are noisy); query counts
+must not grow at all.
+
+Usage (from the backend directory):
+    python -m benchmarks.run [--profile small|large] [--repeat N] [--only NAME]
+                             [--tolerance 0.25] [--min-slack-ms 5] [--update-baseline]
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import statistics
+
+import django
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+STORAGE_BUCKET = 'fileupload'
+STORAGE_PDF_PATH = 'benchmark/book.pdf'
+
+
+class QueryCounter:
+    """connection.execute_wrapper that counts queries without keeping their SQL."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _timed(func, repeat):
+    """Run func repeat times inside rolled-back transactions; return timings and query count."""
+    from django.db import connection, transaction
+
+    timings = []
+    queries = None
+    for _ in range(repeat):
+        counter = QueryCounter()
+        with transaction.atomic():
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - started)
+            if queries is None:
+                queries = counter.count
+            transaction.set_rollback(True)
+    return timings, queries
+
+
+def _call_view(view, method, user, path='/', data=None):
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    factory = APIRequestFactory()
+    request = getattr(factory, method)(path, data, format='json') if data is not None else getattr(factory, method)(path)
+    force_authenticate(request, user=user)
+    response = view(request)
+    if response.status_code >= 400:
+        raise RuntimeError(f"{view.__name__} returned {response.status_code}: {getattr(response, 'data', '')}")
+    return response
+
+
+def get_benchmarks(dataset, pdf_content):
+    """
+    Build the benchmark callables.
+
+    The single-page benchmark reads the PDF from the local StorageServer
+    stand-in, which must be running.
+
+    Returns:
+        dict: name -> zero-argument callable
+    """
+    from dashboard.views import dashboard_data
+    from documents.pdf_source import get_block_cache, open_storage_pdf
+    from documents.utils import _extract_text_from_pdf_content, extract_single_page_content
+    from quiz.views import QuizListCreateView
+    from students.views import SubmitQuizAttemptView, ListStudentQuizResultsView
+
+    submit_view = SubmitQuizAttemptView.as_view()
+    results_view = ListStudentQuizResultsView.as_view()
+    quiz_list_view = QuizListCreateView.as_view()
+
+    submission = {
+        'quiz_id': dataset['grading_quiz'].quiz_id,
+        'questions': [
+            {
+                'question_id': dataset['grading_question_id'],
+                'question_number': q['question_number'],
+                'answer': q['correct_answer'] if i % 3 else 'wrong',
+            }
+            for i, q in enumerate(dataset['grading_questions'])
+        ],
+    }
+
+    def extract_text():
+        text = _extract_text_from_pdf_content(pdf_content)
+        if not text or text.startswith('[Error'):
+            raise RuntimeError('PDF extraction failed')
+
+    def extract_single_page_from_storage():
+        # Cold read: no blocks cached from the previous run
+        get_block_cache().clear()
+        with open_storage_pdf(STORAGE_BUCKET, STORAGE_PDF_PATH) as source:
+            text = extract_single_page_content(source, max(1, dataset['pdf_pages'] // 2))
+        if text.startswith('['):
+            raise RuntimeError(f'Single page extraction failed: {text}')
+
+    return {
+        'extract_text_from_pdf': extract_text,
+        'extract_single_page_from_storage': extract_single_page_from_storage,
+        'submit_quiz_attempt': lambda: _call_view(submit_view, 'post', dataset['student'], data=submission),
+        'list_student_quiz_results_admin': lambda: _call_view(results_view, 'get', dataset['admin']),
+        'list_student_quiz_results_student': lambda: _call_view(results_view, 'get', dataset['student']),
+        'dashboard_data_admin': lambda: _call_view(dashboard_data, 'get', dataset['admin']),
+        'dashboard_data_teacher': lambda: _call_view(dashboard_data, 'get', dataset['teacher']),
+        'quiz_list_teacher': lambda: _call_view(quiz_list_view, 'get', dataset['teacher']),
+        'quiz_list_student': lambda: _call_view(quiz_list_view, 'get', dataset['student']),
+    }
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(baseline, path=BASELINE_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def compare(name, result, expected, tolerance, min_slack=0.0):
+    """
+    Compare a result with its baseline entry.
+
+    Returns:
+        list: Regression messages (empty when within budget)
+    """
+    if not expected:
+        return []
+    problems = []
+    allowed_time = max(expected['wall_time'] * (1 + tolerance), expected['wall_time'] + min_slack)
+    if result['wall_time'] > allowed_time:
+        problems.append(
+            f"{name}: wall time {result['wall_time'] * 1000:.1f}ms exceeds baseline "
+            f"{expected['wall_time'] * 1000:.1f}ms (allowed {allowed_time * 1000:.1f}ms)"
+        )
+    if result['queries'] > expected['queries']:
+        problems.append(f"{name}: {result['queries']} queries exceeds baseline {expected['queries']}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run performance benchmarks against a synthetic dataset')
+    parser.add_argument('--profile', default='small', help='Dataset size: small or large')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark (median is reported)')
+    parser.add_argument('--only', action='append', help='Run only the named benchmark (repeatable)')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed wall time increase over baseline before failing')
+    parser.add_argument('--min-slack-ms', type=float, default=5.0,
+                        help='Allowed wall time increase in milliseconds when larger than the tolerance')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic dataset')
+    parser.add_argument('--update-baseline', action='store_true', help='Store these results as the new baseline')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from benchmarks.fixtures import PROFILES, build_dataset, build_pdf
+    from benchmarks.storage_server import StorageServer
+
+    if args.profile not in PROFILES:
+        parser.error(f"Unknown profile '{args.profile}'. Choose from: {', '.join(PROFILES)}")
+
+    # Keep per-request logging out of the measurements
+    logging.disable(logging.WARNING)
+    # Measure storage reads, not the local disk cache
+    settings.STORAGE_CACHE_ENABLED = False
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    results = {}
+    try:
+        print(f"Building '{args.profile}' dataset: {PROFILES[args.profile]}")
+        started = time.perf_counter()
+        dataset = build_dataset(args.profile, seed=args.seed)
+        pdf_content = build_pdf(PROFILES[args.profile]['pdf_pages'], seed=args.seed)
+        print(f"Dataset ready in {time.perf_counter() - started:.1f}s")
+
+        dataset['pdf_pages'] = PROFILES[args.profile]['pdf_pages']
+        with StorageServer() as storage_server:
+            storage_server.put(STORAGE_BUCKET, STORAGE_PDF_PATH, pdf_content)
+            benchmarks = get_benchmarks(dataset, pdf_content)
+            for name, func in benchmarks.items():
+                if args.only and name not in args.only:
+                    continue
+                timings, queries = _timed(func, max(1, args.repeat))
+                results[name] = {
+                    'wall_time': round(statistics.median(timings), 6),
+                    'min_wall_time': round(min(timings), 6),
+                    'queries': queries,
+                }
+                print(f"{name:<36} {results[name]['wall_time'] * 1000:>10.1f}ms  {queries:>7} queries")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    baseline = load_baseline()
+    if args.update_baseline:
+        baseline.setdefault(args.profile, {}).update(results)
+        save_baseline(baseline)
+        print(f"Baseline for '{args.profile}' written to {BASELINE_PATH}")
+        return 0
+
+    expected = baseline.get(args.profile, {})
+    regressions = []
+    for name, result in results.items():
+        regressions.extend(compare(name, result, expected.get(name), args.tolerance, args.min_slack_ms / 1000))
+
+    if regressions:
+        print("\nRegressions:")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    print("\nAll benchmarks within baseline" if expected else "\nNo baseline recorded for this profile")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
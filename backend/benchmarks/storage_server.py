@@ -0,0 +1,161 @@
+"""
+Local stand-in for the Supabase Storage object API.
+
+Serves objects from memory over HTTP with the endpoints SupabaseStorage
+uses (HEAD and ranged GET on /storage/v1/object/<bucket>/<path>, POST to
+upload, DELETE to remove), so storage-backed code paths can be exercised
+and measured without a Supabase project. Requests are counted and bytes
+sent are totalled for assertions.
+
+Example usage:
+    with StorageServer() as server:
+        server.put('fileupload', '1/book.pdf', pdf_bytes)
+        text = extract_single_page_content(open_storage_pdf('fileupload', '1/book.pdf'), 3)
+        print(server.requests, server.bytes_sent)
+"""
+
+import re
+import json
+import hashlib
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_RANGE = re.compile(r"bytes=(\d+)-(\d*)")
+_PREFIX = '/storage/v1/object/'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _key(self):
+        path = self.path.split('?', 1)[0]
+        if not path.startswith(_PREFIX):
+            return None
+        return path[len(_PREFIX):]
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+            self.server.owner.bytes_sent += len(body)
+
+    def _not_found(self):
+        body = json.dumps({'statusCode': '404', 'error': 'not_found', 'message': 'Object not found'}).encode()
+        self._send(404 if self.command == 'HEAD' else 400, body, {'Content-Type': 'application/json'})
+
+    def _object_headers(self, data):
+        return {
+            'ETag': f'"{hashlib.md5(data).hexdigest()}"',
+            'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT',
+            'Content-Type': 'application/pdf',
+            'Accept-Ranges': 'bytes',
+        }
+
+    def do_HEAD(self):
+        self.server.owner.requests[self.command] += 1
+        data = self.server.owner.objects.get(self._key())
+        if data is None:
+            return self._not_found()
+        self.send_response(200)
+        for name, value in self._object_headers(data).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.owner.requests[self.command] += 1
+        data = self.server.owner.objects.get(self._key())
+        if data is None:
+            return self._not_found()
+        headers = self._object_headers(data)
+        match = _RANGE.fullmatch(self.headers.get('Range', ''))
+        if not match:
+            return self._send(200, data, headers)
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+        headers['Content-Range'] = f"bytes {start}-{end}/{len(data)}"
+        self.server.owner.range_requests += 1
+        self._send(206, data[start:end + 1], headers)
+
+    def do_POST(self):
+        self.server.owner.requests[self.command] += 1
+        key = self._key()
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        # Multipart upload: keep the file part's payload
+        boundary = self.headers.get('Content-Type', '').partition('boundary=')[2]
+        if boundary:
+            part = body.split(f"--{boundary}".encode())[1]
+            body = part.split(b'\r\n\r\n', 1)[1].rsplit(b'\r\n', 1)[0]
+        self.server.owner.objects[key] = body
+        self._send(200, json.dumps({'Key': key, 'Id': key}).encode(), {'Content-Type': 'application/json'})
+
+    def do_DELETE(self):
+        self.server.owner.requests[self.command] += 1
+        bucket = self._key()
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        removed = []
+        for path in payload.get('prefixes', []):
+            if self.server.owner.objects.pop(f"{bucket}/{path}", None) is not None:
+                removed.append({'name': path})
+        self._send(200, json.dumps(removed).encode(), {'Content-Type': 'application/json'})
+
+
+class StorageServer:
+    """
+    In-memory Storage server on a background thread.
+
+    Entering the context points settings.SUPABASE_URL/SUPABASE_KEY at the
+    server and resets the shared storage client; leaving restores them.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.objects = {}
+        self.requests = Counter()
+        self.range_requests = 0
+        self.bytes_sent = 0
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.owner = self
+        self._thread = None
+        self._saved = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def put(self, bucket, path, data):
+        self.objects[f"{bucket}/{path}"] = data
+
+    def reset_counters(self):
+        self.requests.clear()
+        self.range_requests = 0
+        self.bytes_sent = 0
+
+    def __enter__(self):
+        from django.conf import settings
+        import config.supabase
+
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self._saved = (settings.SUPABASE_URL, settings.SUPABASE_KEY, config.supabase._storage_client)
+        settings.SUPABASE_URL = self.url
+        settings.SUPABASE_KEY = 'stand-in-key'
+        config.supabase._storage_client = None
+        return self
+
+    def __exit__(self, *exc_info):
+        from django.conf import settings
+        import config.supabase
+
+        settings.SUPABASE_URL, settings.SUPABASE_KEY, config.supabase._storage_client = self._saved
+        self._server.shutdown()
+        self._server.server_close()
+        return False
@@ -0,0 +1,339 @@
+"""
+Offline LLM backends for benchmarking and local development.
+
+These clients mimic the parts of the OpenAI SDK used by LLMGateway
+(chat.completions.create and embeddings.create) and return real SDK response
+objects, so the generation pipeline runs unchanged without network access.
+The backend is chosen with the LLM_BACKEND setting:
+
+    openai     Real OpenAI API (default)
+    synthetic  Generated questions and embeddings with configurable latency
+               and failure rate
+    replay     Responses recorded in LLM_FIXTURE_DIR, keyed by prompt hash
+    record     Real OpenAI API, saving every response to LLM_FIXTURE_DIR
+
+Example usage:
+    LLM_BACKEND=record python manage.py benchmark_generation sample.pdf
+    LLM_BACKEND=replay python manage.py benchmark_generation sample.pdf --runs 5
+"""
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import httpx
+import numpy as np
+import openai
+from django.conf import settings
+from openai.types import CreateEmbeddingResponse
+from openai.types.chat import ChatCompletion
+
+from config.llm_cache import make_cache_key
+from config.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKENDS = ('openai', 'synthetic', 'replay', 'record')
+
+EMBEDDING_DIMENSION = 1536
+
+
+class FixtureNotFoundError(Exception):
+    """Raised in replay mode when no recorded response matches a request."""
+
+
+def _request_key(kind: str, kwargs: Dict[str, Any]) -> str:
+    if kind == 'chat':
+        return make_cache_key(kwargs.get('model'), kwargs.get('messages', []),
+                              kwargs.get('temperature'), kwargs.get('response_format'))
+    payload = json.dumps({'model': kwargs.get('model'), 'input': kwargs.get('input')},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _estimate_tokens(text: str, model: str) -> int:
+    return max(1, count_tokens(text, model))
+
+
+def _fake_response(kind: str, model: str, status_code: int) -> httpx.Response:
+    path = 'chat/completions' if kind == 'chat' else 'embeddings'
+    request = httpx.Request('POST', f'https://api.openai.com/v1/{path}')
+    return httpx.Response(status_code, request=request)
+
+
+class _Client:
+    """Expose create functions under the attribute paths the OpenAI SDK uses."""
+
+    def __init__(self, chat_create, embeddings_create):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=chat_create))
+        self.embeddings = SimpleNamespace(create=embeddings_create)
+
+
+class SyntheticLLMClient(_Client):
+    """
+    Deterministic stand-in for OpenAI.
+
+    Chat requests return well-formed quiz questions of the type named in the
+    prompt, as many as it asks for; embedding requests return unit vectors derived from the input
+    text. Each call sleeps for a latency drawn from the configured
+    distribution and fails with a retryable error at the configured rate.
+    """
+
+    QUESTION_TYPE_PATTERN = re.compile(r"question type must be: '(\w+)'")
+    QUESTION_COUNT_PATTERN = re.compile(r"generate exactly (\d+) questions")
+    SOURCE_PAGE_PATTERN = re.compile(r"Content from page (\w+):")
+
+    def __init__(self, latency_distribution='lognormal', latency_mean=1.5, latency_spread=0.5,
+                 failure_rate=0.0, seed=0):
+        super().__init__(self._chat_create, self._embeddings_create)
+        self.latency_distribution = latency_distribution
+        self.latency_mean = latency_mean
+        self.latency_spread = latency_spread
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        # Identical prompts yield a new question each time, in a fixed sequence
+        self._occurrences = defaultdict(int)
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            latency_distribution=settings.LLM_SYNTHETIC_LATENCY_DISTRIBUTION,
+            latency_mean=settings.LLM_SYNTHETIC_LATENCY_MEAN,
+            latency_spread=settings.LLM_SYNTHETIC_LATENCY_SPREAD,
+            failure_rate=settings.LLM_SYNTHETIC_FAILURE_RATE,
+            seed=settings.LLM_SYNTHETIC_SEED,
+        )
+
+    def _sample_latency(self, rng: random.Random) -> float:
+        if self.latency_mean <= 0:
+            return 0.0
+        if self.latency_distribution == 'fixed':
+            return self.latency_mean
+        if self.latency_distribution == 'uniform':
+            return max(0.0, rng.uniform(self.latency_mean - self.latency_spread,
+                                        self.latency_mean + self.latency_spread))
+        # lognormal: latency_mean is the median, latency_spread the sigma
+        return rng.lognormvariate(np.log(self.latency_mean), self.latency_spread)
+
+    def _simulate(self, kind: str, model: str):
+        with self._rng_lock:
+            latency = self._sample_latency(self._rng)
+            failed = self._rng.random() < self.failure_rate
+        time.sleep(latency)
+        if failed:
+            raise openai.RateLimitError(
+                'Synthetic rate limit',
+                response=_fake_response(kind, model, 429),
+                body=None,
+            )
+
+    def _question(self, question_type: str, digest: str, rng: random.Random) -> Dict[str, Any]:
+        label = digest[:8]
+        if question_type == 'match':
+            left = {chr(65 + i): f"Term {label}{i + 1}" for i in range(4)}
+            right = {str(i + 1): f"Definition {label}{i + 1}" for i in range(4)}
+            shuffled = list(right.values())
+            rng.shuffle(shuffled)
+            return {
+                'question': f"Match the terms with their definitions ({label})",
+                'type': 'match',
+                'question_type': 'match',
+                'options': {},
+                'column_left_labels': left,
+                'column_right_labels': right,
+                'correct_answer': dict(zip(left.values(), shuffled)),
+                'explanation': 'Synthetic match question.',
+            }
+        if question_type == 'mcq':
+            options = {letter: f"Option {letter} for {label}" for letter in 'ABCD'}
+            return {
+                'question': f"Which option is correct for item {label}?",
+                'type': 'mcq',
+                'question_type': 'mcq',
+                'options': options,
+                'correct_answer': options[rng.choice('ABCD')],
+                'explanation': 'Synthetic multiple choice question.',
+            }
+        if question_type == 'truefalse':
+            return {
+                'question': f"Statement {label} is accurate.",
+                'type': 'truefalse',
+                'question_type': 'truefalse',
+                'options': {},
+                'correct_answer': rng.choice(['True', 'False']),
+                'explanation': 'Synthetic true/false question.',
+            }
+        if question_type == 'fill':
+            return {
+                'question': f"The answer to item {label} is _____________.",
+                'type': 'fill',
+                'question_type': 'fill',
+                'options': {},
+                'correct_answer': f"answer-{label}",
+                'explanation': 'Synthetic fill in the blank question.',
+            }
+        return {
+            'question': f"Describe item {label} in one line.",
+            'type': question_type,
+            'question_type': question_type,
+            'options': {},
+            'correct_answer': f"answer-{label}",
+            'explanation': 'Synthetic one line question.',
+        }
+
+    def _chat_create(self, model: str, messages: List[Dict[str, Any]], **kwargs) -> ChatCompletion:
+        self._simulate('chat', model)
+
+        prompt = "\n".join(str(message.get('content', '')) for message in messages)
+        key = make_cache_key(model, messages, kwargs.get('temperature'), kwargs.get('response_format'))
+        with self._rng_lock:
+            occurrence = self._occurrences[key]
+            self._occurrences[key] += 1
+        digest = hashlib.sha256(f"{self.seed}:{key}:{occurrence}".encode('utf-8')).hexdigest()
+        rng = random.Random(digest)
+
+        match = self.QUESTION_TYPE_PATTERN.search(prompt)
+        question_type = match.group(1) if match else 'mcq'
+        count_match = self.QUESTION_COUNT_PATTERN.search(prompt)
+        count = int(count_match.group(1)) if count_match else 1
+        questions = [
+            self._question(question_type, hashlib.sha256(f"{digest}:{i}".encode('utf-8')).hexdigest() if i else digest, rng)
+            for i in range(count)
+        ]
+        source_pages = self.SOURCE_PAGE_PATTERN.findall(prompt)
+        for i, question in enumerate(questions):
+            if source_pages:
+                question['source_page'] = source_pages[i % len(source_pages)]
+        content = json.dumps({'questions': questions})
+
+        prompt_tokens = _estimate_tokens(prompt, model)
+        completion_tokens = _estimate_tokens(content, model)
+        return ChatCompletion.model_validate({
+            'id': f"chatcmpl-synthetic-{digest[:24]}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': content},
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _embeddings_create(self, model: str, input, **kwargs) -> CreateEmbeddingResponse:
+        self._simulate('embedding', model)
+
+        texts = [input] if isinstance(input, str) else list(input)
+        data = []
+        tokens = 0
+        for index, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(str(text).encode('utf-8')).digest()[:8], 'little')
+            vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSION).astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            data.append({'object': 'embedding', 'index': index, 'embedding': vector.tolist()})
+            tokens += _estimate_tokens(str(text), model)
+
+        return CreateEmbeddingResponse.model_validate({
+            'object': 'list',
+            'model': model,
+            'data': data,
+            'usage': {'prompt_tokens': tokens, 'total_tokens': tokens},
+        })
+
+
+class RecordReplayLLMClient(_Client):
+    """
+    Replay recorded responses, or record responses from a real client.
+
+    Fixtures are stored as <fixture_dir>/<kind>/<request hash>.json. In replay
+    mode a request with no fixture raises FixtureNotFoundError, or is served
+    by the fallback client when one is given.
+    """
+
+    def __init__(self, fixture_dir: str, client=None, record: bool = False, fallback=None):
+        super().__init__(self._chat_create, self._embeddings_create)
+        if record and client is None:
+            raise ValueError("Recording requires a client to forward requests to")
+        self.fixture_dir = fixture_dir
+        self.client = client
+        self.record = record
+        self.fallback = fallback
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.fixture_dir, kind, f"{key}.json")
+
+    def _handle(self, kind: str, response_type, forward, fallback, kwargs):
+        key = _request_key(kind, kwargs)
+        path = self._path(kind, key)
+
+        if not self.record:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return response_type.model_validate(json.load(f))
+            except FileNotFoundError:
+                if fallback is None:
+                    raise FixtureNotFoundError(f"No recorded {kind} response for {key} in {self.fixture_dir}")
+                logger.info(f"No recorded {kind} response for {key[:12]}, using fallback")
+                return fallback(**kwargs)
+
+        response = forward(**kwargs)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(response.model_dump(mode='json'), f)
+        os.replace(tmp_path, path)
+        return response
+
+    def _chat_create(self, **kwargs) -> ChatCompletion:
+        return self._handle(
+            'chat', ChatCompletion,
+            self.client.chat.completions.create if self.client else None,
+            self.fallback.chat.completions.create if self.fallback else None,
+            kwargs,
+        )
+
+    def _embeddings_create(self, **kwargs) -> CreateEmbeddingResponse:
+        return self._handle(
+            'embedding', CreateEmbeddingResponse,
+            self.client.embeddings.create if self.client else None,
+            self.fallback.embeddings.create if self.fallback else None,
+            kwargs,
+        )
+
+
+def create_llm_client(backend: str, openai_factory):
+    """
+    Build the client for an LLM_BACKEND value.
+
+    Args:
+        backend (str): One of LLM_BACKENDS
+        openai_factory (callable): Returns a real OpenAI client when one is needed
+
+    Returns:
+        An object exposing chat.completions.create and embeddings.create
+    """
+    if backend == 'openai':
+        return openai_factory()
+    if backend == 'synthetic':
+        return SyntheticLLMClient.from_settings()
+    if backend == 'replay':
+        fallback = SyntheticLLMClient.from_settings() if settings.LLM_REPLAY_FALLBACK == 'synthetic' else None
+        return RecordReplayLLMClient(settings.LLM_FIXTURE_DIR, fallback=fallback)
+    if backend == 'record':
+        return RecordReplayLLMClient(settings.LLM_FIXTURE_DIR, client=openai_factory(), record=True)
+    raise ValueError(f"Unknown LLM_BACKEND '{backend}'. Expected one of: {', '.join(LLM_BACKENDS)}")
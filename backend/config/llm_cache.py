@@ -0,0 +1,164 @@
+"""
+Persistent cache for LLM chat completions.
+
+Responses are stored in the database (documents.LLMCacheEntry) keyed by a hash
+of the model, the normalized prompt, a temperature bucket, the response
+format and the other request parameters (max_tokens, ...), so regenerating questions for the same page and settings is served
+without another OpenAI round-trip.
+
+Example usage:
+    key = make_cache_key("gpt-4o", messages, temperature=0.7)
+    response = get_cached_response(key)
+    if response is None:
+        response = client.chat.completions.create(...)
+        store_response(key, "gpt-4o", response)
+"""
+
+import json
+import random
+import hashlib
+import logging
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from config.request_metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Run eviction on roughly one in this many writes
+EVICTION_SAMPLE_RATE = 50
+
+
+def _normalize_content(content):
+    if isinstance(content, str):
+        return " ".join(content.split())
+    if isinstance(content, list):
+        return [_normalize_content(part) for part in content]
+    if isinstance(content, dict):
+        return {key: _normalize_content(value) for key, value in content.items()}
+    return content
+
+
+def make_cache_key(model: str, messages: List[Dict[str, Any]], temperature: Optional[float] = None,
+                   response_format: Optional[Dict[str, Any]] = None, variant=None,
+                   params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build the cache key for a chat completion request.
+
+    Whitespace differences in message content do not change the key, the
+    temperature is bucketed to one decimal place, and parameters set to None
+    count as not given.
+
+    Args:
+        model (str): Model name
+        messages (list): Chat messages
+        temperature (float): Sampling temperature
+        response_format (dict): Requested response format
+        variant: Extra discriminator for otherwise identical prompts
+        params (dict): Other request parameters, e.g. max_tokens
+
+    Returns:
+        str: Hex sha256 digest
+    """
+    payload = {
+        'model': model,
+        'messages': [
+            {'role': message.get('role'), 'content': _normalize_content(message.get('content'))}
+            for message in messages
+        ],
+        'temperature': round(float(temperature), 1) if temperature is not None else None,
+        'response_format': response_format,
+        'variant': variant,
+        'params': {name: value for name, value in (params or {}).items() if value is not None},
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def get_cached_response(key: str):
+    """
+    Return the cached ChatCompletion for a key, or None on a miss.
+    """
+    from documents.models import LLMCacheEntry
+    from openai.types.chat import ChatCompletion
+
+    now = timezone.now()
+    try:
+        entry = LLMCacheEntry.objects.filter(key=key, expires_at__gt=now).only('id', 'response').first()
+        record_cache(hit=entry is not None)
+        if entry is None:
+            return None
+        LLMCacheEntry.objects.filter(id=entry.id).update(
+            hit_count=F('hit_count') + 1,
+            last_accessed_at=now,
+        )
+        return ChatCompletion.model_validate(entry.response)
+    except Exception as e:
+        logger.warning(f"LLM cache lookup failed: {e}")
+        return None
+
+
+def store_response(key: str, model: str, response) -> bool:
+    """
+    Store a ChatCompletion response under a key.
+
+    Responses larger than LLM_CACHE_MAX_ENTRY_BYTES are not cached.
+
+    Returns:
+        bool: True if the response was stored
+    """
+    from documents.models import LLMCacheEntry
+
+    try:
+        data = response.model_dump(mode='json')
+        size = len(json.dumps(data))
+        if size > settings.LLM_CACHE_MAX_ENTRY_BYTES:
+            logger.info(f"Skipping LLM cache for {key[:12]}: {size} bytes exceeds limit")
+            return False
+
+        now = timezone.now()
+        LLMCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                'model': model,
+                'response': data,
+                'size_bytes': size,
+                'last_accessed_at': now,
+                'expires_at': now + timedelta(seconds=settings.LLM_CACHE_TTL_SECONDS),
+            },
+        )
+        if random.randrange(EVICTION_SAMPLE_RATE) == 0:
+            evict_entries()
+        return True
+    except Exception as e:
+        logger.warning(f"LLM cache store failed: {e}")
+        return False
+
+
+def evict_entries() -> int:
+    """
+    Delete expired entries and trim the least recently used ones above
+    LLM_CACHE_MAX_ENTRIES.
+
+    Returns:
+        int: Number of entries deleted
+    """
+    from documents.models import LLMCacheEntry
+
+    deleted, _ = LLMCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    excess = LLMCacheEntry.objects.count() - settings.LLM_CACHE_MAX_ENTRIES
+    if excess > 0:
+        stale_ids = list(
+            LLMCacheEntry.objects.order_by('last_accessed_at').values_list('id', flat=True)[:excess]
+        )
+        trimmed, _ = LLMCacheEntry.objects.filter(id__in=stale_ids).delete()
+        deleted += trimmed
+
+    if deleted:
+        logger.info(f"Evicted {deleted} LLM cache entries")
+    return deleted
@@ -0,0 +1,315 @@
+"""
+Central gateway for all OpenAI calls.
+
+Every chat completion and embedding request in the project goes through
+LLMGateway so that connection pooling, concurrency limits, timeouts, retries
+and usage metrics are handled in one place.
+
+Example usage:
+    gateway = get_llm_gateway()
+    response = gateway.chat_completion(
+        messages=[{"role": "user", "content": "Hello"}],
+        model="gpt-4o",
+        tenant=request.user.pk,
+    )
+"""
+
+import random
+import threading
+import time
+import logging
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import openai
+from django.conf import settings
+
+from config.llm_backends import create_llm_client
+from config.request_metrics import record_external_call
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: rate limits, server errors and transport failures
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+)
+
+
+class LLMGatewayError(Exception):
+    """Raised when a call cannot be admitted by the gateway."""
+
+
+class LLMGateway:
+    """
+    Shared OpenAI client with concurrency limits, retries and metrics.
+
+    A single keep-alive HTTP pool is reused across requests and threads.
+    Calls are admitted through a global semaphore and, when a tenant is
+    given, a per-tenant semaphore so one teacher cannot starve the others.
+    LLM_BACKEND selects an offline backend (config.llm_backends) instead of
+    the OpenAI API.
+    """
+
+    LATENCY_SAMPLES = 1000
+
+    def __init__(self, client=None):
+        self.max_concurrency = getattr(settings, 'LLM_MAX_CONCURRENCY', 16)
+        self.tenant_concurrency = getattr(settings, 'LLM_TENANT_CONCURRENCY', 4)
+        self.queue_timeout = getattr(settings, 'LLM_QUEUE_TIMEOUT', 120.0)
+        self.max_retries = getattr(settings, 'LLM_MAX_RETRIES', 3)
+        self.backend = getattr(settings, 'LLM_BACKEND', 'openai')
+        self.client = client or create_llm_client(self.backend, self._create_client)
+
+        self._global_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._tenant_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._tenant_lock = threading.Lock()
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = defaultdict(lambda: {
+            'calls': 0,
+            'errors': 0,
+            'retries': 0,
+            'cache_hits': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'latency_total': 0.0,
+            'latencies': deque(maxlen=self.LATENCY_SAMPLES),
+        })
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    @staticmethod
+    def _create_client():
+        timeout = httpx.Timeout(
+            getattr(settings, 'LLM_REQUEST_TIMEOUT', 60.0),
+            connect=getattr(settings, 'LLM_CONNECT_TIMEOUT', 10.0),
+        )
+        limits = httpx.Limits(
+            max_connections=getattr(settings, 'LLM_MAX_CONCURRENCY', 16) * 2,
+            max_keepalive_connections=getattr(settings, 'LLM_MAX_CONCURRENCY', 16),
+            keepalive_expiry=60.0,
+        )
+        return openai.OpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=httpx.Client(timeout=timeout, limits=limits),
+            # Retries are handled by the gateway so they are counted and jittered
+            max_retries=0,
+        )
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """
+        Register a callable invoked with a record of every completed call.
+
+        The record contains kind, model, tenant, latency, prompt_tokens,
+        completion_tokens, retries, cached, success and error.
+        """
+        self._listeners.append(listener)
+
+    def _tenant_semaphore(self, tenant: str) -> threading.BoundedSemaphore:
+        with self._tenant_lock:
+            semaphore = self._tenant_slots.get(tenant)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.tenant_concurrency)
+                self._tenant_slots[tenant] = semaphore
+            return semaphore
+
+    @contextmanager
+    def _slot(self, tenant: Optional[str]):
+        """Hold a tenant slot (if any) and a global slot for the duration of a call."""
+        tenant_semaphore = self._tenant_semaphore(tenant) if tenant else None
+        if tenant_semaphore and not tenant_semaphore.acquire(timeout=self.queue_timeout):
+            raise LLMGatewayError(f"Too many concurrent LLM requests for tenant {tenant}")
+        try:
+            if not self._global_slots.acquire(timeout=self.queue_timeout):
+                raise LLMGatewayError("Too many concurrent LLM requests")
+            try:
+                yield
+            finally:
+                self._global_slots.release()
+        finally:
+            if tenant_semaphore:
+                tenant_semaphore.release()
+
+    @staticmethod
+    def _retry_delay(error: Exception, attempt: int) -> float:
+        """Exponential backoff with full jitter, honouring Retry-After when present."""
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), 30.0)
+            except ValueError:
+                pass
+        return random.uniform(0, min(0.5 * (2 ** attempt), 20.0))
+
+    def _call(self, kind: str, model: str, tenant, func: Callable, **kwargs):
+        tenant = str(tenant) if tenant is not None else None
+        retries = 0
+        started = time.monotonic()
+        response = None
+        error = None
+        try:
+            with self._slot(tenant):
+                while True:
+                    try:
+                        response = func(model=model, **kwargs)
+                        return response
+                    except RETRYABLE_ERRORS as e:
+                        if retries >= self.max_retries:
+                            raise
+                        delay = self._retry_delay(e, retries)
+                        retries += 1
+                        logger.warning(f"LLM {kind} call failed ({e.__class__.__name__}), retry {retries} in {delay:.1f}s")
+                        time.sleep(delay)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(kind, model, tenant, time.monotonic() - started, response, retries, error)
+
+    def _record(self, kind, model, tenant, latency, response, retries, error, cached=False):
+        usage = getattr(response, 'usage', None)
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+
+        if not cached:
+            record_external_call('openai', latency)
+
+        with self._metrics_lock:
+            stats = self._metrics[(kind, model)]
+            stats['calls'] += 1
+            stats['cache_hits'] += 1 if cached else 0
+            stats['errors'] += 1 if error else 0
+            stats['retries'] += retries
+            stats['prompt_tokens'] += prompt_tokens
+            stats['completion_tokens'] += completion_tokens
+            stats['latency_total'] += latency
+            stats['latencies'].append(latency)
+
+        logger.info(
+            f"LLM {kind} model={model} tenant={tenant} latency={latency:.2f}s "
+            f"prompt_tokens={prompt_tokens} completion_tokens={completion_tokens} retries={retries}"
+            + (" cached" if cached else "")
+            + (f" error={error.__class__.__name__}" if error else "")
+        )
+
+        record = {
+            'kind': kind,
+            'model': model,
+            'tenant': tenant,
+            'latency': latency,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'retries': retries,
+            'cached': cached,
+            'success': error is None,
+            'error': str(error) if error else None,
+        }
+        for listener in self._listeners:
+            try:
+                listener(record)
+            except Exception as e:
+                logger.error(f"LLM gateway listener failed: {e}")
+
+    def chat_completion(self, messages: List[Dict[str, Any]], model: str = "gpt-4o",
+                        tenant=None, use_cache: Optional[bool] = None, cache_variant=None, **kwargs):
+        """
+        Create a chat completion.
+
+        Identical requests are served from the persistent response cache
+        (config.llm_cache) unless use_cache is False.
+
+        Args:
+            messages (list): Chat messages
+            model (str): Model name
+            tenant: Identifier used for per-tenant concurrency limits (e.g. user id)
+            use_cache (bool): Override LLM_CACHE_ENABLED; pass False when fresh variety is required
+            cache_variant: Distinguishes otherwise identical requests that need separate answers
+            **kwargs: Passed through to chat.completions.create
+
+        Returns:
+            The OpenAI ChatCompletion response
+        """
+        if use_cache is None:
+            use_cache = getattr(settings, 'LLM_CACHE_ENABLED', False)
+        if not use_cache or kwargs.get('stream'):
+            return self._call('chat', model, tenant, self.client.chat.completions.create,
+                              messages=messages, **kwargs)
+
+        from config.llm_cache import make_cache_key, get_cached_response, store_response
+
+        params = {name: value for name, value in kwargs.items() if name not in ('temperature', 'response_format')}
+        key = make_cache_key(model, messages, kwargs.get('temperature'),
+                             kwargs.get('response_format'), cache_variant, params)
+        started = time.monotonic()
+        response = get_cached_response(key)
+        if response is not None:
+            self._record('chat', model, str(tenant) if tenant is not None else None,
+                         time.monotonic() - started, None, 0, None, cached=True)
+            return response
+
+        response = self._call('chat', model, tenant, self.client.chat.completions.create,
+                              messages=messages, **kwargs)
+        store_response(key, model, response)
+        return response
+
+    def create_embeddings(self, input, model: str = "text-embedding-ada-002", tenant=None, **kwargs):
+        """
+        Create embeddings for a string or a list of strings.
+
+        Returns:
+            The OpenAI CreateEmbeddingResponse
+        """
+        return self._call('embedding', model, tenant, self.client.embeddings.create,
+                          input=input, **kwargs)
+
+    def metrics_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return aggregated metrics per call kind and model.
+
+        Returns:
+            dict: {"chat:gpt-4o": {"calls": ..., "p50_latency": ..., ...}, ...}
+        """
+        snapshot = {}
+        with self._metrics_lock:
+            for (kind, model), stats in self._metrics.items():
+                latencies = sorted(stats['latencies'])
+
+                def percentile(p):
+                    if not latencies:
+                        return 0.0
+                    return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+                snapshot[f"{kind}:{model}"] = {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'retries': stats['retries'],
+                    'cache_hits': stats['cache_hits'],
+                    'prompt_tokens': stats['prompt_tokens'],
+                    'completion_tokens': stats['completion_tokens'],
+                    'avg_latency': stats['latency_total'] / stats['calls'] if stats['calls'] else 0.0,
+                    'p50_latency': percentile(0.50),
+                    'p95_latency': percentile(0.95),
+                    'p99_latency': percentile(0.99),
+                }
+        return snapshot
+
+
+@lru_cache(maxsize=1)
+def get_llm_gateway() -> LLMGateway:
+    """
+    Get the process-wide LLM gateway.
+
+    Returns:
+        LLMGateway: Shared gateway instance
+    """
+    gateway = LLMGateway()
+    if getattr(settings, 'LLM_USAGE_TRACKING', True):
+        from config.llm_usage import record_llm_call
+        gateway.add_listener(record_llm_call)
+    return gateway
@@ -0,0 +1,226 @@
+"""
+LLM usage accounting.
+
+Every call through the LLM gateway is recorded as a documents.LLMUsage row
+with its tokens, latency, retries and estimated cost. Calls made inside
+track_llm_usage() are attributed to a document and/or quiz, and their totals
+are added to Document.metadata["llm_usage"] and Quiz.metadata["llm_usage"].
+
+Example usage:
+    with track_llm_usage(document=document, quiz=quiz, user=user):
+        questions = service.generate_questions_from_text(...)
+
+    usage_report(group_by='teacher', since=timezone.now() - timedelta(days=30))
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+logger = logging.getLogger(__name__)
+
+_tracker = ContextVar('llm_usage_tracker', default=None)
+
+REPORT_GROUPS = {
+    'quiz': ('quiz_id', 'quiz__title'),
+    'teacher': ('user_id', 'user__email'),
+    'document': ('document_id', 'document__title'),
+    'model': ('kind', 'model'),
+    'day': ('day',),
+}
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Decimal:
+    """
+    Estimate the USD cost of a call from LLM_PRICING (prices per 1K tokens).
+    """
+    pricing = getattr(settings, 'LLM_PRICING', {}).get(model)
+    if not pricing:
+        return Decimal('0')
+    cost = (Decimal(str(pricing.get('prompt', 0))) * prompt_tokens
+            + Decimal(str(pricing.get('completion', 0))) * completion_tokens) / 1000
+    return cost.quantize(Decimal('0.000001'))
+
+
+def _user_id(tenant) -> Optional[int]:
+    try:
+        return int(tenant)
+    except (TypeError, ValueError):
+        return None
+
+
+def _build_usage(record: Dict[str, Any], document=None, quiz=None, user=None):
+    from documents.models import LLMUsage
+
+    return LLMUsage(
+        kind=record['kind'],
+        model=record['model'],
+        user_id=user.pk if user is not None else _user_id(record.get('tenant')),
+        document=document,
+        quiz=quiz,
+        prompt_tokens=record['prompt_tokens'],
+        completion_tokens=record['completion_tokens'],
+        latency_ms=int(record['latency'] * 1000),
+        retries=record['retries'],
+        cached=record.get('cached', False),
+        success=record['success'],
+        error=record['error'] or '',
+        cost_usd=estimate_cost(record['model'], record['prompt_tokens'], record['completion_tokens']),
+    )
+
+
+def summarize(usages: List) -> Dict[str, Any]:
+    """Totals for a list of LLMUsage rows, in the shape stored in metadata."""
+    return {
+        'calls': len(usages),
+        'cached_calls': sum(1 for u in usages if u.cached),
+        'failed_calls': sum(1 for u in usages if not u.success),
+        'retries': sum(u.retries for u in usages),
+        'prompt_tokens': sum(u.prompt_tokens for u in usages),
+        'completion_tokens': sum(u.completion_tokens for u in usages),
+        'latency_seconds': round(sum(u.latency_ms for u in usages) / 1000, 3),
+        'cost_usd': float(sum((u.cost_usd for u in usages), Decimal('0'))),
+    }
+
+
+def _add_summary(metadata, summary):
+    metadata = dict(metadata or {})
+    totals = dict(metadata.get('llm_usage') or {})
+    for key, value in summary.items():
+        totals[key] = round(totals.get(key, 0) + value, 6)
+    metadata['llm_usage'] = totals
+    return metadata
+
+
+class UsageTracker:
+    """Collects the LLM calls made inside a track_llm_usage() block."""
+
+    def __init__(self, document=None, quiz=None, user=None):
+        self.document = document
+        self.quiz = quiz
+        self.user = user
+        self.usages = []
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]):
+        usage = _build_usage(record, self.document, self.quiz, self.user)
+        with self._lock:
+            self.usages.append(usage)
+
+    def flush(self):
+        """Save the collected rows and add their totals to the document and quiz metadata."""
+        from documents.models import Document, LLMUsage
+        from quiz.models import Quiz
+
+        with self._lock:
+            usages, self.usages = self.usages, []
+        if not usages:
+            return None
+
+        summary = summarize(usages)
+        with transaction.atomic():
+            LLMUsage.objects.bulk_create(usages)
+            if self.document is not None and self.document.pk:
+                document = Document.objects.select_for_update().get(pk=self.document.pk)
+                document.metadata = _add_summary(document.metadata, summary)
+                Document.objects.filter(pk=document.pk).update(metadata=document.metadata)
+                self.document.metadata = document.metadata
+            if self.quiz is not None and self.quiz.pk:
+                quiz = Quiz.objects.select_for_update().get(pk=self.quiz.pk)
+                quiz.metadata = _add_summary(quiz.metadata, summary)
+                Quiz.objects.filter(pk=quiz.pk).update(metadata=quiz.metadata)
+                self.quiz.metadata = quiz.metadata
+        logger.info(
+            f"LLM usage: {summary['calls']} calls, {summary['prompt_tokens']}+{summary['completion_tokens']} tokens, "
+            f"${summary['cost_usd']:.4f}, {summary['latency_seconds']}s"
+            f" (document={getattr(self.document, 'pk', None)}, quiz={getattr(self.quiz, 'pk', None)})"
+        )
+        return summary
+
+
+@contextmanager
+def track_llm_usage(document=None, quiz=None, user=None):
+    """
+    Attribute LLM calls made in this block to a document, quiz and user.
+
+    Rows are written and metadata totals updated when the block exits,
+    including when it exits with an exception.
+    """
+    tracker = UsageTracker(document=document, quiz=quiz, user=user)
+    token = _tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _tracker.reset(token)
+        try:
+            tracker.flush()
+        except Exception as e:
+            logger.error(f"Failed to save LLM usage: {e}")
+
+
+def record_llm_call(record: Dict[str, Any]):
+    """
+    LLM gateway listener: attribute the call to the active tracker, or save it directly.
+    """
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.add(record)
+        return
+    try:
+        _build_usage(record).save()
+    except Exception as e:
+        logger.error(f"Failed to save LLM usage: {e}")
+
+
+def usage_report(group_by: str = 'quiz', since=None, until=None) -> List[Dict[str, Any]]:
+    """
+    Aggregate LLM usage.
+
+    Args:
+        group_by (str): One of 'quiz', 'teacher', 'document', 'model' or 'day'
+        since (datetime): Only include calls at or after this time
+        until (datetime): Only include calls before this time
+
+    Returns:
+        list: One dict per group with calls, tokens, cost and latency, most expensive first
+    """
+    from documents.models import LLMUsage
+
+    if group_by not in REPORT_GROUPS:
+        raise ValueError(f"Invalid group_by '{group_by}'. Expected one of: {', '.join(REPORT_GROUPS)}")
+
+    queryset = LLMUsage.objects.all()
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+    if group_by == 'day':
+        queryset = queryset.annotate(day=TruncDate('created_at'))
+
+    fields = REPORT_GROUPS[group_by]
+    rows = (
+        queryset.values(*fields)
+        .annotate(
+            calls=Count('id'),
+            cached_calls=Count('id', filter=Q(cached=True)),
+            failed_calls=Count('id', filter=Q(success=False)),
+            prompt_tokens=Sum('prompt_tokens'),
+            completion_tokens=Sum('completion_tokens'),
+            cost_usd=Sum('cost_usd'),
+            avg_latency_ms=Avg('latency_ms'),
+            retries=Sum('retries'),
+        )
+        .order_by('day' if group_by == 'day' else '-cost_usd')
+    )
+    return [
+        dict(row, cost_usd=float(row['cost_usd'] or 0), avg_latency_ms=round(row['avg_latency_ms'] or 0))
+        for row in rows
+    ]
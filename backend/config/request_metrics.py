@@ -0,0 +1,313 @@
+"""
+Per-endpoint request instrumentation.
+
+RequestMetricsMiddleware records, for every request, the wall time, the
+number of database queries and their total time (via
+connection.execute_wrapper), cache hits and misses, and time spent in
+external calls such as OpenAI. Aggregates per view are exposed in the
+Prometheus text format by MetricsView, and requests that exceed the query or
+latency budget are logged with the fingerprints of the SQL they ran.
+
+Code that talks to external services reports its time with:
+    with external_call('supabase'):
+        bucket.upload(path, data)
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager, ExitStack
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.views import APIView
+
+from accounts.permissions import IsAdmin
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_metrics', default=None)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?|\$\d+)\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_SELECT_LIST = re.compile(r"^SELECT (.+?) FROM ", re.IGNORECASE)
+
+
+def sql_fingerprint(sql: str) -> str:
+    """
+    Normalize a SQL statement so repeated queries with different values group together.
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    # Long column lists hide the part that identifies the query
+    match = _SELECT_LIST.match(sql)
+    if match and len(match.group(1)) > 60:
+        sql = f"SELECT ... FROM {sql[match.end():]}"
+    return sql
+
+
+class RequestStats:
+    """Counters for a single request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.external_calls = 0
+        self.external_time = 0.0
+        self.external_by_service = defaultdict(float)
+        self.fingerprints = Counter()
+        self.fingerprint_time = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            fingerprint = sql_fingerprint(sql)
+            self.fingerprints[fingerprint] += 1
+            self.fingerprint_time[fingerprint] += elapsed
+
+
+def record_cache(hit: bool):
+    """Count a cache hit or miss against the current request, if any."""
+    stats = _current.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+def record_external_call(service: str, duration: float):
+    """Add time spent calling an external service to the current request, if any."""
+    stats = _current.get()
+    if stats is not None:
+        stats.external_calls += 1
+        stats.external_time += duration
+        stats.external_by_service[service] += duration
+
+
+@contextmanager
+def external_call(service: str):
+    """Time a block that calls an external service."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_external_call(service, time.perf_counter() - started)
+
+
+class MetricsRegistry:
+    """Aggregated per-view metrics with a bounded window of samples for percentiles."""
+
+    SAMPLES = 1000
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(self._new_view)
+
+    def _new_view(self):
+        return {
+            'requests': 0,
+            'errors': 0,
+            'over_budget': 0,
+            'queries_total': 0,
+            'db_time_total': 0.0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'external_time_total': 0.0,
+            'latency_total': 0.0,
+            'latency': deque(maxlen=self.SAMPLES),
+            'queries': deque(maxlen=self.SAMPLES),
+            'db_time': deque(maxlen=self.SAMPLES),
+        }
+
+    def record(self, view: str, status_code: int, latency: float, stats: RequestStats, over_budget: bool):
+        with self._lock:
+            entry = self._views[view]
+            entry['requests'] += 1
+            entry['errors'] += 1 if status_code >= 500 else 0
+            entry['over_budget'] += 1 if over_budget else 0
+            entry['queries_total'] += stats.queries
+            entry['db_time_total'] += stats.db_time
+            entry['cache_hits'] += stats.cache_hits
+            entry['cache_misses'] += stats.cache_misses
+            entry['external_time_total'] += stats.external_time
+            entry['latency_total'] += latency
+            entry['latency'].append(latency)
+            entry['queries'].append(stats.queries)
+            entry['db_time'].append(stats.db_time)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    @classmethod
+    def _quantiles(cls, samples):
+        ordered = sorted(samples)
+        if not ordered:
+            return {q: 0 for q in cls.QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in cls.QUANTILES}
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        Return a copy of the aggregates with percentiles computed.
+
+        Returns:
+            dict: {view: {"requests": ..., "latency_quantiles": {0.5: ...}, ...}}
+        """
+        with self._lock:
+            views = {view: dict(entry, latency=list(entry['latency']), queries=list(entry['queries']),
+                                db_time=list(entry['db_time']))
+                     for view, entry in self._views.items()}
+        for entry in views.values():
+            entry['latency_quantiles'] = self._quantiles(entry.pop('latency'))
+            entry['queries_quantiles'] = self._quantiles(entry.pop('queries'))
+            entry['db_time_quantiles'] = self._quantiles(entry.pop('db_time'))
+        return views
+
+
+registry = MetricsRegistry()
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(snapshot: Optional[Dict[str, Dict]] = None) -> str:
+    """
+    Render request and LLM gateway metrics in the Prometheus text exposition format.
+    """
+    snapshot = registry.snapshot() if snapshot is None else snapshot
+    lines = []
+
+    def summary(name, help_text, key, sum_key):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} summary")
+        for view, entry in sorted(snapshot.items()):
+            label = _escape_label(view)
+            for quantile, value in entry[key].items():
+                lines.append(f'{name}{{view="{label}",quantile="{quantile}"}} {value}')
+            lines.append(f'{name}_sum{{view="{label}"}} {entry[sum_key]}')
+            lines.append(f'{name}_count{{view="{label}"}} {entry["requests"]}')
+
+    def counter(name, help_text, key):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for view, entry in sorted(snapshot.items()):
+            lines.append(f'{name}{{view="{_escape_label(view)}"}} {entry[key]}')
+
+    summary('http_request_duration_seconds', 'Request wall time', 'latency_quantiles', 'latency_total')
+    summary('http_request_db_queries', 'Database queries per request', 'queries_quantiles', 'queries_total')
+    summary('http_request_db_seconds', 'Database time per request', 'db_time_quantiles', 'db_time_total')
+    counter('http_request_errors_total', 'Requests that returned a 5xx status', 'errors')
+    counter('http_request_over_budget_total', 'Requests over the query or latency budget', 'over_budget')
+    counter('http_request_cache_hits_total', 'Cache hits during requests', 'cache_hits')
+    counter('http_request_cache_misses_total', 'Cache misses during requests', 'cache_misses')
+    counter('http_request_external_seconds_total', 'Time spent in external calls', 'external_time_total')
+
+    from config.llm_gateway import get_llm_gateway
+    llm = get_llm_gateway().metrics_snapshot()
+    if llm:
+        for name, key, help_text in (
+            ('llm_calls_total', 'calls', 'LLM calls'),
+            ('llm_errors_total', 'errors', 'Failed LLM calls'),
+            ('llm_retries_total', 'retries', 'LLM call retries'),
+            ('llm_cache_hits_total', 'cache_hits', 'LLM responses served from cache'),
+            ('llm_prompt_tokens_total', 'prompt_tokens', 'Prompt tokens sent'),
+            ('llm_completion_tokens_total', 'completion_tokens', 'Completion tokens received'),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for call, stats in sorted(llm.items()):
+                kind, model = call.split(':', 1)
+                lines.append(f'{name}{{kind="{_escape_label(kind)}",model="{_escape_label(model)}"}} {stats[key]}')
+
+    return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    """
+    Record per-view latency, query counts, DB time, cache and external-call usage.
+
+    Requests over REQUEST_QUERY_BUDGET queries or REQUEST_LATENCY_BUDGET_MS
+    milliseconds are logged with their most frequent SQL fingerprints.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'REQUEST_METRICS_ENABLED', True)
+        self.query_budget = getattr(settings, 'REQUEST_QUERY_BUDGET', 50)
+        self.latency_budget = getattr(settings, 'REQUEST_LATENCY_BUDGET_MS', 1000) / 1000.0
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+            status_code = response.status_code
+            return response
+        finally:
+            latency = time.perf_counter() - started
+            _current.reset(token)
+            self._finish(request, status_code, latency, stats)
+
+    @staticmethod
+    def _view_name(request) -> str:
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return f"{request.method} <unresolved>"
+        return f"{request.method} /{match.route}"
+
+    def _finish(self, request, status_code, latency, stats):
+        view = self._view_name(request)
+        over_budget = stats.queries > self.query_budget or latency > self.latency_budget
+        registry.record(view, status_code, latency, stats, over_budget)
+
+        if over_budget:
+            top = sorted(stats.fingerprints.items(),
+                         key=lambda item: (item[1], stats.fingerprint_time[item[0]]), reverse=True)[:5]
+            details = "\n".join(
+                f"  {count}x {stats.fingerprint_time[fingerprint] * 1000:.1f}ms {fingerprint[:300]}"
+                for fingerprint, count in top
+            )
+            services = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in stats.external_by_service.items())
+            services = f" ({services})" if services else ""
+            logger.warning(
+                f"{view} over budget: {latency * 1000:.0f}ms, {stats.queries} queries "
+                f"({stats.db_time * 1000:.0f}ms DB), external {stats.external_time * 1000:.0f}ms{services}, "
+                f"cache {stats.cache_hits} hits/{stats.cache_misses} misses, status {status_code}\n{details}"
+            )
+
+
+class MetricsView(APIView):
+    """Admin-only endpoint serving request metrics in Prometheus text format."""
+
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
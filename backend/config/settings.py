@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
@@ -74,6 +75,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'config.request_metrics.RequestMetricsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -198,6 +200,9 @@ os.makedirs(MEDIA_ROOT, exist_ok=True)
 # Use Vector DB by default for documents
 USE_VECTOR_DB = os.getenv('USE_VECTOR_DB', 'True') == 'True'
 
+# Directory for the memory-mapped NumPy index used when pgvector is unavailable
+VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', os.path.join(BASE_DIR, 'vector_index'))
+
 # Default to Vector Storage for document uploads
 DEFAULT_FILE_STORAGE = 'config.vector_storage.VectorStorage'
 
@@ -255,6 +260,48 @@ SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 SUPABASE_SECRET = os.getenv('SUPABASE_SECRET')
 
+# Supabase Storage client (config.supabase): shared keep-alive pool and retries
+SUPABASE_STORAGE_TIMEOUT = float(os.getenv('SUPABASE_STORAGE_TIMEOUT', '60'))
+SUPABASE_STORAGE_CONNECT_TIMEOUT = float(os.getenv('SUPABASE_STORAGE_CONNECT_TIMEOUT', '10'))
+SUPABASE_STORAGE_MAX_CONNECTIONS = int(os.getenv('SUPABASE_STORAGE_MAX_CONNECTIONS', '20'))
+SUPABASE_STORAGE_MAX_KEEPALIVE = int(os.getenv('SUPABASE_STORAGE_MAX_KEEPALIVE', '10'))
+SUPABASE_STORAGE_KEEPALIVE_EXPIRY = float(os.getenv('SUPABASE_STORAGE_KEEPALIVE_EXPIRY', '60'))
+SUPABASE_STORAGE_MAX_RETRIES = int(os.getenv('SUPABASE_STORAGE_MAX_RETRIES', '3'))
+SUPABASE_STORAGE_RETRY_BACKOFF = float(os.getenv('SUPABASE_STORAGE_RETRY_BACKOFF', '0.5'))
+SUPABASE_UPLOAD_WORKERS = int(os.getenv('SUPABASE_UPLOAD_WORKERS', '4'))
+
+# Local disk cache for downloaded storage objects (config.storage_cache)
+STORAGE_CACHE_ENABLED = os.getenv('STORAGE_CACHE_ENABLED', 'True') == 'True'
+STORAGE_CACHE_DIR = os.getenv('STORAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'quiz-storage-cache'))
+STORAGE_CACHE_MAX_BYTES = int(os.getenv('STORAGE_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+
+# Resumable chunked uploads (documents.chunked_upload); the directory must be shared by all workers
+CHUNKED_UPLOAD_DIR = os.getenv('CHUNKED_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'quiz-chunked-uploads'))
+CHUNKED_UPLOAD_PART_SIZE = int(os.getenv('CHUNKED_UPLOAD_PART_SIZE', str(8 * 1024 * 1024)))
+CHUNKED_UPLOAD_MAX_SIZE = int(os.getenv('CHUNKED_UPLOAD_MAX_SIZE', str(500 * 1024 * 1024)))
+CHUNKED_UPLOAD_EXPIRY_HOURS = int(os.getenv('CHUNKED_UPLOAD_EXPIRY_HOURS', '24'))
+
+# Largest file kept in storage; larger uploads are zipped, or rejected when they do not compress
+# (quiz.utils.compress_file_if_needed)
+STORED_FILE_MAX_SIZE_MB = int(os.getenv('STORED_FILE_MAX_SIZE_MB', '60'))
+
+# OCR fallback for scanned PDF pages (documents.ocr); requires pytesseract and PyMuPDF
+OCR_ENABLED = os.getenv('OCR_ENABLED', 'True') == 'True'
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+OCR_DPI = int(os.getenv('OCR_DPI', '300'))
+OCR_LANGUAGES = os.getenv('OCR_LANGUAGES', 'eng')
+OCR_MIN_TEXT_CHARS = int(os.getenv('OCR_MIN_TEXT_CHARS', '10'))
+OCR_PAGE_TIMEOUT = float(os.getenv('OCR_PAGE_TIMEOUT', '120'))
+
+# Streaming DOCX/Excel extraction (documents.utils): section size and caps
+EXTRACT_SECTION_CHARS = int(os.getenv('EXTRACT_SECTION_CHARS', '3000'))
+EXTRACT_MAX_CELL_CHARS = int(os.getenv('EXTRACT_MAX_CELL_CHARS', '200'))
+EXTRACT_MAX_CHARS = int(os.getenv('EXTRACT_MAX_CHARS', str(2 * 1024 * 1024)))
+
+# Range-read PDF access (documents.pdf_source): fetch block size and in-memory block cache
+PDF_RANGE_BLOCK_SIZE = int(os.getenv('PDF_RANGE_BLOCK_SIZE', str(64 * 1024)))
+PDF_RANGE_CACHE_BYTES = int(os.getenv('PDF_RANGE_CACHE_BYTES', str(64 * 1024 * 1024)))
+
 # If Supabase is configured, use it instead of local PostgreSQL
 if SUPABASE_URL and SUPABASE_KEY:
     DATABASES = {
@@ -290,6 +337,70 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 if not OPENAI_API_KEY:
     print("Warning: OPENAI_API_KEY not found in environment variables")
 
+# LLM gateway (config.llm_gateway): shared OpenAI client limits
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+LLM_TENANT_CONCURRENCY = int(os.getenv('LLM_TENANT_CONCURRENCY', '4'))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '120'))
+LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', '60'))
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '10'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+
+# LLM backend (config.llm_backends): openai, synthetic, replay or record
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'openai')
+LLM_FIXTURE_DIR = os.getenv('LLM_FIXTURE_DIR', os.path.join(BASE_DIR, 'benchmarks', 'llm_fixtures'))
+LLM_REPLAY_FALLBACK = os.getenv('LLM_REPLAY_FALLBACK', '')  # 'synthetic' to fill fixture misses
+LLM_SYNTHETIC_LATENCY_DISTRIBUTION = os.getenv('LLM_SYNTHETIC_LATENCY_DISTRIBUTION', 'lognormal')  # fixed, uniform, lognormal
+LLM_SYNTHETIC_LATENCY_MEAN = float(os.getenv('LLM_SYNTHETIC_LATENCY_MEAN', '1.5'))
+LLM_SYNTHETIC_LATENCY_SPREAD = float(os.getenv('LLM_SYNTHETIC_LATENCY_SPREAD', '0.5'))
+LLM_SYNTHETIC_FAILURE_RATE = float(os.getenv('LLM_SYNTHETIC_FAILURE_RATE', '0'))
+LLM_SYNTHETIC_SEED = int(os.getenv('LLM_SYNTHETIC_SEED', '0'))
+
+# Request metrics (config.request_metrics): slow requests are logged with their SQL
+REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', 'True') == 'True'
+REQUEST_QUERY_BUDGET = int(os.getenv('REQUEST_QUERY_BUDGET', '50'))
+REQUEST_LATENCY_BUDGET_MS = int(os.getenv('REQUEST_LATENCY_BUDGET_MS', '1000'))
+
+# LLM response cache
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'True') == 'True'
+LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '50000'))
+LLM_CACHE_MAX_ENTRY_BYTES = int(os.getenv('LLM_CACHE_MAX_ENTRY_BYTES', '65536'))
+
+# LLM usage accounting (config.llm_usage): USD prices per 1K tokens
+LLM_USAGE_TRACKING = os.getenv('LLM_USAGE_TRACKING', 'True') == 'True'
+LLM_PRICING = {
+    'gpt-4o': {'prompt': 0.0025, 'completion': 0.01},
+    'text-embedding-ada-002': {'prompt': 0.0001, 'completion': 0.0},
+    'text-embedding-3-small': {'prompt': 0.00002, 'completion': 0.0},
+}
+
+# Question generation prompts (documents.content_packing): token budgets per call
+GENERATION_CONTEXT_TOKENS = int(os.getenv('GENERATION_CONTEXT_TOKENS', '16000'))
+GENERATION_TOKENS_PER_QUESTION = int(os.getenv('GENERATION_TOKENS_PER_QUESTION', '1500'))
+GENERATION_RESPONSE_TOKENS_PER_QUESTION = int(os.getenv('GENERATION_RESPONSE_TOKENS_PER_QUESTION', '400'))
+GENERATION_MAX_QUESTIONS_PER_CALL = int(os.getenv('GENERATION_MAX_QUESTIONS_PER_CALL', '5'))
+
+# Near-duplicate question filter (documents.question_similarity)
+QUESTION_SIMILARITY_THRESHOLD = float(os.getenv('QUESTION_SIMILARITY_THRESHOLD', '0.7'))
+QUESTION_SIMILARITY_RECENT_DAYS = int(os.getenv('QUESTION_SIMILARITY_RECENT_DAYS', '30'))
+
+# Question bank (documents.question_bank): reuse questions generated from the same file
+QUESTION_BANK_ENABLED = os.getenv('QUESTION_BANK_ENABLED', 'True') == 'True'
+
+# Replacement question buffer (quiz.replacement_buffer): refilled in the background below the minimum
+REPLACEMENT_BUFFER_SIZE = int(os.getenv('REPLACEMENT_BUFFER_SIZE', '5'))
+REPLACEMENT_BUFFER_MIN = int(os.getenv('REPLACEMENT_BUFFER_MIN', '3'))
+REPLACEMENT_BUFFER_WORKERS = int(os.getenv('REPLACEMENT_BUFFER_WORKERS', '2'))
+# A refill claimed longer ago than this is assumed dead and may be claimed again
+REPLACEMENT_BUFFER_REFILL_TIMEOUT = int(os.getenv('REPLACEMENT_BUFFER_REFILL_TIMEOUT', '600'))
+
+# Background generation jobs streamed as server-sent events (documents.generation_jobs)
+GENERATION_JOB_WORKERS = int(os.getenv('GENERATION_JOB_WORKERS', '4'))
+GENERATION_STREAM_POLL_SECONDS = float(os.getenv('GENERATION_STREAM_POLL_SECONDS', '0.5'))
+GENERATION_STREAM_HEARTBEAT_SECONDS = float(os.getenv('GENERATION_STREAM_HEARTBEAT_SECONDS', '15'))
+GENERATION_STREAM_TIMEOUT = float(os.getenv('GENERATION_STREAM_TIMEOUT', '900'))
+GENERATION_STREAM_RETRY_MS = int(os.getenv('GENERATION_STREAM_RETRY_MS', '2000'))
+
 # Webhook configuration
 WEBHOOK_SECRET_KEY = os.environ.get('WEBHOOK_SECRET_KEY', 'your-webhook-secret-key-here')
 
@@ -0,0 +1,188 @@
+"""
+Local on-disk cache for Supabase Storage objects.
+
+Downloaded objects are kept under STORAGE_CACHE_DIR, keyed by bucket/path
+and the object's ETag, so a file that changes in storage is never served
+stale. Writes are atomic (temp file + os.replace), hits refresh the file's
+mtime, and the least recently used files are evicted once the cache grows
+past STORAGE_CACHE_MAX_BYTES. The directory can be shared by every worker
+process on a host; eviction is serialized with a lock file.
+
+Example usage:
+    cache = get_storage_cache()
+    data = cache.get('fileupload', '12/book.pdf', etag)
+    if data is None:
+        data = download()
+        cache.put('fileupload', '12/book.pdf', etag, data)
+"""
+
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Optional
+
+from django.conf import settings
+
+from config.request_metrics import record_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+class StorageCache:
+    """Size-bounded LRU cache of object bytes on the local disk."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_path = os.path.join(self.directory, '.lock')
+
+    def _object_dir(self, bucket: str, path: str) -> str:
+        key = _digest(f"{bucket}/{path}")
+        return os.path.join(self.directory, key[:2], key)
+
+    def get_path(self, bucket: str, path: str, version: str) -> Optional[str]:
+        """
+        Return the local file holding this version of the object, or None on a miss.
+        """
+        file_path = os.path.join(self._object_dir(bucket, path), _digest(version))
+        try:
+            # Touch on hit so eviction sees it as recently used
+            os.utime(file_path)
+        except OSError:
+            record_cache(hit=False)
+            return None
+        record_cache(hit=True)
+        return file_path
+
+    def get(self, bucket: str, path: str, version: str) -> Optional[bytes]:
+        """
+        Return the cached bytes for this version of the object, or None on a miss.
+        """
+        file_path = self.get_path(bucket, path, version)
+        if file_path is None:
+            return None
+        try:
+            with open(file_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            # Evicted by another worker between the check and the read
+            return None
+
+    def put(self, bucket: str, path: str, version: str, data: bytes) -> Optional[str]:
+        """
+        Store an object version, replacing any older versions of the same path.
+
+        Objects larger than a quarter of the cache are not stored.
+
+        Returns:
+            str: Local file path, or None if the object was not cached
+        """
+        if len(data) > self.max_bytes // 4:
+            return None
+
+        object_dir = self._object_dir(bucket, path)
+        file_name = _digest(version)
+        try:
+            os.makedirs(object_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=object_dir, prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, os.path.join(object_dir, file_name))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            for name in os.listdir(object_dir):
+                if name != file_name and not name.startswith('.tmp-'):
+                    self._remove(os.path.join(object_dir, name))
+        except OSError as e:
+            logger.warning(f"Storage cache write for {bucket}/{path} failed: {e}")
+            return None
+
+        self.evict()
+        return os.path.join(object_dir, file_name)
+
+    def invalidate(self, bucket: str, path: str):
+        """Drop every cached version of an object."""
+        shutil.rmtree(self._object_dir(bucket, path), ignore_errors=True)
+
+    @staticmethod
+    def _remove(file_path: str):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith('.'):
+                    continue
+                file_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, file_path
+
+    def evict(self) -> int:
+        """
+        Delete least recently used files until the cache fits in max_bytes.
+
+        Returns:
+            int: Number of files deleted
+        """
+        with open(self._lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                entries = sorted(self._entries())
+                total = sum(size for _, size, _ in entries)
+                deleted = 0
+                for _, size, file_path in entries:
+                    if total <= self.max_bytes:
+                        break
+                    self._remove(file_path)
+                    total -= size
+                    deleted += 1
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        if deleted:
+            logger.info(f"Evicted {deleted} files from the storage cache")
+        return deleted
+
+
+def get_storage_cache() -> Optional[StorageCache]:
+    """
+    Get the process-wide storage cache, or None when STORAGE_CACHE_ENABLED is off.
+    """
+    global _cache
+    if not getattr(settings, 'STORAGE_CACHE_ENABLED', True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = StorageCache(
+                    directory=settings.STORAGE_CACHE_DIR,
+                    max_bytes=settings.STORAGE_CACHE_MAX_BYTES,
+                )
+    return _cache
@@ -1,13 +1,39 @@
 """
 Supabase integration for Django.
 This module provides utilities to interact with Supabase from Django applications.
+
+All Storage calls go through SupabaseStorage, which shares one storage
+client and keep-alive HTTP pool across requests and threads and retries
+transient failures.
 """
 
 import os
+import time
+import random
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import lru_cache
+
+import httpx
 from supabase import create_client, Client
+from storage3 import SyncStorageClient
+from storage3.exceptions import StorageApiError
 from django.conf import settings
 
+from config.request_metrics import external_call
+from config.storage_cache import get_storage_cache
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: rate limits and server errors
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+_storage_client = None
+_storage_client_lock = threading.Lock()
+_upload_executor = None
+
 
 @lru_cache(maxsize=1)
 def get_supabase_client() -> Client:
@@ -28,9 +54,95 @@ def get_supabase_client() -> Client:
     return create_client(supabase_url, supabase_key)
 
 
+def _create_http_client() -> httpx.Client:
+    timeout = httpx.Timeout(
+        getattr(settings, 'SUPABASE_STORAGE_TIMEOUT', 60.0),
+        connect=getattr(settings, 'SUPABASE_STORAGE_CONNECT_TIMEOUT', 10.0),
+    )
+    limits = httpx.Limits(
+        max_connections=getattr(settings, 'SUPABASE_STORAGE_MAX_CONNECTIONS', 20),
+        max_keepalive_connections=getattr(settings, 'SUPABASE_STORAGE_MAX_KEEPALIVE', 10),
+        keepalive_expiry=getattr(settings, 'SUPABASE_STORAGE_KEEPALIVE_EXPIRY', 60.0),
+    )
+    # The transport retries failed connection attempts; other transient
+    # errors are retried by SupabaseStorage
+    transport = httpx.HTTPTransport(limits=limits, retries=1)
+    return httpx.Client(timeout=timeout, transport=transport)
+
+
+def get_storage_client() -> SyncStorageClient:
+    """
+    Get the shared Supabase Storage client.
+
+    The client owns a dedicated keep-alive HTTP pool (the PostgREST and auth
+    clients rewrite the base URL of any httpx client they are given, so it is
+    not shared with them). httpx clients are thread-safe, so one instance
+    serves every request and worker thread.
+
+    Returns:
+        SyncStorageClient: Storage client for the configured project
+    """
+    global _storage_client
+    if _storage_client is None:
+        with _storage_client_lock:
+            if _storage_client is None:
+                supabase_url = settings.SUPABASE_URL
+                supabase_key = settings.SUPABASE_KEY
+                if not (supabase_url and supabase_key):
+                    raise ValueError(
+                        "SUPABASE_URL and SUPABASE_KEY must be configured in settings."
+                    )
+                _storage_client = SyncStorageClient(
+                    url=f"{supabase_url.rstrip('/')}/storage/v1",
+                    headers={
+                        'apiKey': supabase_key,
+                        'Authorization': f"Bearer {supabase_key}",
+                    },
+                    http_client=_create_http_client(),
+                )
+    return _storage_client
+
+
+def _get_upload_executor() -> ThreadPoolExecutor:
+    global _upload_executor
+    if _upload_executor is None:
+        with _storage_client_lock:
+            if _upload_executor is None:
+                _upload_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'SUPABASE_UPLOAD_WORKERS', 4),
+                    thread_name_prefix='supabase-upload',
+                )
+    return _upload_executor
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUSES
+    if isinstance(error, StorageApiError):
+        try:
+            return int(error.status) in RETRYABLE_STATUSES
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _is_duplicate(error: Exception) -> bool:
+    if not isinstance(error, StorageApiError):
+        return False
+    return str(error.status) == '409' or str(getattr(error, 'code', '')).lower() == 'duplicate'
+
+
 class SupabaseStorage:
     """
     Utility class for interacting with Supabase Storage.
+
+    Instances are cheap: they all use the client from get_storage_client().
+    Calls that fail with a transport error, timeout, rate limit or server
+    error are retried with jittered exponential backoff. Downloads are served
+    from the local disk cache (config.storage_cache) when the object's ETag
+    has not changed.
     
     Example usage:
         storage = SupabaseStorage()
@@ -39,7 +151,31 @@ class SupabaseStorage:
     """
     
     def __init__(self):
-        self.client = get_supabase_client()
+        self.client = get_storage_client()
+        self.cache = get_storage_cache()
+        self.max_retries = getattr(settings, 'SUPABASE_STORAGE_MAX_RETRIES', 3)
+        self.retry_backoff = getattr(settings, 'SUPABASE_STORAGE_RETRY_BACKOFF', 0.5)
+
+    def _call(self, operation, bucket, path, func):
+        attempt = 0
+        while True:
+            try:
+                with external_call('supabase'):
+                    return func(self.client.from_(bucket))
+            except Exception as e:
+                if operation == 'upload' and attempt > 0 and _is_duplicate(e):
+                    # An earlier attempt reached the server before the connection failed
+                    logger.info(f"Supabase upload of {bucket}/{path} already stored by a previous attempt")
+                    return None
+                if not _is_transient(e) or attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.retry_backoff * (2 ** attempt), 10.0))
+                attempt += 1
+                logger.warning(
+                    f"Supabase {operation} of {bucket}/{path} failed ({e.__class__.__name__}), "
+                    f"retry {attempt} in {delay:.1f}s"
+                )
+                time.sleep(delay)
         
     def upload_file(self, bucket, path, file, file_options=None):
         """
@@ -48,14 +184,38 @@ class SupabaseStorage:
         Args:
             bucket (str): Storage bucket name
             path (str): Path/filename in the bucket
-            file: File object or bytes
+            file: File object, bytes, or the path of a local file (streamed from disk)
             file_options (dict, optional): Additional file options
             
         Returns:
             dict: Response from Supabase
         """
-        return self.client.storage.from_(bucket).upload(path, file, file_options)
+        if hasattr(file, 'read'):
+            # Read once so a retry resends the whole file
+            file = file.read()
+        if self.cache is not None:
+            self.cache.invalidate(bucket, path)
+        # storage3 pops keys from file_options, so each attempt gets its own copy
+        return self._call('upload', bucket, path,
+                          lambda api: api.upload(path, file, dict(file_options) if file_options else None))
     
+    def upload_file_async(self, bucket, path, file, file_options=None) -> Future:
+        """
+        Start an upload on the shared upload thread pool.
+
+        Args:
+            bucket (str): Storage bucket name
+            path (str): Path/filename in the bucket
+            file (bytes or str): File content, or the path of a local file
+            file_options (dict, optional): Additional file options
+
+        Returns:
+            Future: Resolves to the upload response, or raises the upload error
+        """
+        # Run in a copy of the caller's context so request metrics see the call
+        context = contextvars.copy_context()
+        return _get_upload_executor().submit(context.run, self.upload_file, bucket, path, file, file_options)
+
     def get_download_url(self, bucket, path):
         """
         Get a public download URL for a file.
@@ -67,7 +227,7 @@ class SupabaseStorage:
         Returns:
             str: Public download URL
         """
-        return self.client.storage.from_(bucket).get_public_url(path)
+        return self.client.from_(bucket).get_public_url(path)
     
     def create_signed_url(self, bucket, path, expires_in=60):
         """
@@ -81,20 +241,105 @@ class SupabaseStorage:
         Returns:
             dict: Response with signed URL
         """
-        return self.client.storage.from_(bucket).create_signed_url(path, expires_in)
+        return self._call('sign', bucket, path, lambda api: api.create_signed_url(path, expires_in))
     
-    def download_file(self, bucket, path):
+    def get_metadata(self, bucket, path):
+        """
+        Fetch an object's metadata with a HEAD request, without downloading it.
+
+        Args:
+            bucket (str): Storage bucket name
+            path (str): Path/filename in the bucket
+
+        Returns:
+            dict: size, etag, last_modified and content_type, or None if the object does not exist
+        """
+        def head(api):
+            response = self.client.session.head(f"/object/{bucket}/{path}")
+            if response.status_code in (400, 404):
+                return None
+            response.raise_for_status()
+            return response
+
+        response = self._call('head', bucket, path, head)
+        if response is None:
+            return None
+        headers = response.headers
+        return {
+            'size': int(headers.get('content-length') or 0),
+            'etag': headers.get('etag', '').strip('"'),
+            'last_modified': headers.get('last-modified'),
+            'content_type': headers.get('content-type'),
+        }
+
+    def file_exists(self, bucket, path):
+        """
+        Check whether an object exists without downloading it.
+
+        Returns:
+            bool: True if the object exists
+        """
+        return self.get_metadata(bucket, path) is not None
+
+    def read_range(self, bucket, path, start, end):
+        """
+        Read bytes start..end (inclusive) of an object with an HTTP range request.
+
+        Args:
+            bucket (str): Storage bucket name
+            path (str): Path/filename in the bucket
+            start (int): First byte offset
+            end (int): Last byte offset (inclusive)
+
+        Returns:
+            bytes: The requested bytes
+        """
+        def get(api):
+            response = self.client.session.get(
+                f"/object/{bucket}/{path}", headers={'Range': f"bytes={start}-{end}"}
+            )
+            response.raise_for_status()
+            if response.status_code != 206:
+                # Server ignored the range header and sent the whole object
+                logger.warning(f"Range request for {bucket}/{path} returned the full object")
+                return response.content[start:end + 1]
+            return response.content
+
+        return self._call('range', bucket, path, get)
+
+    @staticmethod
+    def object_version(metadata):
+        """Identify an object version by its ETag (or size and modification time)."""
+        return metadata['etag'] or f"{metadata['size']}:{metadata['last_modified']}"
+
+    def download_file(self, bucket, path, use_cache=True):
         """
         Download a file from Supabase Storage.
+
+        With the disk cache enabled, a metadata request checks the object's
+        ETag and unchanged objects are read from the local cache.
         
         Args:
             bucket (str): Storage bucket name
             path (str): Path/filename in the bucket
+            use_cache (bool): Pass False to always fetch from storage
             
         Returns:
             bytes: File content
         """
-        return self.client.storage.from_(bucket).download(path)
+        if self.cache is None or not use_cache:
+            return self._call('download', bucket, path, lambda api: api.download(path))
+
+        metadata = self.get_metadata(bucket, path)
+        if metadata is not None:
+            data = self.cache.get(bucket, path, self.object_version(metadata))
+            if data is not None:
+                return data
+
+        data = self._call('download', bucket, path, lambda api: api.download(path))
+        if metadata is not None:
+            self.cache.put(bucket, path, self.object_version(metadata), data)
+        return data
     
     def remove_file(self, bucket, paths):
         """
@@ -109,7 +354,10 @@ class SupabaseStorage:
         """
         if isinstance(paths, str):
             paths = [paths]
-        return self.client.storage.from_(bucket).remove(paths)
+        if self.cache is not None:
+            for path in paths:
+                self.cache.invalidate(bucket, path)
+        return self._call('remove', bucket, ', '.join(paths), lambda api: api.remove(paths))
 
 
 class SupabaseAuth:
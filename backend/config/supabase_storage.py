@@ -5,8 +5,10 @@ Allows using Supabase Storage to store files in Django.
 
 import os
 from io import BytesIO
+from email.utils import parsedate_to_datetime
 from django.conf import settings
 from django.core.files.storage import Storage
+from django.utils import timezone
 from django.utils.deconstruct import deconstructible
 from .supabase import SupabaseStorage as SupabaseClient
 
@@ -62,13 +64,11 @@ class SupabaseStorage(Storage):
     
     def exists(self, name):
         """
-        Check if a file exists.
-        This is approximated since Supabase doesn't have a direct exists check.
+        Check if a file exists with a metadata-only request.
         """
         try:
-            self.client.download_file(self.bucket, self._get_path(name))
-            return True
-        except:
+            return self.client.file_exists(self.bucket, self._get_path(name))
+        except Exception:
             return False
     
     def delete(self, name):
@@ -89,10 +89,10 @@ class SupabaseStorage(Storage):
     
     def size(self, name):
         """
-        Get the size of a file.
-        Not directly supported, so returns 0.
+        Get the size of a file from its metadata.
         """
-        return 0  # Not directly supported by Supabase client
+        metadata = self.client.get_metadata(self.bucket, self._get_path(name))
+        return metadata['size'] if metadata else 0
     
     def get_accessed_time(self, name):
         """
@@ -110,10 +110,13 @@ class SupabaseStorage(Storage):
     
     def get_modified_time(self, name):
         """
-        Get the last modified time of a file.
-        Not directly supported, so returns None.
+        Get the last modified time of a file from its metadata.
         """
-        return None  # Not supported
+        metadata = self.client.get_metadata(self.bucket, self._get_path(name))
+        if not metadata or not metadata['last_modified']:
+            return None
+        modified = parsedate_to_datetime(metadata['last_modified'])
+        return modified if settings.USE_TZ else timezone.make_naive(modified)
 
 
 class SupabasePublicStorage(SupabaseStorage):
@@ -0,0 +1,61 @@
+from django.test import TestCase, override_settings
+
+from documents.models import LLMCacheEntry
+from .llm_backends import SyntheticLLMClient
+from .llm_cache import make_cache_key
+from .llm_gateway import LLMGateway
+
+MESSAGES = [
+    {'role': 'system', 'content': 'You write quiz questions.'},
+    {'role': 'user', 'content': 'Generate 2 mcq questions from:\n\nPlants absorb carbon dioxide.'},
+]
+
+
+class CacheKeyTests(TestCase):
+    def test_whitespace_and_temperature_bucket_do_not_change_key(self):
+        spaced = [{**message, 'content': f"  {message['content']}\n"} for message in MESSAGES]
+        self.assertEqual(
+            make_cache_key('gpt-4o', MESSAGES, temperature=0.71),
+            make_cache_key('gpt-4o', spaced, temperature=0.7),
+        )
+
+    def test_request_parameters_change_key(self):
+        key = make_cache_key('gpt-4o', MESSAGES, temperature=0.7, params={'max_tokens': 500})
+        self.assertNotEqual(key, make_cache_key('gpt-4o', MESSAGES, temperature=0.7, params={'max_tokens': 1000}))
+        self.assertNotEqual(key, make_cache_key('gpt-4o', MESSAGES, temperature=0.2, params={'max_tokens': 500}))
+        self.assertNotEqual(key, make_cache_key('gpt-4o-mini', MESSAGES, temperature=0.7, params={'max_tokens': 500}))
+        self.assertNotEqual(
+            key, make_cache_key('gpt-4o', MESSAGES, temperature=0.7, params={'max_tokens': 500}, variant=2)
+        )
+
+    def test_parameters_set_to_none_count_as_missing(self):
+        self.assertEqual(
+            make_cache_key('gpt-4o', MESSAGES, params={'max_tokens': None}),
+            make_cache_key('gpt-4o', MESSAGES),
+        )
+
+
+@override_settings(LLM_CACHE_ENABLED=True)
+class GatewayCacheTests(TestCase):
+    def setUp(self):
+        self.gateway = LLMGateway(client=SyntheticLLMClient(latency_mean=0))
+
+    def complete(self, **kwargs):
+        response = self.gateway.chat_completion(MESSAGES, model='gpt-4o', temperature=0.7, **kwargs)
+        return response.choices[0].message.content
+
+    def test_identical_request_is_served_from_cache(self):
+        first = self.complete(max_tokens=500)
+        self.assertEqual(self.complete(max_tokens=500), first)
+        self.assertEqual(LLMCacheEntry.objects.count(), 1)
+
+    def test_different_max_tokens_is_not_served_from_cache(self):
+        first = self.complete(max_tokens=500)
+        self.assertNotEqual(self.complete(max_tokens=1000), first)
+        self.assertEqual(LLMCacheEntry.objects.count(), 2)
+
+    def test_use_cache_false_bypasses_cache(self):
+        first = self.complete(max_tokens=500)
+        self.assertNotEqual(self.complete(max_tokens=500, use_cache=False), first)
+        self.assertEqual(LLMCacheEntry.objects.count(), 1)
+        self.assertEqual(LLMCacheEntry.objects.get().hit_count, 0)
@@ -0,0 +1,75 @@
+"""
+Token counting with cached tiktoken encoders.
+
+Building a tiktoken encoder parses (and on first use downloads) its BPE
+ranks, which costs far more than encoding a page, so encoders are created
+once per process and shared. If an encoder cannot be loaded (tiktoken
+missing, or no network to fetch the ranks) the failure is remembered and
+counts fall back to the ~4 characters per token estimate.
+
+Example usage:
+    count_tokens(page_text)                                   # gpt-4o tokens
+    count_tokens(text, model='text-embedding-ada-002')
+    truncate_to_tokens(text, 8000, model='text-embedding-ada-002')
+"""
+
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'gpt-4o'
+CHARS_PER_TOKEN = 4
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(model: str = DEFAULT_MODEL):
+    """
+    Return the shared tiktoken encoder for a model, or None if it cannot be loaded.
+    """
+    try:
+        return _encoders[model]
+    except KeyError:
+        pass
+    with _encoders_lock:
+        if model not in _encoders:
+            try:
+                import tiktoken
+                try:
+                    encoder = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoder = tiktoken.get_encoding('o200k_base')
+            except Exception as e:
+                logger.warning(f"tiktoken encoder for {model} unavailable ({e}); estimating token counts")
+                encoder = None
+            _encoders[model] = encoder
+    return _encoders[model]
+
+
+def estimate_tokens(text: str) -> int:
+    # Approximate token count (1 token ~= 4 chars in English)
+    return len(text) // CHARS_PER_TOKEN
+
+
+def count_tokens(text: Optional[str], model: str = DEFAULT_MODEL) -> int:
+    """Number of tokens in text for the given model."""
+    if not text:
+        return 0
+    encoder = get_encoder(model)
+    if encoder is None:
+        return estimate_tokens(text)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    """Cut text down to at most max_tokens tokens."""
+    encoder = get_encoder(model)
+    if encoder is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoder.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoder.decode(tokens[:max_tokens])
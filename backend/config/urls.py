@@ -5,6 +5,7 @@ from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenRefreshView, TokenObtainPairView
 from rest_framework import permissions
 from django.db.models import Max, Min
+from config.request_metrics import MetricsView
 
 # Set default authentication class
 REST_FRAMEWORK = {
@@ -80,6 +81,9 @@ urlpatterns = [
     
     # Settings endpoints
     path('api/settings/', include('settings.urls')),
+
+    # Request metrics (Prometheus text format, admin only)
+    path('api/metrics/', MetricsView.as_view(), name='request_metrics'),
 ]
 
 # Serve media files in development
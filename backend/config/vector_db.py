@@ -3,14 +3,21 @@ Vector database integration for Django using Supabase and pgvector.
 This module provides utilities to interact with vector databases in Supabase.
 """
 
+import importlib.util
+import io
 import os
+import json
+import pickle
+import threading
 import numpy as np
 from typing import List, Dict, Any, Union, Optional, Tuple
 from functools import lru_cache
 import logging
 
 from django.conf import settings
+from django.db.models import Count, Max
 from .supabase import get_supabase_client
+from .tokens import count_tokens, truncate_to_tokens
 
 # Try to import vecs for direct pgvector operations
 try:
@@ -20,12 +27,9 @@ except ImportError:
     VECS_AVAILABLE = False
     logging.warning("vecs package not available. Install with: pip install vecs")
 
-# Try to import OpenAI for generating embeddings
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+# Embeddings are generated through config.llm_gateway, which needs the openai package
+OPENAI_AVAILABLE = importlib.util.find_spec('openai') is not None
+if not OPENAI_AVAILABLE:
     logging.warning("openai package not available. Install with: pip install openai")
 
 
@@ -51,6 +55,266 @@ def get_vector_client():
         return None
 
 
+# Embeddings are stored as little-endian float32 behind a short header so that
+# legacy pickled rows can be told apart without guessing.
+EMBEDDING_HEADER = b'f32\x00'
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+
+class _EmbeddingUnpickler(pickle.Unpickler):
+    """Unpickler for legacy embeddings that refuses to resolve any global."""
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from a stored embedding")
+
+
+def pack_embedding(embedding) -> bytes:
+    """
+    Serialize an embedding into the compact binary format used by DocumentVector.
+
+    Args:
+        embedding: Sequence of floats or a NumPy array
+
+    Returns:
+        bytes: Header followed by the packed float32 values
+    """
+    return EMBEDDING_HEADER + np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def unpack_embedding(data) -> Optional[np.ndarray]:
+    """
+    Deserialize an embedding stored by pack_embedding.
+
+    Legacy rows written with pickle.dumps(list_of_floats) are still readable,
+    but only through an unpickler that cannot import or call anything.
+
+    Args:
+        data: bytes or memoryview from DocumentVector.embedding
+
+    Returns:
+        np.ndarray: float32 vector, or None if the data is empty or unreadable
+    """
+    if data is None:
+        return None
+    data = bytes(data)
+    if not data:
+        return None
+    if data.startswith(EMBEDDING_HEADER):
+        return np.frombuffer(data, dtype=EMBEDDING_DTYPE, offset=len(EMBEDDING_HEADER))
+    try:
+        values = _EmbeddingUnpickler(io.BytesIO(data)).load()
+        return np.asarray(values, dtype=EMBEDDING_DTYPE)
+    except Exception as e:
+        logging.error(f"Could not decode stored embedding: {e}")
+        return None
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so that a dot product equals cosine similarity."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _matches_filters(metadata: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """Evaluate the subset of vecs metadata filters supported by the local index."""
+    for key, condition in filters.items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            for op, expected in condition.items():
+                if op == '$eq' and value != expected:
+                    return False
+                if op == '$ne' and value == expected:
+                    return False
+                if op == '$in' and value not in expected:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class LocalVectorIndex:
+    """
+    In-process cosine similarity index over DocumentVector embeddings.
+
+    Used when the pgvector collection is not available. The normalized matrix
+    is persisted as a .npy file and memory-mapped on load, so several workers
+    share the same pages instead of each holding a private copy.
+
+    Example usage:
+        index = get_local_vector_index()
+        results = index.search(query_embedding, limit=5)
+    """
+
+    MATRIX_FILE = 'embeddings.npy'
+    MANIFEST_FILE = 'manifest.json'
+    QUERY_BLOCK_SIZE = 64
+
+    def __init__(self, index_dir: str = None, dimension: int = 1536):
+        self.index_dir = index_dir or getattr(
+            settings, 'VECTOR_INDEX_DIR', os.path.join(settings.BASE_DIR, 'vector_index')
+        )
+        self.dimension = dimension
+        self.matrix = np.zeros((0, dimension), dtype=EMBEDDING_DTYPE)
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.signature = None
+        self._lock = threading.Lock()
+
+    @property
+    def matrix_path(self):
+        return os.path.join(self.index_dir, self.MATRIX_FILE)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.index_dir, self.MANIFEST_FILE)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _db_signature() -> str:
+        """Cheap fingerprint of the DocumentVector table used to detect stale indexes."""
+        from documents.models import DocumentVector
+
+        stats = DocumentVector.objects.filter(embedding__isnull=False).aggregate(
+            count=Count('id'), latest=Max('updated_at')
+        )
+        latest = stats['latest'].isoformat() if stats['latest'] else ''
+        return f"{stats['count']}:{latest}"
+
+    def refresh(self, force: bool = False) -> 'LocalVectorIndex':
+        """
+        Make sure the in-memory index reflects the database.
+
+        Loads the on-disk index when its manifest matches the current table
+        signature and rebuilds it otherwise.
+        """
+        with self._lock:
+            signature = self._db_signature()
+            if not force and signature == self.signature:
+                return self
+            if not force and self._load(signature):
+                return self
+            self._build(signature)
+            return self
+
+    def _load(self, signature: str) -> bool:
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get('signature') != signature or manifest.get('dimension') != self.dimension:
+                return False
+            self.matrix = np.load(self.matrix_path, mmap_mode='r')
+            self.ids = manifest['ids']
+            self.metadata = manifest['metadata']
+            self.signature = signature
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def _build(self, signature: str):
+        from documents.models import DocumentVector
+
+        ids, metadata, rows = [], [], []
+        queryset = DocumentVector.objects.filter(embedding__isnull=False).values_list(
+            'vector_uuid', 'embedding', 'metadata'
+        )
+        for vector_uuid, embedding, meta in queryset.iterator(chunk_size=1000):
+            vector = unpack_embedding(embedding)
+            if vector is None or vector.shape[0] != self.dimension:
+                continue
+            ids.append(str(vector_uuid))
+            metadata.append(meta or {})
+            rows.append(vector)
+
+        matrix = np.vstack(rows) if rows else np.zeros((0, self.dimension), dtype=EMBEDDING_DTYPE)
+        matrix = _normalize_rows(matrix.astype(EMBEDDING_DTYPE, copy=False))
+
+        # Write to temporary files and rename so concurrent readers never see a partial index
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_matrix = f"{self.matrix_path}.{os.getpid()}.tmp"
+        tmp_manifest = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_matrix, 'wb') as f:
+            np.save(f, matrix)
+        with open(tmp_manifest, 'w') as f:
+            json.dump({
+                'signature': signature,
+                'dimension': self.dimension,
+                'ids': ids,
+                'metadata': metadata,
+            }, f, default=str)
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_manifest, self.manifest_path)
+
+        self.matrix = np.load(self.matrix_path, mmap_mode='r')
+        self.ids = ids
+        self.metadata = metadata
+        self.signature = signature
+        logging.info(f"Built local vector index with {len(ids)} vectors in {self.index_dir}")
+
+    def search(self, query_embedding, limit: int = 5,
+               filters: Dict[str, Any] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """
+        Return the most similar vectors to a single query.
+
+        Returns:
+            List of (uuid, cosine similarity, metadata) tuples, best first
+        """
+        return self.search_many([query_embedding], limit=limit, filters=filters)[0]
+
+    def search_many(self, query_embeddings, limit: int = 5,
+                    filters: Dict[str, Any] = None) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        """
+        Return the most similar vectors for a batch of queries.
+
+        Queries are scored with one matrix product per block and the top-k is
+        selected with argpartition, so cost stays linear in the index size.
+        """
+        queries = np.asarray(query_embeddings, dtype=EMBEDDING_DTYPE).reshape(-1, self.dimension)
+        results = [[] for _ in range(queries.shape[0])]
+        if not self.ids or limit <= 0:
+            return results
+
+        candidates = None
+        if filters:
+            candidates = np.array([
+                i for i, meta in enumerate(self.metadata) if _matches_filters(meta, filters)
+            ], dtype=np.int64)
+            if candidates.size == 0:
+                return results
+        matrix = self.matrix if candidates is None else self.matrix[candidates]
+        k = min(limit, matrix.shape[0])
+
+        queries = _normalize_rows(queries)
+        for start in range(0, queries.shape[0], self.QUERY_BLOCK_SIZE):
+            scores = queries[start:start + self.QUERY_BLOCK_SIZE] @ matrix.T
+            if k < scores.shape[1]:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+            for offset, row in enumerate(top):
+                row_scores = scores[offset, row]
+                order = row[np.argsort(-row_scores)]
+                hits = []
+                for col in order:
+                    idx = int(col if candidates is None else candidates[col])
+                    hits.append((self.ids[idx], float(scores[offset, col]), self.metadata[idx]))
+                results[start + offset] = hits
+        return results
+
+
+@lru_cache(maxsize=1)
+def get_local_vector_index() -> LocalVectorIndex:
+    """
+    Get the process-wide local vector index.
+
+    Returns:
+        LocalVectorIndex: Shared index instance (call refresh() before searching)
+    """
+    return LocalVectorIndex()
+
+
 class VectorDB:
     """
     Utility class for interacting with vector databases in Supabase.
@@ -69,16 +333,13 @@ class VectorDB:
             collection_name (str): Name of the vector collection
             dimension (int): Dimension of the vectors (1536 for OpenAI embeddings)
         """
-        if not VECS_AVAILABLE:
-            raise ImportError("vecs package is required for VectorDB")
-        
-        self.client = get_vector_client()
+        self.client = get_vector_client() if VECS_AVAILABLE else None
         self.collection_name = collection_name
         self.dimension = dimension
         
-        # Handle case when client is None (connection failed)
+        # Handle case when vecs is missing or the connection failed
         if self.client is None:
-            logging.warning("Vector database connection failed. Using local file storage only.")
+            logging.warning("Vector database connection failed. Using local NumPy index for search.")
             self.collection = None
             return
             
@@ -92,9 +353,26 @@ class VectorDB:
             logging.error(f"Error creating collection: {e}")
             self.collection = None
         
-        # Set up OpenAI if available
-        if OPENAI_AVAILABLE:
-            openai.api_key = getattr(settings, 'OPENAI_API_KEY', os.environ.get('OPENAI_API_KEY'))
+    
+    # OpenAI accepts up to 2048 inputs per embeddings request; stay well below
+    # that so a single batch also fits the per-request token limit.
+    EMBEDDING_BATCH_SIZE = 100
+    EMBEDDING_MODEL = "text-embedding-ada-002"
+    MAX_EMBEDDING_TOKENS = 8000
+    
+    @classmethod
+    def prepare_embedding_text(cls, text: str) -> str:
+        """Apply the placeholder and length limit used for every embedding input."""
+        # If text is empty or just whitespace, use a placeholder
+        if not text or not text.strip():
+            return "[This document contains no extractable text]"
+        
+        # Exact token count: non-English text (e.g. Tamil) runs far over 1 token per 4 chars
+        tokens = count_tokens(text, cls.EMBEDDING_MODEL)
+        if tokens > cls.MAX_EMBEDDING_TOKENS:
+            logging.warning(f"Text too long ({tokens} tokens), truncating to first {cls.MAX_EMBEDDING_TOKENS} tokens")
+            text = truncate_to_tokens(text, cls.MAX_EMBEDDING_TOKENS, cls.EMBEDDING_MODEL)
+        return text
     
     def generate_embedding(self, text: str) -> List[float]:
         """
@@ -106,89 +384,154 @@ class VectorDB:
         Returns:
             List[float]: Embedding vector
         """
+        return self.generate_embeddings([text])[0]
+    
+    def generate_embeddings(self, texts: List[str], batch_size: int = None) -> List[Optional[List[float]]]:
+        """
+        Generate embeddings for many texts with one OpenAI request per batch.
+        
+        Args:
+            texts (list): Texts to embed
+            batch_size (int, optional): Inputs per request (defaults to EMBEDDING_BATCH_SIZE)
+            
+        Returns:
+            List: One embedding per input text, None where a batch failed
+        """
+        embeddings = [None] * len(texts)
         if not OPENAI_AVAILABLE:
             logging.error("OpenAI package is required for generating embeddings")
-            return None
+            return embeddings
         
-        # If text is empty or just whitespace, use a placeholder
-        if not text or not text.strip():
-            text = "[This document contains no extractable text]"
+        if not getattr(settings, 'OPENAI_API_KEY', os.environ.get('OPENAI_API_KEY')):
+            logging.error("OpenAI API key not found")
+            return embeddings
         
-        try:
-            # Check if API key is available
-            api_key = getattr(settings, 'OPENAI_API_KEY', os.environ.get('OPENAI_API_KEY'))
-            if not api_key:
-                logging.error("OpenAI API key not found")
-                return None
-                
-            # Set API key - new OpenAI client style
-            from openai import OpenAI
-            client = OpenAI(api_key=api_key)
-            
-            # Handle large documents by chunking
-            # Approximate token count (1 token ~= 4 chars in English)
-            approx_tokens = len(text) / 4
-            
-            if approx_tokens > 8000:  # Close to the 8192 limit
-                logging.warning(f"Text too long (approx {approx_tokens:.0f} tokens), truncating to first 8000 tokens")
-                # Truncate to approximately 8000 tokens (32000 chars)
-                text = text[:32000]
-                
-            # Generate embedding - new API style
-            response = client.embeddings.create(
-                input=text,
-                model="text-embedding-ada-002"
-            )
-            return response.data[0].embedding
-        except Exception as e:
-            logging.error(f"Error generating embedding: {e}")
-            return None
+        from .llm_gateway import get_llm_gateway
+        gateway = get_llm_gateway()
+        batch_size = batch_size or self.EMBEDDING_BATCH_SIZE
+        for start in range(0, len(texts), batch_size):
+            batch = [self.prepare_embedding_text(t) for t in texts[start:start + batch_size]]
+            try:
+                response = gateway.create_embeddings(
+                    input=batch,
+                    model=self.EMBEDDING_MODEL
+                )
+                for item in response.data:
+                    embeddings[start + item.index] = item.embedding
+            except Exception as e:
+                logging.error(f"Error generating embeddings for batch starting at {start}: {e}")
+        return embeddings
     
-    def upsert_document(self, doc_uuid: str, text: str, metadata: Dict[str, Any] = None) -> bool:
+    def upsert_document(self, doc_uuid: str, text: str, metadata: Dict[str, Any] = None,
+                        build_index: bool = False) -> bool:
         """
         Insert or update a document with its embedding vector.
         
+        The ANN index is not rebuilt here; call build_index() once after a
+        series of upserts (or use upsert_many, which does it at the end).
+        
         Args:
             doc_uuid (str): Unique document UUID
             text (str): Document text content to generate embedding from
             metadata (dict, optional): Additional metadata for the document
+            build_index (bool): Rebuild the ANN index after this upsert
             
         Returns:
             bool: Success status
         """
-        try:
-            # If collection is None, just store metadata locally
-            if self.collection is None:
-                logging.warning(f"Vector collection not available. Document {doc_uuid} stored only locally.")
-                return True
-                
-            # Generate embedding
-            embedding = self.generate_embedding(text)
+        result = self.upsert_many([(doc_uuid, text, metadata)], build_index=build_index)
+        return not result['failed']
+    
+    def upsert_many(self, documents, batch_size: int = None, build_index: bool = True) -> Dict[str, Any]:
+        """
+        Bulk insert or update documents.
+        
+        Texts are embedded in batches, each batch is written to the collection
+        in a single round-trip, and the ANN index is rebuilt once at the end.
+        
+        Args:
+            documents: Iterable of (doc_uuid, text, metadata) tuples. A fourth
+                element may carry a precomputed embedding to skip the API call.
+            batch_size (int, optional): Documents per embedding/upsert batch
+            build_index (bool): Rebuild the ANN index after all batches
             
-            # Prepare metadata
-            if metadata is None:
-                metadata = {}
-                
+        Returns:
+            dict: {'upserted': int, 'failed': [doc_uuid, ...], 'embeddings': {doc_uuid: embedding}}
+        """
+        batch_size = batch_size or self.EMBEDDING_BATCH_SIZE
+        result = {'upserted': 0, 'failed': [], 'embeddings': {}}
+        
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                self._upsert_batch(batch, result)
+                batch = []
+        if batch:
+            self._upsert_batch(batch, result)
+        
+        if build_index and result['upserted']:
+            self.build_index()
+        return result
+    
+    def _upsert_batch(self, batch, result: Dict[str, Any]):
+        """Embed and write one batch of documents, recording the outcome in result."""
+        pending = [i for i, doc in enumerate(batch) if len(doc) < 4 or doc[3] is None]
+        generated = self.generate_embeddings([batch[i][1] for i in pending], batch_size=len(batch)) if pending else []
+        embeddings = [doc[3] if len(doc) > 3 else None for doc in batch]
+        for i, embedding in zip(pending, generated):
+            embeddings[i] = embedding
+        
+        records = []
+        for (doc_uuid, text, metadata, *_), embedding in zip(batch, embeddings):
+            if embedding is None:
+                result['failed'].append(doc_uuid)
+                continue
+            metadata = dict(metadata or {})
             # Add text preview to metadata
             if text and len(text) > 1000:
                 metadata['text_preview'] = text[:1000] + "..."
             else:
                 metadata['text_preview'] = text
-                
-            # Store in vector database
-            self.collection.upsert(
-                records=[
-                    (doc_uuid, embedding, metadata)
-                ]
-            )
-            
-            # Create index if it doesn't exist
-            # This is a no-op if the index already exists
+            records.append((doc_uuid, embedding, metadata))
+            result['embeddings'][doc_uuid] = embedding
+        
+        if not records:
+            return
+        
+        # Without a collection the caller persists the embedding on DocumentVector
+        # and the local index picks it up on its next refresh.
+        if self.collection is None:
+            result['upserted'] += len(records)
+            return
+        
+        try:
+            self.collection.upsert(records=records)
+            result['upserted'] += len(records)
+        except Exception as e:
+            logging.error(f"Error upserting batch of {len(records)} documents: {e}")
+            result['failed'].extend(doc_uuid for doc_uuid, _, _ in records)
+            for doc_uuid, _, _ in records:
+                result['embeddings'].pop(doc_uuid, None)
+    
+    def build_index(self) -> bool:
+        """
+        Build or refresh the ANN index.
+        
+        vecs rebuilds the index from scratch on every call, so this should run
+        once after bulk ingestion or periodically, never per document.
+        
+        Returns:
+            bool: Success status
+        """
+        try:
+            if self.collection is None:
+                get_local_vector_index().refresh(force=True)
+                return True
             self.collection.create_index()
-            
             return True
         except Exception as e:
-            logging.error(f"Error upserting document: {e}")
+            logging.error(f"Error building vector index: {e}")
             return False
     
     def upsert_file(self, doc_uuid: str, file_path: str, extracted_text: str, metadata: Dict[str, Any] = None) -> bool:
@@ -238,13 +581,18 @@ class VectorDB:
             List[Dict]: Search results
         """
         try:
-            # If collection is None, return empty results
-            if self.collection is None:
-                logging.warning("Vector collection not available. Search returning empty results.")
-                return []
-                
             # Generate embedding for query
             query_embedding = self.generate_embedding(query_text)
+            if query_embedding is None:
+                return []
+            
+            # Fall back to the in-process index when pgvector is unavailable
+            if self.collection is None:
+                index = get_local_vector_index().refresh()
+                return [
+                    self._format_result(doc_uuid, similarity, metadata, include_metadata)
+                    for doc_uuid, similarity, metadata in index.search(query_embedding, limit, filters)
+                ]
             
             # Query the vector database
             results = self.collection.query(
@@ -256,21 +604,75 @@ class VectorDB:
             )
             
             # Format results
-            formatted_results = []
-            for doc_uuid, similarity, metadata in results:
-                result = {
-                    'uuid': doc_uuid,
-                    'similarity': similarity
-                }
-                if include_metadata:
-                    result['metadata'] = metadata
-                formatted_results.append(result)
-                
-            return formatted_results
+            return [
+                self._format_result(doc_uuid, similarity, metadata, include_metadata)
+                for doc_uuid, similarity, metadata in results
+            ]
         except Exception as e:
             logging.error(f"Error searching documents: {e}")
             return []
     
+    def search_many(self, query_texts: List[str], limit: int = 5, include_metadata: bool = True,
+                    filters: Dict[str, Any] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for documents similar to each of several queries.
+        
+        All query embeddings are generated in batched requests; the local
+        index scores the whole batch with a single matrix product.
+        
+        Args:
+            query_texts (list): Query texts to search for
+            limit (int): Maximum number of results per query
+            include_metadata (bool): Whether to include metadata in results
+            filters (dict): Metadata filters to apply
+            
+        Returns:
+            List[List[Dict]]: Search results for each query, in input order
+        """
+        results = [[] for _ in query_texts]
+        try:
+            query_embeddings = self.generate_embeddings(list(query_texts))
+            valid = [i for i, embedding in enumerate(query_embeddings) if embedding is not None]
+            if not valid:
+                return results
+            
+            if self.collection is None:
+                index = get_local_vector_index().refresh()
+                hits = index.search_many([query_embeddings[i] for i in valid], limit, filters)
+                for i, query_hits in zip(valid, hits):
+                    results[i] = [
+                        self._format_result(doc_uuid, similarity, metadata, include_metadata)
+                        for doc_uuid, similarity, metadata in query_hits
+                    ]
+                return results
+            
+            for i in valid:
+                rows = self.collection.query(
+                    data=query_embeddings[i],
+                    limit=limit,
+                    include_metadata=include_metadata,
+                    include_value=True,
+                    filters=filters
+                )
+                results[i] = [
+                    self._format_result(doc_uuid, similarity, metadata, include_metadata)
+                    for doc_uuid, similarity, metadata in rows
+                ]
+            return results
+        except Exception as e:
+            logging.error(f"Error searching documents: {e}")
+            return results
+    
+    @staticmethod
+    def _format_result(doc_uuid, similarity, metadata, include_metadata: bool) -> Dict[str, Any]:
+        result = {
+            'uuid': doc_uuid,
+            'similarity': similarity
+        }
+        if include_metadata:
+            result['metadata'] = metadata
+        return result
+    
     def delete_document(self, doc_uuid: str) -> bool:
         """
         Delete a document from the vector database.
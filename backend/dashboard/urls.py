@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import dashboard_data
+from .views import dashboard_data, llm_usage
 
 app_name = 'dashboard'
 
 urlpatterns = [
     path('', dashboard_data, name='dashboard_data'),  # responds to /api/dashboard/
+    path('llm-usage/', llm_usage, name='llm_usage'),  # ?group_by=quiz|teacher|document|model|day&days=30
 ]
@@ -11,6 +11,10 @@ from students.models import Student
 from teacher.models import Teacher
 from departments.models import Department
 from collections import defaultdict
+from datetime import timedelta
+from django.utils import timezone
+from accounts.permissions import IsAdmin
+from config.llm_usage import usage_report
 
 
 # Set up logging
@@ -175,4 +179,25 @@ def dashboard_data(request):
         return Response(
             {"error": "Internal server error", "details": str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def llm_usage(request):
+    """LLM cost and latency grouped by quiz, teacher, document, model or day."""
+    group_by = request.query_params.get('group_by', 'quiz')
+    try:
+        days = int(request.query_params.get('days', 30))
+        since = timezone.now() - timedelta(days=days) if days > 0 else None
+        rows = usage_report(group_by=group_by, since=since)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        "group_by": group_by,
+        "days": days,
+        "total_cost_usd": round(sum(row["cost_usd"] for row in rows), 6),
+        "total_calls": sum(row["calls"] for row in rows),
+        "results": rows,
+    })
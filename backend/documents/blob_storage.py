@@ -0,0 +1,292 @@
+"""
+Content-addressed, deduplicated file storage.
+
+Uploaded files are stored once per distinct content under
+blobs/<sha[:2]>/<sha256> in the fileupload bucket and tracked by a
+StoredBlob row whose ref_count is the number of Document rows using it.
+Uploading a file whose hash is already stored skips the upload entirely.
+When documents are deleted their references are released, and blobs
+that reach zero references are removed from storage.
+
+Files that are on disk are hashed in chunks and uploaded by path, so
+storage3 streams them and they are never held in memory.
+
+Example usage:
+    upload = BlobUpload(uploaded_file, 'application/pdf')   # starts the upload unless already stored
+    ...process the file...
+    if upload.wait() is None and document_kept:
+        upload.attach(document)
+    else:
+        upload.discard()
+"""
+
+import hashlib
+import logging
+import os
+from collections import Counter
+from datetime import timedelta
+from typing import Iterable, Optional, Union
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from config.supabase import SupabaseStorage
+from .models import StoredBlob
+
+logger = logging.getLogger(__name__)
+
+BLOB_BUCKET = "fileupload"
+HASH_CHUNK_SIZE = 1024 * 1024
+# Uploads that reserved a blob this long ago without attaching or discarding it are assumed dead
+RESERVATION_TIMEOUT = timedelta(days=1)
+
+
+def content_hash(data: Union[bytes, str]) -> str:
+    """SHA-256 of bytes, or of the file at a local path (read in chunks)."""
+    if isinstance(data, (bytes, bytearray)):
+        return hashlib.sha256(data).hexdigest()
+    hasher = hashlib.sha256()
+    with open(data, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def local_file_path(file_obj) -> Optional[str]:
+    """Path of the file on disk behind an uploaded or opened file, or None if it only lives in memory."""
+    if hasattr(file_obj, 'temporary_file_path'):
+        return file_obj.temporary_file_path()
+    name = getattr(getattr(file_obj, 'file', file_obj), 'name', None)
+    return name if isinstance(name, str) and os.path.isfile(name) else None
+
+
+def blob_path(sha256: str) -> str:
+    return f"blobs/{sha256[:2]}/{sha256}"
+
+
+class BlobUpload:
+    """
+    Store file content under its hash, skipping the upload when it is already stored.
+
+    The StoredBlob row is reserved (pending_uploads) before the upload starts,
+    so concurrent uploads of the same content share one row and garbage
+    collection leaves it alone. The upload runs in the background
+    (SupabaseStorage.upload_file_async); the reservation is turned into a
+    document reference by attach() once the caller knows the document is
+    worth keeping, or dropped by discard().
+
+    data may be bytes or a file object. A file on disk is uploaded from its
+    path, which must exist until wait() returns; the background upload then
+    never shares the caller's file position. Other file objects are read.
+    """
+
+    def __init__(self, data, content_type: str = '', storage: Optional[SupabaseStorage] = None):
+        if not isinstance(data, (bytes, bytearray)):
+            data = local_file_path(data) or _read_all(data)
+        self.source = data
+        self.size = os.path.getsize(data) if isinstance(data, str) else len(data)
+        self.content_type = content_type or ''
+        self.sha256 = content_hash(data)
+        self.path = blob_path(self.sha256)
+        self.storage = storage or SupabaseStorage()
+        self.skipped = self._reserve()
+        self._reserved = True
+        self._future = None
+        if self.skipped:
+            logger.info(f"Blob {self.sha256[:12]} already stored, skipping upload of {self.size} bytes")
+        else:
+            self._future = self.storage.upload_file_async(BLOB_BUCKET, self.path, data, self._file_options())
+
+    def _reserve(self) -> bool:
+        """
+        Create or reserve the blob row.
+
+        Returns:
+            bool: True if the content is already stored, i.e. the row existed
+                with no upload in progress (an upload in progress may still fail)
+        """
+        with transaction.atomic():
+            blob, created = StoredBlob.objects.select_for_update().get_or_create(
+                sha256=self.sha256,
+                defaults={
+                    'bucket': BLOB_BUCKET,
+                    'storage_path': self.path,
+                    'size': self.size,
+                    'content_type': self.content_type,
+                },
+            )
+            stored = not created and blob.pending_uploads <= 0
+            StoredBlob.objects.filter(pk=blob.pk).update(
+                pending_uploads=F('pending_uploads') + 1, last_referenced_at=timezone.now()
+            )
+        return stored
+
+    def _file_options(self):
+        # Same key always means same bytes, so overwriting is harmless
+        options = {'upsert': 'true'}
+        if self.content_type:
+            options['content-type'] = self.content_type
+        return options
+
+    def wait(self) -> Optional[Exception]:
+        """
+        Wait for the upload to finish.
+
+        Returns:
+            Exception: The upload error, or None on success (or when skipped)
+        """
+        if self._future is None:
+            return None
+        try:
+            self._future.result()
+            return None
+        except Exception as e:
+            return e
+
+    def attach(self, document) -> StoredBlob:
+        """
+        Reference the blob from a document, turning this upload's reservation into the reference.
+
+        Call only after wait() returned None. If the blob row is gone (the
+        reservation went stale and was collected), the content is uploaded
+        again and the row recreated.
+        """
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(sha256=self.sha256).first()
+            if blob is None:
+                self.storage.upload_file(BLOB_BUCKET, self.path, self.source, self._file_options())
+                blob = StoredBlob.objects.create(
+                    sha256=self.sha256,
+                    bucket=BLOB_BUCKET,
+                    storage_path=self.path,
+                    size=self.size,
+                    content_type=self.content_type,
+                    ref_count=1,
+                )
+                _link(document, blob)
+            elif self._reserved:
+                StoredBlob.objects.filter(pk=blob.pk).update(
+                    ref_count=F('ref_count') + 1,
+                    pending_uploads=F('pending_uploads') - 1,
+                    last_referenced_at=timezone.now(),
+                )
+                _link(document, blob)
+            else:
+                add_blob_reference(document, blob)
+            self._reserved = False
+        return blob
+
+    def discard(self):
+        """
+        Drop this upload's reservation without referencing the blob.
+
+        Call after wait() when the document was not kept or the upload failed. The stored
+        object and its row are removed only when no document references the
+        blob and no other upload of the same content is in progress.
+        """
+        if not self._reserved:
+            return
+        self._reserved = False
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(sha256=self.sha256).first()
+            if blob is None:
+                return
+            if blob.pending_uploads > 1 or blob.ref_count > 0:
+                StoredBlob.objects.filter(pk=blob.pk).update(pending_uploads=F('pending_uploads') - 1)
+                return
+            try:
+                self.storage.remove_file(blob.bucket, blob.storage_path)
+            except Exception as e:
+                logger.warning(f"Could not remove unreferenced blob {self.sha256[:12]}: {e}")
+            blob.delete()
+
+
+def _read_all(file_obj) -> bytes:
+    file_obj.seek(0)
+    data = file_obj.read()
+    file_obj.seek(0)
+    return data
+
+
+def _link(document, blob):
+    document.blob = blob
+    document.storage_path = blob.storage_path
+    document.save(update_fields=['blob', 'storage_path'])
+
+
+def add_blob_reference(document, blob: StoredBlob):
+    """Make a document reference an existing blob and count the reference."""
+    with transaction.atomic():
+        StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1, last_referenced_at=timezone.now())
+        _link(document, blob)
+
+
+def release_blobs(blob_ids: Iterable[Optional[int]], storage: Optional[SupabaseStorage] = None) -> int:
+    """
+    Drop one reference per id (ids may repeat) and collect blobs left unreferenced.
+
+    Call after the documents referencing the blobs have been deleted.
+
+    Returns:
+        int: Number of blobs removed from storage
+    """
+    counts = Counter(blob_id for blob_id in blob_ids if blob_id)
+    if not counts:
+        return 0
+    with transaction.atomic():
+        for blob_id, count in counts.items():
+            StoredBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') - count)
+    return collect_garbage(blob_ids=list(counts), storage=storage)
+
+
+def collect_garbage(blob_ids=None, reconcile: bool = False, storage: Optional[SupabaseStorage] = None) -> int:
+    """
+    Remove blobs with no references and no upload in progress from storage and the database.
+
+    Args:
+        blob_ids (list): Only consider these blobs (default: all)
+        reconcile (bool): First recompute every ref_count from the Document rows,
+            repairing counts left stale by deletes that bypassed release_blobs(), and
+            drop reservations older than RESERVATION_TIMEOUT (uploads that never finished)
+        storage (SupabaseStorage): Storage to remove objects from (default: a new client)
+
+    Returns:
+        int: Number of blobs removed
+    """
+    queryset = StoredBlob.objects.all()
+    if blob_ids is not None:
+        queryset = queryset.filter(pk__in=blob_ids)
+
+    if reconcile:
+        for blob in queryset.annotate(references=Count('documents')):
+            if blob.ref_count != blob.references:
+                logger.info(f"Blob {blob.sha256[:12]} ref_count {blob.ref_count} -> {blob.references}")
+                StoredBlob.objects.filter(pk=blob.pk).update(ref_count=blob.references)
+        stale = queryset.filter(pending_uploads__gt=0, last_referenced_at__lt=timezone.now() - RESERVATION_TIMEOUT)
+        for blob in stale:
+            logger.info(f"Blob {blob.sha256[:12]} dropping {blob.pending_uploads} stale upload reservations")
+        stale.update(pending_uploads=0)
+
+    removed = 0
+    storage = storage or SupabaseStorage()
+    unreferenced = queryset.filter(ref_count__lte=0, pending_uploads__lte=0)
+    for blob_id in unreferenced.values_list('pk', flat=True):
+        try:
+            # Holding the row lock while the object is removed keeps attach()
+            # from referencing a blob that is being deleted
+            with transaction.atomic():
+                blob = StoredBlob.objects.select_for_update().filter(
+                    pk=blob_id, ref_count__lte=0, pending_uploads__lte=0
+                ).first()
+                if blob is None:
+                    continue
+                storage.remove_file(blob.bucket, blob.storage_path)
+                blob.delete()
+            removed += 1
+        except Exception as e:
+            logger.error(f"Failed to remove blob {blob_id}: {e}")
+
+    if removed:
+        logger.info(f"Removed {removed} unreferenced blobs")
+    return removed
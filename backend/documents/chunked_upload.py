@@ -0,0 +1,303 @@
+"""
+Resumable chunked uploads.
+
+A large file is sent as numbered parts instead of one multipart POST:
+
+    POST   /quiz/<id>/upload/chunked/                          start a session
+    PUT    /quiz/<id>/upload/chunked/<upload_id>/parts/<n>/    send part n (raw body)
+    GET    /quiz/<id>/upload/chunked/<upload_id>/              list received parts
+    POST   /quiz/<id>/upload/chunked/<upload_id>/complete/     assemble and process
+
+Parts may be sent in any order and in parallel, and a failed part is simply
+sent again, so a network error costs one part rather than the whole file.
+Each part carries a checksum (X-Content-SHA256 as hex, or Content-MD5 as
+base64) that is verified while the body is streamed to disk; a part only
+becomes visible once verified (temp file + os.replace). On completion the
+parts are concatenated with os.copy_file_range, which copies inside the
+kernel without passing the bytes through Python.
+
+Part files live under CHUNKED_UPLOAD_DIR/<upload_id>/, which must be shared
+by every worker that can receive a part. Sessions that are not completed
+expire after CHUNKED_UPLOAD_EXPIRY_HOURS and are removed by the
+clear_expired_uploads command.
+"""
+
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from quiz.utils import check_storable
+from .models import UploadSession
+
+logger = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 256 * 1024
+MAX_PART_SIZE = 64 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+ASSEMBLED_NAME = 'assembled'
+
+
+def session_dir(session: UploadSession) -> str:
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, str(session.pk))
+
+
+def part_path(session: UploadSession, part_number: int) -> str:
+    return os.path.join(session_dir(session), f"{part_number:05d}.part")
+
+
+def create_session(quiz, user, file_name: str, size: int, content_type: str = '',
+                   part_size: Optional[int] = None, sha256: str = '', options: Optional[Dict] = None) -> UploadSession:
+    """
+    Start a chunked upload.
+
+    Args:
+        quiz: Quiz the file is uploaded to
+        user: Uploading user
+        file_name (str): Original file name
+        size (int): Total file size in bytes
+        content_type (str): MIME type of the file
+        part_size (int): Requested part size (default CHUNKED_UPLOAD_PART_SIZE)
+        sha256 (str): Optional hex SHA-256 of the whole file, verified on completion
+        options (dict): Processing options applied on completion (page_range, fresh)
+
+    Returns:
+        UploadSession: The new session
+
+    Raises:
+        ValidationError: If the file or part size is not acceptable
+    """
+    if not file_name:
+        raise ValidationError("file_name is required")
+    try:
+        size = int(size)
+        part_size = int(part_size or settings.CHUNKED_UPLOAD_PART_SIZE)
+    except (TypeError, ValueError):
+        raise ValidationError("size and part_size must be integers")
+    if size <= 0:
+        raise ValidationError("size must be positive")
+    if size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+        max_size_mb = settings.CHUNKED_UPLOAD_MAX_SIZE // (1024 * 1024)
+        raise ValidationError(f"File is too large (>{max_size_mb} MB). Please upload a smaller file.")
+    # Files that processing would reject are refused before any part is sent
+    check_storable(file_name, size)
+    if not MIN_PART_SIZE <= part_size <= MAX_PART_SIZE:
+        raise ValidationError(f"part_size must be between {MIN_PART_SIZE} and {MAX_PART_SIZE} bytes")
+    sha256 = (sha256 or '').lower()
+    if sha256 and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256)):
+        raise ValidationError("sha256 must be a hex SHA-256 digest")
+
+    session = UploadSession.objects.create(
+        user=user,
+        quiz=quiz,
+        file_name=os.path.basename(file_name),
+        content_type=content_type or '',
+        size=size,
+        part_size=min(part_size, size),
+        sha256=sha256,
+        options=options or {},
+        expires_at=timezone.now() + timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS),
+    )
+    os.makedirs(session_dir(session), exist_ok=True)
+    logger.info(f"Started chunked upload {session.pk}: {session.file_name}, {size} bytes in {session.total_parts} parts")
+    return session
+
+
+def parse_checksum(headers) -> Tuple[str, str]:
+    """
+    Read the part checksum from the request headers.
+
+    Returns:
+        tuple: (hashlib algorithm name, expected hex digest)
+
+    Raises:
+        ValidationError: If no valid checksum header was sent
+    """
+    sha256 = headers.get('X-Content-SHA256', '').strip().lower()
+    if sha256:
+        return 'sha256', sha256
+    md5 = headers.get('Content-MD5', '').strip()
+    if md5:
+        try:
+            return 'md5', base64.b64decode(md5, validate=True).hex()
+        except (binascii.Error, ValueError):
+            raise ValidationError("Content-MD5 must be base64 encoded")
+    raise ValidationError("Each part needs an X-Content-SHA256 or Content-MD5 header")
+
+
+def write_part(session: UploadSession, part_number: int, stream, checksum: Tuple[str, str]) -> int:
+    """
+    Stream one part to disk, verifying its length and checksum.
+
+    Sending a part again replaces the earlier copy.
+
+    Args:
+        session (UploadSession): Session the part belongs to
+        part_number (int): 1-indexed part number
+        stream: Readable request body (may be None for an empty body)
+        checksum (tuple): (algorithm, hex digest) from parse_checksum()
+
+    Returns:
+        int: Bytes written
+
+    Raises:
+        ValidationError: If the part number, length or checksum is wrong
+    """
+    if not 1 <= part_number <= session.total_parts:
+        raise ValidationError(f"Part number must be between 1 and {session.total_parts}")
+
+    expected = session.part_length(part_number)
+    algorithm, digest = checksum
+    hasher = hashlib.new(algorithm)
+    directory = session_dir(session)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    written = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while stream is not None:
+                chunk = stream.read(min(COPY_CHUNK_SIZE, expected - written + 1))
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > expected:
+                    raise ValidationError(f"Part {part_number} is larger than {expected} bytes")
+                hasher.update(chunk)
+                f.write(chunk)
+        if written != expected:
+            raise ValidationError(f"Part {part_number} should be {expected} bytes, received {written}")
+        if hasher.hexdigest() != digest:
+            raise ValidationError(f"Checksum mismatch for part {part_number}")
+        os.replace(tmp_path, part_path(session, part_number))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+
+def received_parts(session: UploadSession) -> Dict[int, int]:
+    """
+    Verified parts on disk.
+
+    Returns:
+        dict: part number -> size in bytes
+    """
+    parts = {}
+    try:
+        names = os.listdir(session_dir(session))
+    except FileNotFoundError:
+        return parts
+    for name in names:
+        if not name.endswith('.part'):
+            continue
+        try:
+            parts[int(name[:-len('.part')])] = os.path.getsize(os.path.join(session_dir(session), name))
+        except (ValueError, OSError):
+            continue
+    return dict(sorted(parts.items()))
+
+
+def missing_parts(session: UploadSession):
+    parts = received_parts(session)
+    return [n for n in range(1, session.total_parts + 1) if n not in parts]
+
+
+def _copy_file(source, target, length: int):
+    """Append source to target, inside the kernel when the platform allows it."""
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < length:
+                count = os.copy_file_range(source.fileno(), target.fileno(), length - copied)
+                if count == 0:
+                    break
+                copied += count
+        except OSError as e:
+            # Not supported for this pair of files; positions reflect what was copied
+            logger.debug(f"copy_file_range unavailable ({e}), copying in user space")
+    if copied < length:
+        shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+
+
+def _file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def assemble(session: UploadSession) -> UploadedFile:
+    """
+    Concatenate the parts into the complete file.
+
+    Returns:
+        UploadedFile: The assembled file, open for reading
+
+    Raises:
+        ValidationError: If parts are missing or the file checksum does not match
+    """
+    missing = missing_parts(session)
+    if missing:
+        shown = ', '.join(str(n) for n in missing[:20])
+        raise ValidationError(f"{len(missing)} parts have not been received: {shown}")
+
+    directory = session_dir(session)
+    target_path = os.path.join(directory, ASSEMBLED_NAME)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            for part_number in range(1, session.total_parts + 1):
+                with open(part_path(session, part_number), 'rb') as source:
+                    _copy_file(source, target, session.part_length(part_number))
+        if os.path.getsize(tmp_path) != session.size:
+            raise ValidationError(f"Assembled file is {os.path.getsize(tmp_path)} bytes, expected {session.size}")
+        if session.sha256 and _file_sha256(tmp_path) != session.sha256:
+            raise ValidationError("Checksum mismatch for the assembled file")
+        os.replace(tmp_path, target_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    logger.info(f"Assembled chunked upload {session.pk} from {session.total_parts} parts")
+    return UploadedFile(
+        file=open(target_path, 'rb'),
+        name=session.file_name,
+        content_type=session.content_type or 'application/octet-stream',
+        size=session.size,
+    )
+
+
+def remove_session_files(session: UploadSession):
+    shutil.rmtree(session_dir(session), ignore_errors=True)
+
+
+def clear_expired_sessions() -> int:
+    """
+    Delete expired sessions that were not completed, with their part files.
+
+    Returns:
+        int: Number of sessions removed
+    """
+    expired = UploadSession.objects.filter(expires_at__lt=timezone.now()).exclude(status='processing')
+    removed = 0
+    for session in expired:
+        remove_session_files(session)
+        session.delete()
+        removed += 1
+    if removed:
+        logger.info(f"Removed {removed} expired chunked uploads")
+    return removed
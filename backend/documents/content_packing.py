@@ -0,0 +1,176 @@
+"""
+Token-budget packing of page content into question generation prompts.
+
+Prompts used to carry three sampled pages cut off at 10,000 characters,
+often mid-sentence, and documents were processed one page (and one LLM
+call) per question. Here content is measured in real tokens (config.tokens,
+or the counts stored by documents.page_analysis) and whole pages are added
+until the prompt's budget is full:
+
+    budget = GENERATION_CONTEXT_TOKENS - prompt template - reserved response tokens
+
+and no more than GENERATION_TOKENS_PER_QUESTION per requested question, so
+asking for one question does not pay for a whole chapter. Only a single
+page that is larger than the budget on its own is cut, and then at a
+sentence boundary.
+
+Example usage:
+    groups = pack_pages(planned_pages, questions_per_call=5, analysis=page_analysis)
+    text = join_pages(groups[0])
+"""
+
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from config.tokens import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+Page = Tuple[str, str]
+
+MIN_CONTENT_TOKENS = 2500      # About the 10,000 characters prompts used to carry
+PAGE_HEADER_TOKENS = 8         # "Content from page N:" and separators
+PROMPT_TEMPLATE_TOKENS = 700   # Instructions around the content in the generation prompt
+TOKENS_PER_QUESTION_MIN = 150  # Less content than this per question gives thin questions
+SENTENCE_END = re.compile(r'[.!?।](?=\s)|\n\s*\n')
+
+
+def response_tokens(num_questions: int) -> int:
+    """max_tokens to reserve for a response with num_questions questions."""
+    return max(2000, num_questions * settings.GENERATION_RESPONSE_TOKENS_PER_QUESTION)
+
+
+def content_budget(template_tokens: int, num_questions: int) -> int:
+    """Tokens of page content that fit in one prompt asking for num_questions questions."""
+    available = settings.GENERATION_CONTEXT_TOKENS - template_tokens - response_tokens(num_questions)
+    wanted = max(MIN_CONTENT_TOKENS, num_questions * settings.GENERATION_TOKENS_PER_QUESTION)
+    return max(0, min(available, wanted))
+
+
+def page_tokens(page: Page, analysis: Optional[Dict[str, Dict]] = None) -> int:
+    stored = (analysis or {}).get(str(page[0])) or {}
+    tokens = stored.get('tokens')
+    if tokens is None:
+        tokens = count_tokens(page[1])
+    return tokens + PAGE_HEADER_TOKENS
+
+
+def fit_text(text: str, max_tokens: int) -> str:
+    """
+    Cut text to at most max_tokens tokens, ending at the last sentence
+    boundary when one falls in the second half of the kept text.
+
+    At least one token is kept, even when no budget is left for content.
+    """
+    max_tokens = max(1, max_tokens)
+    if count_tokens(text) <= max_tokens:
+        return text
+    kept = truncate_to_tokens(text, max_tokens)
+    boundaries = [match.end() for match in SENTENCE_END.finditer(kept)]
+    if boundaries and boundaries[-1] >= len(kept) // 2:
+        kept = kept[:boundaries[-1]]
+    return kept.rstrip()
+
+
+def _spread_order(count: int) -> List[int]:
+    """Indices 0..count-1 ordered to cover the range evenly: first, last, middle, quarters, ..."""
+    if count <= 2:
+        return list(range(count))
+    order = [0, count - 1]
+    seen = set(order)
+    step = count - 1
+    while len(order) < count:
+        step = max(1, step // 2)
+        for index in range(step, count, step):
+            if index not in seen:
+                seen.add(index)
+                order.append(index)
+    return order
+
+
+def select_spread(pages: List[Page], budget: int, analysis: Optional[Dict[str, Dict]] = None) -> List[Page]:
+    """
+    Pick whole pages spread across the document (first, last, middle, ...)
+    until the budget is full, returned in document order.
+    """
+    if not pages:
+        return []
+    selected = {}
+    used = 0
+    for index in _spread_order(len(pages)):
+        tokens = page_tokens(pages[index], analysis)
+        if used + tokens > budget:
+            if not selected:
+                # A single page larger than the whole budget: keep as much of it as fits
+                page_number, content = pages[index]
+                selected[index] = (page_number, fit_text(content, budget - PAGE_HEADER_TOKENS))
+                break
+            continue
+        selected[index] = pages[index]
+        used += tokens
+    return [selected[index] for index in sorted(selected)]
+
+
+def pack_pages(pages: List[Page], questions_per_call: int, calls: int = 1,
+               template_tokens: int = PROMPT_TEMPLATE_TOKENS,
+               analysis: Optional[Dict[str, Dict]] = None) -> List[List[Page]]:
+    """
+    Group pages (in planning order) into prompts of at most one content budget each.
+
+    Pages go into the first group with room for them, so the best-planned
+    pages fill the first calls. When the whole content would fit in fewer
+    than `calls` prompts, the budget is lowered so it is spread over that
+    many. A page too large for any group is cut to the budget and sent alone.
+
+    Args:
+        pages (list): (page_number, content) pairs in planning order
+        questions_per_call (int): Questions each prompt will ask for
+        calls (int): Prompts needed to reach the target question count
+        template_tokens (int): Tokens of the prompt around the content
+        analysis (dict): Stored page analysis, for token counts
+
+    Returns:
+        list: Groups of pages, each in page order
+    """
+    budget = content_budget(template_tokens, questions_per_call)
+    page_sizes = [page_tokens(page, analysis) for page in pages]
+    if calls > 1 and page_sizes:
+        budget = min(budget, max(-(-sum(page_sizes) // calls), max(page_sizes)))
+    groups = []
+    for page, tokens in zip(pages, page_sizes):
+        if tokens > budget:
+            groups.append(([(page[0], fit_text(page[1], budget - PAGE_HEADER_TOKENS))], budget))
+            continue
+        for index, (group, used) in enumerate(groups):
+            if used + tokens <= budget:
+                group.append(page)
+                groups[index] = (group, used + tokens)
+                break
+        else:
+            groups.append(([page], tokens))
+
+    logger.info(f"Packed {len(pages)} pages into {len(groups)} prompts of up to {budget} content tokens")
+    return [sorted(group, key=lambda page: _page_sort_key(page[0])) for group, _ in groups]
+
+
+def questions_for_pages(pages: List[Page], limit: int, analysis: Optional[Dict[str, Dict]] = None) -> int:
+    """How many questions (at most limit, at least 1) the pages can carry."""
+    tokens = sum(page_tokens(page, analysis) for page in pages)
+    return max(1, min(limit, tokens // TOKENS_PER_QUESTION_MIN))
+
+
+def _page_sort_key(page_number):
+    try:
+        return (0, int(page_number))
+    except (TypeError, ValueError):
+        return (1, str(page_number))
+
+
+def join_pages(pages: List[Page]) -> str:
+    """Page-marked text in the format produced by documents.utils."""
+    from .utils import _format_page_text
+
+    return ''.join(_format_page_text(page_number, content) + "\n" for page_number, content in pages)
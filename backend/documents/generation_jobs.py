@@ -0,0 +1,158 @@
+"""
+Background question generation with server-sent events.
+
+An upload with stream=true returns 202 with a job id straight away and
+the file is processed in a background thread. Every question is published
+as soon as its batch has been validated, so the client can render the
+first question after a single LLM round-trip instead of waiting for all of
+them:
+
+    GET /quiz/<id>/generation/<job_id>/events/      (text/event-stream)
+
+    event: started    data: {"target": 15, "pages": 40, "generated": 0}
+    event: question   data: {"question": {...}, "generated": 1, "target": 15}
+    ...
+    event: done       data: {"document_id": 12, "questions_generated": 15, ...}
+    (or event: error  data: {"error": "..."})
+
+Events are kept in GenerationJob.events, so any worker can serve the
+stream. Each event's id is its position, and a reconnecting client
+(Last-Event-ID header, or ?last_event_id=) receives only what it missed.
+
+Example usage:
+    job = create_job(quiz, user)
+    start_job(job, process_file, quiz, user, file)   # process_file(..., progress=callback)
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator
+
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.renderers import BaseRenderer
+
+from .models import GenerationJob
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.GENERATION_JOB_WORKERS,
+                    thread_name_prefix='generation-job',
+                )
+    return _executor
+
+
+def create_job(quiz, user) -> GenerationJob:
+    return GenerationJob.objects.create(quiz=quiz, user=user)
+
+
+def publish(job: GenerationJob, event: str, data: Dict):
+    """
+    Append an event to the job.
+
+    'started' sets the job's target and 'question' counts a generated
+    question; both carry the progress counters.
+    """
+    if event == 'started':
+        job.target = data.get('target', job.target)
+    elif event == 'question':
+        job.generated += 1
+    if event in ('started', 'question'):
+        data = {**data, 'generated': job.generated, 'target': job.target}
+    job.events = job.events + [{'event': event, 'data': data}]
+    job.save(update_fields=['events', 'target', 'generated', 'updated_at'])
+
+
+def start_job(job: GenerationJob, func: Callable, *args, **kwargs):
+    """
+    Run func(*args, progress=callback, **kwargs) in the background.
+
+    func reports progress with callback(event, data) and returns a dict
+    with 'success' (and 'error' on failure); the rest of the dict is sent
+    as the 'done' event.
+    """
+    _get_executor().submit(_run, job.pk, func, args, kwargs)
+    logger.info(f"Queued generation job {job.pk} for quiz {job.quiz_id}")
+
+
+def _run(job_id, func, args, kwargs):
+    job = GenerationJob.objects.get(pk=job_id)
+    job.status = 'running'
+    job.save(update_fields=['status', 'updated_at'])
+    try:
+        result = func(*args, progress=lambda event, data: publish(job, event, data), **kwargs) or {}
+    except Exception as e:
+        logger.error(f"Generation job {job_id} failed: {e}", exc_info=True)
+        result = {'success': False, 'error': str(e)}
+    try:
+        job.document_id = result.get('document_id')
+        if result.get('success'):
+            job.status = 'completed'
+            publish(job, 'done', {key: value for key, value in result.items() if key != 'success'})
+        else:
+            job.status = 'failed'
+            job.error = str(result.get('error', 'Generation failed'))
+            publish(job, 'error', {'error': job.error})
+        job.save(update_fields=['status', 'error', 'document', 'updated_at'])
+    finally:
+        close_old_connections()
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets views accept 'Accept: text/event-stream'; they return the stream themselves."""
+    media_type = 'text/event-stream'
+    format = 'txt'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only reached for error responses (authentication, 404)
+        return json.dumps(data).encode('utf-8') if data is not None else b''
+
+
+def format_event(event_id: int, event: str, data: Dict) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def event_stream(job_id, last_event_id: int = 0) -> Iterator[str]:
+    """
+    Server-sent events for a job, from the event after last_event_id until
+    the job finishes (or GENERATION_STREAM_TIMEOUT passes).
+    """
+    sent = max(0, last_event_id)
+    started = last_beat = time.monotonic()
+    yield f"retry: {settings.GENERATION_STREAM_RETRY_MS}\n\n"
+    while True:
+        job = GenerationJob.objects.filter(pk=job_id).values('events', 'status').first()
+        if job is None:
+            yield format_event(sent + 1, 'error', {'error': 'Generation job not found'})
+            return
+        events = job['events'][sent:]
+        for event in events:
+            sent += 1
+            yield format_event(sent, event['event'], event['data'])
+        if job['status'] in FINISHED_STATUSES:
+            return
+        now = time.monotonic()
+        if now - started > settings.GENERATION_STREAM_TIMEOUT:
+            return
+        if events:
+            last_beat = now
+        elif now - last_beat >= settings.GENERATION_STREAM_HEARTBEAT_SECONDS:
+            # Comment line: keeps proxies from closing an idle connection
+            yield ": keep-alive\n\n"
+            last_beat = now
+        time.sleep(settings.GENERATION_STREAM_POLL_SECONDS)
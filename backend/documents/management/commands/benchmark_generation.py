@@ -0,0 +1,136 @@
+"""
+Management command to benchmark the document question generation pipeline.
+
+Runs extract -> generate -> save through DocumentProcessingService for a local
+PDF against a throwaway quiz. Combine with an offline LLM backend for
+deterministic runs without network access:
+
+    LLM_BACKEND=synthetic LLM_SYNTHETIC_LATENCY_MEAN=0.2 \\
+        python manage.py benchmark_generation sample.pdf --runs 5
+"""
+
+import os
+import time
+import logging
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import User
+from documents.models import Document
+from documents.services import DocumentProcessingService
+from quiz.models import Quiz
+from config.llm_gateway import get_llm_gateway
+
+
+class Command(BaseCommand):
+    help = 'Benchmark question generation for a local PDF (use LLM_BACKEND=synthetic or replay to run offline)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Path to a PDF file')
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=3,
+            help='Number of times to process the file',
+        )
+        parser.add_argument(
+            '--questions',
+            type=int,
+            default=10,
+            help='Number of questions on the benchmark quiz',
+        )
+        parser.add_argument(
+            '--question-type',
+            default='mixed',
+            help='Question type of the benchmark quiz',
+        )
+        parser.add_argument(
+            '--page-range',
+            default=None,
+            help='Optional page range, e.g. "1-5,7"',
+        )
+        parser.add_argument(
+            '--email',
+            default='benchmark@example.com',
+            help='User that owns the benchmark quiz',
+        )
+        parser.add_argument(
+            '--use-cache',
+            action='store_true',
+            help='Allow the LLM response cache (by default every run calls the backend)',
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the quiz, documents and questions created by the benchmark',
+        )
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if not os.path.isfile(path):
+            raise CommandError(f'File not found: {path}')
+        with open(path, 'rb') as f:
+            file_data = f.read()
+
+        user, _ = User.objects.get_or_create(email=options['email'])
+        quiz = Quiz.objects.create(
+            title=f'Benchmark {os.path.basename(path)}',
+            question_type=options['question_type'],
+            no_of_questions=options['questions'],
+            quiz_type={'easy': options['questions']},
+            created_by=user.email,
+        )
+        gateway = get_llm_gateway()
+        self.stdout.write(self.style.SUCCESS(
+            f"Benchmarking {path} ({len(file_data)} bytes) with LLM_BACKEND={settings.LLM_BACKEND}, "
+            f"{options['runs']} runs"
+        ))
+
+        service = DocumentProcessingService()
+        timings = []
+        questions = 0
+        failures = 0
+        try:
+            for run in range(1, options['runs'] + 1):
+                uploaded_file = SimpleUploadedFile(os.path.basename(path), file_data, content_type='application/pdf')
+                started = time.monotonic()
+                result = service.process_single_document(
+                    uploaded_file=uploaded_file,
+                    quiz=quiz,
+                    user=user,
+                    page_range=options['page_range'],
+                    use_cache=options['use_cache'],
+                    file_data=file_data,
+                )
+                elapsed = time.monotonic() - started
+                timings.append(elapsed)
+
+                if result.get('success'):
+                    questions += result['questions_generated']
+                    self.stdout.write(f"Run {run}: {elapsed:.2f}s, {result['questions_generated']} questions")
+                else:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(f"Run {run}: {elapsed:.2f}s, failed: {result.get('error')}"))
+        finally:
+            if not options['keep']:
+                Document.objects.filter(quiz=quiz).delete()
+                quiz.delete()
+
+        timings.sort()
+        total = sum(timings)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wall time: total {total:.2f}s, mean {total / len(timings):.2f}s, "
+            f"min {timings[0]:.2f}s, max {timings[-1]:.2f}s"
+        ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {questions} questions, {questions / max(total, 1e-9):.2f} questions/sec"
+        ))
+        if failures:
+            self.stdout.write(self.style.WARNING(f"{failures} runs failed"))
+
+        for name, stats in gateway.metrics_snapshot().items():
+            self.stdout.write(
+                f"{name}: calls={stats['calls']} errors={stats['errors']} retries={stats['retries']} "
+                f"cache_hits={stats['cache_hits']} p50={stats['p50_latency']:.2f}s p95={stats['p95_latency']:.2f}s"
+            )
+        logging.info(f"Generation benchmark finished: {len(timings)} runs, {questions} questions in {total:.2f}s")
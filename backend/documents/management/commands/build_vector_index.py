@@ -0,0 +1,32 @@
+"""
+Management command to build or refresh the vector similarity index.
+"""
+
+import logging
+from django.core.management.base import BaseCommand
+from config.vector_db import VectorDB
+
+class Command(BaseCommand):
+    help = 'Build or refresh the ANN index once (run after bulk ingestion or from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--collection',
+            default='documents',
+            help='Name of the vector collection to index',
+        )
+
+    def handle(self, *args, **options):
+        vector_db = VectorDB(collection_name=options['collection'])
+        try:
+            if vector_db.build_index():
+                target = 'pgvector collection' if vector_db.collection is not None else 'local NumPy index'
+                self.stdout.write(self.style.SUCCESS(f'Rebuilt {target} for "{options["collection"]}"'))
+            else:
+                self.stdout.write(self.style.ERROR('Failed to build vector index'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error building vector index: {e}'))
+            logging.error(f'Error building vector index: {e}')
+            raise
+        finally:
+            vector_db.close()
@@ -0,0 +1,14 @@
+"""
+Management command to remove chunked uploads that were never completed.
+"""
+
+from django.core.management.base import BaseCommand
+from documents.chunked_upload import clear_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete expired chunked upload sessions and their part files'
+
+    def handle(self, *args, **options):
+        removed = clear_expired_sessions()
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} expired uploads"))
@@ -0,0 +1,27 @@
+"""
+Management command to remove stored files that no document references.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from documents.blob_storage import collect_garbage
+from documents.models import StoredBlob
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored file reference counts and remove unreferenced files from storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-reconcile',
+            action='store_true',
+            help='Trust the stored reference counts instead of recounting documents',
+        )
+
+    def handle(self, *args, **options):
+        removed = collect_garbage(reconcile=not options['no_reconcile'])
+        remaining = StoredBlob.objects.aggregate(total=Sum('size'))['total'] or 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed} unreferenced files; "
+            f"{StoredBlob.objects.count()} files ({remaining / (1024 * 1024):.1f} MB) remain"
+        ))
@@ -1,16 +1,34 @@
 """
 Management command to generate missing embeddings for documents.
+
+Documents are processed in id order as batches: worker threads embed each
+batch with a single OpenAI request and upsert it into the vector collection,
+while the main thread persists DocumentVector rows and advances a checkpoint
+so an interrupted run resumes after the last fully saved batch.
 """
 
 import os
-import logging
-import pickle
+import json
+import time
 import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from django.db import connections
+from django.utils import timezone
 from documents.models import Document, DocumentVector
-from config.vector_db import VectorDB
-from openai import OpenAI
+from config.vector_db import VectorDB, pack_embedding
+from config.tokens import count_tokens
+
+# Stable namespace so re-running the command upserts the same vector record
+# for a document instead of leaving orphans behind in the collection.
+DOCUMENT_VECTOR_NAMESPACE = uuid.UUID('6f1c3a52-9a0e-4c1b-8c55-3f0b7f2d9e41')
+
+
+def _count_tokens(text):
+    return count_tokens(text, model=VectorDB.EMBEDDING_MODEL)
+
 
 class Command(BaseCommand):
     help = 'Generate missing embeddings for documents'
@@ -21,111 +39,278 @@ class Command(BaseCommand):
             action='store_true',
             help='Force regeneration of embeddings for all documents',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=VectorDB.EMBEDDING_BATCH_SIZE,
+            help='Documents per embedding request',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of batches embedded concurrently',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count tokens and estimate cost, without calling OpenAI',
+        )
+        parser.add_argument(
+            '--price-per-1k-tokens',
+            type=float,
+            default=0.0001,
+            help='Embedding price in USD per 1,000 tokens, used for the dry-run estimate',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.BASE_DIR, '.embedding_checkpoint.json'),
+            help='File used to record progress so an interrupted run can resume',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore any existing checkpoint and start from the first document',
+        )
 
     def handle(self, *args, **options):
         force = options['force']
-        
+        batch_size = max(1, options['batch_size'])
+        workers = max(1, options['workers'])
+        checkpoint_path = options['checkpoint']
+
         try:
             # Get documents without embeddings
             if force:
                 documents = Document.objects.all()
-                self.stdout.write(self.style.SUCCESS(f'Processing all {documents.count()} documents'))
             else:
                 # Get documents that don't have a corresponding DocumentVector
                 documents = Document.objects.filter(vector__isnull=True)
-                self.stdout.write(self.style.SUCCESS(f'Found {documents.count()} documents without embeddings'))
-            
+
+            checkpoint = None if options['restart'] else self._load_checkpoint(checkpoint_path, force)
+            if checkpoint:
+                documents = documents.filter(id__gt=checkpoint)
+                self.stdout.write(self.style.WARNING(f'Resuming after document {checkpoint}'))
+
+            documents = documents.order_by('id').only(
+                'id', 'title', 'description', 'file', 'file_size', 'extracted_text'
+            )
+            total = documents.count()
+            if force:
+                self.stdout.write(self.style.SUCCESS(f'Processing all {total} documents'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Found {total} documents without embeddings'))
+
+            if options['dry_run']:
+                self._estimate(documents, options['price_per_1k_tokens'])
+                return
+
             # Initialize vector database
             vector_db = VectorDB()
-            
-            # Process each document
-            success_count = 0
-            error_count = 0
-            
-            for document in documents:
-                try:
-                    # Generate embedding
-                    embedding = vector_db.generate_embedding(document.extracted_text)
-                    
-                    # If the vector_db couldn't generate an embedding, try directly with OpenAI
-                    if not embedding:
-                        try:
-                            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-                            
-                            # Handle large documents by chunking
-                            text_for_embedding = document.extracted_text
-                            approx_tokens = len(text_for_embedding) / 4
-                            
-                            if approx_tokens > 8000:  # Close to the 8192 limit
-                                self.stdout.write(self.style.WARNING(f"Text too long (approx {approx_tokens:.0f} tokens), truncating to first 8000 tokens"))
-                                # Truncate to approximately 8000 tokens (32000 chars)
-                                text_for_embedding = text_for_embedding[:32000]
-                            
-                            response = client.embeddings.create(
-                                input=text_for_embedding,
-                                model="text-embedding-ada-002"
-                            )
-                            embedding = response.data[0].embedding
-                        except Exception as e:
-                            self.stdout.write(self.style.ERROR(f'Error with direct OpenAI embedding: {e}'))
-                    
-                    if embedding:
-                        # Generate a UUID for the document if needed
-                        doc_uuid = str(uuid.uuid4())
-                        
-                        # Serialize embedding
-                        binary_embedding = pickle.dumps(embedding)
-                        
-                        # Create or update DocumentVector
-                        document_vector, created = DocumentVector.objects.update_or_create(
-                            document=document,
-                            defaults={
-                                'vector_uuid': uuid.UUID(doc_uuid),
-                                'embedding': binary_embedding,
-                                'is_indexed': True,
-                                'metadata': {
-                                    'title': document.title,
-                                    'description': document.description,
-                                    'file_path': document.file.name,
-                                    'file_size': document.file_size,
-                                }
-                            }
-                        )
-                        
-                        # Try to store in vector database
-                        try:
-                            vector_db.upsert_document(
-                                doc_uuid, 
-                                document.extracted_text, 
-                                {
-                                    'title': document.title,
-                                    'description': document.description,
-                                    'file_path': document.file.name,
-                                    'file_size': document.file_size,
-                                }
-                            )
-                        except Exception as e:
-                            self.stdout.write(self.style.WARNING(f'Error storing document {document.id} in vector database: {e}'))
-                        
-                        success_count += 1
-                        self.stdout.write(self.style.SUCCESS(f'Generated embedding for document {document.id}: {document.title}'))
-                    else:
-                        error_count += 1
-                        self.stdout.write(self.style.ERROR(f'Failed to generate embedding for document {document.id}: {document.title}'))
-                
-                except Exception as e:
-                    error_count += 1
-                    self.stdout.write(self.style.ERROR(f'Error processing document {document.id}: {e}'))
-            
-            # Close vector database connection
-            vector_db.close()
-            
+            try:
+                stats = self._run(vector_db, documents, total, batch_size, workers, checkpoint_path, force)
+                if stats['success']:
+                    vector_db.build_index()
+            finally:
+                # Close vector database connection
+                vector_db.close()
+
+            if not stats['error']:
+                self._clear_checkpoint(checkpoint_path)
+
             # Print summary
-            self.stdout.write(self.style.SUCCESS(f'Processed {success_count + error_count} documents'))
-            self.stdout.write(self.style.SUCCESS(f'Successfully generated {success_count} embeddings'))
-            self.stdout.write(self.style.WARNING(f'Failed to generate {error_count} embeddings'))
-            
+            elapsed = max(stats['elapsed'], 1e-9)
+            self.stdout.write(self.style.SUCCESS(f"Processed {stats['success'] + stats['error']} documents in {elapsed:.1f}s"))
+            self.stdout.write(self.style.SUCCESS(f"Successfully generated {stats['success']} embeddings"))
+            self.stdout.write(self.style.WARNING(f"Failed to generate {stats['error']} embeddings"))
+            if stats['error']:
+                self.stdout.write(self.style.WARNING(
+                    'Documents that failed keep their previous state; run again without --force to retry them'
+                ))
+            self.stdout.write(self.style.SUCCESS(
+                f"Throughput: {stats['success'] / elapsed:.2f} docs/sec, {stats['tokens'] / elapsed:.0f} tokens/sec"
+            ))
+
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error generating embeddings: {e}'))
             logging.error(f'Error generating embeddings: {e}')
-            raise 
\ No newline at end of file
+            raise
+
+    def _run(self, vector_db, documents, total, batch_size, workers, checkpoint_path, force):
+        """Embed documents batch by batch and persist results as they complete."""
+        stats = {'success': 0, 'error': 0, 'tokens': 0, 'elapsed': 0.0}
+        started = time.monotonic()
+
+        # Batches finish out of order; the checkpoint only advances over the
+        # contiguous prefix of batches that have been fully saved. A batch with
+        # failed documents holds it back, so the next run retries them.
+        batch_ends = []
+        finished = set()
+        next_to_confirm = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight = {}
+            for seq, batch in enumerate(self._batches(documents, batch_size)):
+                batch_ends.append(batch[-1].id)
+                records, tokens = self._prepare_batch(batch)
+                stats['tokens'] += tokens
+                future = executor.submit(self._embed_batch, vector_db, records)
+                in_flight[future] = (seq, batch, records)
+
+                # Keep a bounded number of batches in memory
+                if len(in_flight) >= workers * 2:
+                    next_to_confirm = self._collect(in_flight, stats, finished, batch_ends,
+                                                    next_to_confirm, checkpoint_path, force,
+                                                    total, started, return_when=FIRST_COMPLETED)
+
+            while in_flight:
+                next_to_confirm = self._collect(in_flight, stats, finished, batch_ends,
+                                                next_to_confirm, checkpoint_path, force,
+                                                total, started, return_when=FIRST_COMPLETED)
+
+        stats['elapsed'] = time.monotonic() - started
+        return stats
+
+    def _collect(self, in_flight, stats, finished, batch_ends, next_to_confirm,
+                 checkpoint_path, force, total, started, return_when):
+        done, _ = wait(list(in_flight), return_when=return_when)
+        for future in done:
+            seq, batch, records = in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Error embedding batch ending at document {batch[-1].id}: {e}'))
+                result = {'embeddings': {}}
+            saved = self._save_batch(batch, records, result['embeddings'])
+            stats['success'] += saved
+            stats['error'] += len(batch) - saved
+            if saved == len(batch):
+                finished.add(seq)
+
+        while next_to_confirm in finished:
+            next_to_confirm += 1
+        if next_to_confirm:
+            self._write_checkpoint(checkpoint_path, batch_ends[next_to_confirm - 1], force)
+
+        processed = stats['success'] + stats['error']
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(
+            f"[{processed}/{total}] {processed / elapsed:.2f} docs/sec, "
+            f"{stats['tokens'] / elapsed:.0f} tokens/sec"
+        )
+        return next_to_confirm
+
+    @staticmethod
+    def _batches(documents, batch_size):
+        batch = []
+        for document in documents.iterator(chunk_size=batch_size * 4):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _document_metadata(document):
+        return {
+            'title': document.title,
+            'description': document.description,
+            'file_path': document.file.name if document.file else '',
+            'file_size': document.file_size,
+        }
+
+    def _prepare_batch(self, batch):
+        """Build vecs records (reusing existing vector UUIDs) and count their tokens."""
+        existing = dict(
+            DocumentVector.objects.filter(document_id__in=[d.id for d in batch])
+            .values_list('document_id', 'vector_uuid')
+        )
+        records = []
+        tokens = 0
+        for document in batch:
+            vector_uuid = existing.get(document.id) or uuid.uuid5(DOCUMENT_VECTOR_NAMESPACE, str(document.id))
+            text = document.extracted_text
+            tokens += _count_tokens(VectorDB.prepare_embedding_text(text))
+            records.append((str(vector_uuid), text, self._document_metadata(document)))
+        return records, tokens
+
+    @staticmethod
+    def _embed_batch(vector_db, records):
+        try:
+            return vector_db.upsert_many(records, batch_size=len(records), build_index=False)
+        finally:
+            # Worker threads get their own database connections from Django
+            connections.close_all()
+
+    def _save_batch(self, batch, records, embeddings):
+        """Create or update DocumentVector rows for the documents that were embedded."""
+        existing = DocumentVector.objects.in_bulk(
+            [d.id for d in batch], field_name='document_id'
+        )
+        to_create, to_update = [], []
+        for document, (vector_uuid, _, metadata) in zip(batch, records):
+            embedding = embeddings.get(vector_uuid)
+            if embedding is None:
+                self.stdout.write(self.style.ERROR(f'Failed to generate embedding for document {document.id}: {document.title}'))
+                continue
+            vector = existing.get(document.id)
+            if vector is None:
+                to_create.append(DocumentVector(
+                    document=document,
+                    vector_uuid=uuid.UUID(vector_uuid),
+                    embedding=pack_embedding(embedding),
+                    is_indexed=True,
+                    metadata=metadata,
+                ))
+            else:
+                vector.embedding = pack_embedding(embedding)
+                vector.is_indexed = True
+                vector.metadata = metadata
+                # auto_now does not apply to bulk_update; vector index caches compare updated_at
+                vector.updated_at = timezone.now()
+                to_update.append(vector)
+
+        if to_create:
+            DocumentVector.objects.bulk_create(to_create, batch_size=500)
+        if to_update:
+            DocumentVector.objects.bulk_update(to_update, ['embedding', 'is_indexed', 'metadata', 'updated_at'], batch_size=500)
+        return len(to_create) + len(to_update)
+
+    def _estimate(self, documents, price_per_1k):
+        """Report the token count and cost a real run would incur."""
+        count = 0
+        tokens = 0
+        for document in documents.iterator(chunk_size=500):
+            tokens += _count_tokens(VectorDB.prepare_embedding_text(document.extracted_text))
+            count += 1
+        cost = tokens / 1000 * price_per_1k
+        self.stdout.write(self.style.SUCCESS(
+            f'Dry run: {count} documents, {tokens} tokens, estimated cost ${cost:.4f} '
+            f'at ${price_per_1k}/1K tokens ({VectorDB.EMBEDDING_MODEL})'
+        ))
+
+    @staticmethod
+    def _load_checkpoint(path, force):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get('force') != force:
+                return None
+            return data.get('last_document_id')
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_checkpoint(path, last_document_id, force):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'last_document_id': last_document_id, 'force': force}, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _clear_checkpoint(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,61 @@
+"""
+Management command to report LLM token usage, cost and latency.
+"""
+
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from config.llm_usage import REPORT_GROUPS, usage_report
+
+
+class Command(BaseCommand):
+    help = 'Report LLM calls, tokens, cost and latency per quiz, teacher, document, model or day'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--group-by',
+            default='quiz',
+            choices=list(REPORT_GROUPS),
+            help='How to group the usage',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Only include calls from the last N days (0 for all time)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=50,
+            help='Maximum number of rows to print',
+        )
+
+    def handle(self, *args, **options):
+        group_by = options['group_by']
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] > 0 else None
+        try:
+            rows = usage_report(group_by=group_by, since=since)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not rows:
+            self.stdout.write(self.style.WARNING('No LLM usage recorded for this period'))
+            return
+
+        label_fields = REPORT_GROUPS[group_by]
+        self.stdout.write(
+            f"{group_by:<40} {'calls':>7} {'cached':>7} {'failed':>7} {'prompt':>10} "
+            f"{'completion':>10} {'cost $':>10} {'avg ms':>8}"
+        )
+        for row in rows[:options['limit']]:
+            label = " / ".join(str(row[field]) for field in label_fields)
+            self.stdout.write(
+                f"{label[:40]:<40} {row['calls']:>7} {row['cached_calls']:>7} {row['failed_calls']:>7} "
+                f"{row['prompt_tokens'] or 0:>10} {row['completion_tokens'] or 0:>10} "
+                f"{row['cost_usd']:>10.4f} {row['avg_latency_ms']:>8}"
+            )
+
+        total_cost = sum(row['cost_usd'] for row in rows)
+        total_calls = sum(row['calls'] for row in rows)
+        self.stdout.write(self.style.SUCCESS(f'Total: {total_calls} calls, ${total_cost:.4f}'))
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def pack_legacy_embeddings(apps, schema_editor):
+    """Rewrite pickled embeddings as packed float32."""
+    from config.vector_db import EMBEDDING_HEADER, pack_embedding, unpack_embedding
+
+    DocumentVector = apps.get_model('documents', 'DocumentVector')
+    for vector in DocumentVector.objects.exclude(embedding__isnull=True).iterator(chunk_size=500):
+        data = bytes(vector.embedding)
+        if not data or data.startswith(EMBEDDING_HEADER):
+            continue
+        values = unpack_embedding(data)
+        vector.embedding = pack_embedding(values) if values is not None else None
+        vector.save(update_fields=['embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_document_metadata'),
+    ]
+
+    operations = [
+        migrations.RunPython(pack_legacy_embeddings, migrations.RunPython.noop),
+    ]
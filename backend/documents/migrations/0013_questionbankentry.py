@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0012_ocrcacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionBankEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('page', models.CharField(max_length=20)),
+                ('question_type', models.CharField(max_length=20)),
+                ('difficulty', models.CharField(max_length=50)),
+                ('question_hash', models.CharField(max_length=64)),
+                ('question', models.JSONField()),
+                ('times_used', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('content_hash', 'question_hash')},
+                'indexes': [models.Index(fields=['content_hash', 'difficulty', 'question_type', 'page'], name='documents_q_content_3f55ea_idx')],
+            },
+        ),
+    ]
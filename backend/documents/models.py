@@ -56,6 +56,14 @@ class Document(models.Model):
                                    ])
     storage_path = models.CharField(max_length=255, blank=True)
     storage_url = models.URLField(blank=True)
+    # Content-addressed copy of the file, shared by documents with the same bytes
+    blob = models.ForeignKey(
+        'StoredBlob',
+        on_delete=models.SET_NULL,
+        related_name='documents',
+        null=True,
+        blank=True
+    )
     is_processed = models.BooleanField(default=False)
     page_count = models.IntegerField(default=0)
     file_size = models.IntegerField(default=0)  # Size in bytes
@@ -81,6 +89,114 @@ class Document(models.Model):
             return f"{self.file_size / (1024 * 1024):.2f} MB"
 
 
+class StoredBlob(models.Model):
+    """A stored file keyed by the SHA-256 of its content, shared between documents"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    bucket = models.CharField(max_length=100)
+    storage_path = models.CharField(max_length=255)
+    size = models.BigIntegerField(default=0)
+    content_type = models.CharField(max_length=100, blank=True)
+    ref_count = models.IntegerField(default=0)  # Documents that reference this blob
+    pending_uploads = models.IntegerField(default=0)  # BlobUploads not yet attached or discarded
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_referenced_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+
+class UploadSession(models.Model):
+    """A resumable upload whose parts are sent separately (see documents.chunked_upload)"""
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    quiz = models.ForeignKey(
+        'quiz.Quiz',
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    file_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.BigIntegerField()
+    part_size = models.IntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)  # Optional checksum of the whole file
+    options = models.JSONField(default=dict, blank=True)  # page_range, fresh
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    error = models.TextField(blank=True)
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.SET_NULL,
+        related_name='upload_sessions',
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    @property
+    def total_parts(self):
+        return max(1, -(-self.size // self.part_size))
+    
+    def part_length(self, part_number):
+        """Expected size of a part (1-indexed); only the last part may be shorter"""
+        if part_number < self.total_parts:
+            return self.part_size
+        return self.size - (self.total_parts - 1) * self.part_size
+    
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+
+class GenerationJob(models.Model):
+    """Question generation running in the background, with the events streamed to the client (see documents.generation_jobs)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='generation_jobs'
+    )
+    quiz = models.ForeignKey(
+        'quiz.Quiz',
+        on_delete=models.CASCADE,
+        related_name='generation_jobs'
+    )
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.SET_NULL,
+        related_name='generation_jobs',
+        null=True,
+        blank=True
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    target = models.IntegerField(default=0)  # Questions the job aims for
+    generated = models.IntegerField(default=0)
+    events = models.JSONField(default=list, blank=True)  # [{"event": ..., "data": {...}}], in order
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Generation {self.pk} ({self.status}, {self.generated}/{self.target})"
+
+
 class DocumentVector(models.Model):
     """Model for storing document vector embeddings"""
     document = models.OneToOneField(
@@ -89,7 +205,7 @@ class DocumentVector(models.Model):
         related_name='vector'
     )
     vector_uuid = models.UUIDField(default=uuid.uuid4, editable=False)
-    embedding = models.BinaryField(null=True, blank=True)  # Store binary representation of vector
+    embedding = models.BinaryField(null=True, blank=True)  # Packed float32 vector, see config.vector_db.pack_embedding
     is_indexed = models.BooleanField(default=False)
     metadata = models.JSONField(default=dict)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -97,3 +213,106 @@ class DocumentVector(models.Model):
     
     def __str__(self):
         return f"Vector for {self.document.title}"
+    
+    def get_embedding(self):
+        """Return the stored embedding as a float32 NumPy array, or None"""
+        from config.vector_db import unpack_embedding
+        return unpack_embedding(self.embedding)
+    
+    def set_embedding(self, embedding):
+        """Store an embedding in the packed float32 format"""
+        from config.vector_db import pack_embedding
+        self.embedding = pack_embedding(embedding)
+
+
+
+class LLMCacheEntry(models.Model):
+    """Cached LLM response keyed by a hash of the normalized request"""
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    response = models.JSONField()
+    size_bytes = models.IntegerField(default=0)
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.model} response {self.key[:12]}"
+
+
+class OCRCacheEntry(models.Model):
+    """OCR text for a page or image, keyed by a hash of its content and the OCR settings"""
+    key = models.CharField(max_length=64, unique=True)
+    text = models.TextField(blank=True)
+    languages = models.CharField(max_length=50)
+    dpi = models.IntegerField(default=0)
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"OCR {self.key[:12]} ({len(self.text)} chars)"
+
+
+class QuestionBankEntry(models.Model):
+    """A validated generated question, reusable by any quiz built from the same file content"""
+    content_hash = models.CharField(max_length=64)  # SHA-256 of the source file
+    page = models.CharField(max_length=20)
+    question_type = models.CharField(max_length=20)
+    difficulty = models.CharField(max_length=50)
+    question_hash = models.CharField(max_length=64)  # SHA-256 of the normalized question text
+    question = models.JSONField()
+    times_used = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ('content_hash', 'question_hash')
+        indexes = [
+            models.Index(fields=['content_hash', 'difficulty', 'question_type', 'page']),
+        ]
+    
+    def __str__(self):
+        return f"{self.question_type} question from page {self.page} of {self.content_hash[:12]}"
+
+
+class LLMUsage(models.Model):
+    """One LLM call with its token usage, latency and estimated cost"""
+    kind = models.CharField(max_length=20)  # 'chat' or 'embedding'
+    model = models.CharField(max_length=100)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name='llm_usage',
+        null=True,
+        blank=True
+    )
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.SET_NULL,
+        related_name='llm_usage',
+        null=True,
+        blank=True
+    )
+    quiz = models.ForeignKey(
+        'quiz.Quiz',
+        on_delete=models.SET_NULL,
+        related_name='llm_usage',
+        null=True,
+        blank=True
+    )
+    prompt_tokens = models.IntegerField(default=0)
+    completion_tokens = models.IntegerField(default=0)
+    latency_ms = models.IntegerField(default=0)
+    retries = models.IntegerField(default=0)
+    cached = models.BooleanField(default=False)
+    success = models.BooleanField(default=True)
+    error = models.TextField(blank=True)
+    cost_usd = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.kind} {self.model} ({self.prompt_tokens}+{self.completion_tokens} tokens)"
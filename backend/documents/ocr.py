@@ -0,0 +1,288 @@
+"""
+OCR fallback for scanned documents.
+
+PDF pages whose text layer is empty (or shorter than OCR_MIN_TEXT_CHARS)
+are rendered and OCR'd instead of being skipped. Only those pages are
+touched: each one is copied into a single-page PDF (so a range-read
+source still downloads only that page), rasterized with PyMuPDF and read
+with Tesseract in a process pool of OCR_WORKERS processes, so the pages of
+a scanned book are recognized in parallel without blocking on the GIL.
+
+Results are cached in OCRCacheEntry by a hash of the page's content
+stream and images (plus the OCR language and resolution), so a book that
+is uploaded again, or a page that is requested again, costs no OCR at all.
+Identical pages within one document are recognized once.
+
+Example usage:
+    texts = ocr_pdf_pages(reader, [3, 4, 9])   # {3: '...', 9: '...'}
+    text = ocr_image(png_bytes)
+"""
+
+import hashlib
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pytesseract
+    from PIL import Image
+    TESSERACT_SUPPORT = True
+except ImportError:
+    TESSERACT_SUPPORT = False
+
+try:
+    import fitz  # PyMuPDF, to rasterize PDF pages
+    RASTER_SUPPORT = True
+except ImportError:
+    RASTER_SUPPORT = False
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def needs_ocr(text: Optional[str]) -> bool:
+    """Whether a page's extracted text is too short to be a real text layer."""
+    return len((text or '').strip()) < getattr(settings, 'OCR_MIN_TEXT_CHARS', 10)
+
+
+def pdf_ocr_available() -> bool:
+    return getattr(settings, 'OCR_ENABLED', True) and TESSERACT_SUPPORT and RASTER_SUPPORT
+
+
+def image_ocr_available() -> bool:
+    return getattr(settings, 'OCR_ENABLED', True) and TESSERACT_SUPPORT
+
+
+# Worker functions run in the pool processes; they must stay importable
+# without Django being set up.
+
+def _ocr_pdf_page(pdf_bytes: bytes, dpi: int, languages: str) -> str:
+    with fitz.open(stream=pdf_bytes, filetype='pdf') as doc:
+        pixmap = doc[0].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        image = Image.frombytes('L', (pixmap.width, pixmap.height), pixmap.samples)
+    return pytesseract.image_to_string(image, lang=languages).strip()
+
+
+def _ocr_image(image_bytes: bytes, languages: str) -> str:
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return pytesseract.image_to_string(image, lang=languages).strip()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    workers = getattr(settings, 'OCR_WORKERS', 1)
+    if workers <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a multi-threaded server process is unsafe
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _run(func, jobs: Dict[str, tuple]) -> Dict[str, str]:
+    """
+    Run func(*args) for every job, in the process pool when one is configured.
+
+    Returns:
+        dict: job key -> text, for the jobs that succeeded
+    """
+    results = {}
+    pool = _get_pool()
+    if pool is None or len(jobs) == 1:
+        for key, args in jobs.items():
+            try:
+                results[key] = func(*args)
+            except Exception as e:
+                logger.error(f"OCR failed: {e}")
+        return results
+
+    try:
+        futures = {key: pool.submit(func, *args) for key, args in jobs.items()}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result(timeout=settings.OCR_PAGE_TIMEOUT)
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                logger.error(f"OCR failed: {e}")
+    except BrokenProcessPool as e:
+        logger.error(f"OCR process pool stopped ({e}); it will be restarted")
+        _reset_pool()
+    return results
+
+
+def _cache_key(content_hash: str, dpi: int) -> str:
+    return hashlib.sha256(f"{content_hash}:{settings.OCR_LANGUAGES}:{dpi}".encode('utf-8')).hexdigest()
+
+
+def _cached_texts(keys: Iterable[str]) -> Dict[str, str]:
+    from django.db.models import F
+    from .models import OCRCacheEntry
+
+    keys = list(keys)
+    try:
+        cached = dict(OCRCacheEntry.objects.filter(key__in=keys).values_list('key', 'text'))
+        if cached:
+            OCRCacheEntry.objects.filter(key__in=list(cached)).update(hit_count=F('hit_count') + 1)
+    except Exception as e:
+        logger.warning(f"OCR cache lookup failed: {e}")
+        return {}
+    return cached
+
+
+def _store_texts(texts: Dict[str, str], dpi: int):
+    from .models import OCRCacheEntry
+
+    entries = [
+        OCRCacheEntry(key=key, text=text, languages=settings.OCR_LANGUAGES, dpi=dpi)
+        for key, text in texts.items()
+    ]
+    try:
+        OCRCacheEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    except Exception as e:
+        logger.warning(f"OCR cache write failed: {e}")
+
+
+def _hash_xobjects(resources, hasher, depth: int = 0):
+    if resources is None or depth > 5:
+        return
+    xobjects = resources.get_object().get('/XObject')
+    if not xobjects:
+        return
+    for name, reference in sorted(xobjects.get_object().items()):
+        xobject = reference.get_object()
+        hasher.update(name.encode('utf-8'))
+        # Raw (still encoded) stream bytes: hashing does not need the image decoded
+        hasher.update(getattr(xobject, '_data', b'') or b'')
+        if xobject.get('/Subtype') == '/Form':
+            _hash_xobjects(xobject.get('/Resources'), hasher, depth + 1)
+
+
+def page_fingerprint(page) -> str:
+    """
+    Hash of everything that determines how a page renders: its content
+    stream, the images and forms it draws, its box and rotation.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(f"{[float(v) for v in page.mediabox]}|{page.get('/Rotate', 0)}".encode('utf-8'))
+    contents = page.get_contents()
+    if contents is not None:
+        hasher.update(contents.get_data())
+    _hash_xobjects(page.get('/Resources'), hasher)
+    return hasher.hexdigest()
+
+
+def _single_page_pdf(page) -> bytes:
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def ocr_pdf_pages(reader, page_indices: List[int]) -> Dict[int, str]:
+    """
+    OCR the given pages of a PDF.
+
+    Args:
+        reader (PdfReader): Open reader (see documents.pdf_source.open_pdf_reader)
+        page_indices (list): 0-based indices of the pages without a usable text layer
+
+    Returns:
+        dict: page index -> recognized text, for the pages where text was found
+    """
+    if not page_indices:
+        return {}
+    if not pdf_ocr_available():
+        logger.info(f"OCR unavailable; {len(page_indices)} pages without text are skipped")
+        return {}
+
+    from .pdf_source import get_page
+
+    dpi = settings.OCR_DPI
+    page_keys = {}
+    pages = {}
+    for index in page_indices:
+        try:
+            page = get_page(reader, index)
+            page_keys[index] = _cache_key(page_fingerprint(page), dpi)
+            pages[page_keys[index]] = page
+        except Exception as e:
+            logger.error(f"Could not prepare page {index + 1} for OCR: {e}")
+
+    texts = _cached_texts(set(page_keys.values()))
+    pending = {key: page for key, page in pages.items() if key not in texts}
+    if pending:
+        jobs = {}
+        for key, page in pending.items():
+            try:
+                jobs[key] = (_single_page_pdf(page), dpi, settings.OCR_LANGUAGES)
+            except Exception as e:
+                logger.error(f"Could not copy page for OCR: {e}")
+        recognized = _run(_ocr_pdf_page, jobs)
+        _store_texts(recognized, dpi)
+        texts.update(recognized)
+
+    logger.info(
+        f"OCR: {len(page_keys)} pages, {len(page_keys) - len(pending)} from cache, "
+        f"{len(pending)} recognized with {getattr(settings, 'OCR_WORKERS', 1)} workers"
+    )
+    return {index: texts[key] for index, key in page_keys.items() if texts.get(key)}
+
+
+def ocr_image(image_bytes: bytes) -> str:
+    """
+    OCR an image file. Multi-frame images (e.g. scanned TIFFs) are
+    recognized frame by frame in parallel.
+
+    Returns:
+        str: Recognized text ('' if none)
+
+    Raises:
+        RuntimeError: If OCR is not available
+    """
+    if not image_ocr_available():
+        raise RuntimeError("OCR support not available. Install pytesseract and pillow")
+
+    file_hash = hashlib.sha256(image_bytes).hexdigest()
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        frame_count = getattr(image, 'n_frames', 1)
+        keys = [_cache_key(f"{file_hash}:{frame}", 0) for frame in range(frame_count)]
+        texts = _cached_texts(keys)
+        jobs = {}
+        for frame, key in enumerate(keys):
+            if key in texts:
+                continue
+            if frame_count == 1:
+                jobs[key] = (image_bytes, settings.OCR_LANGUAGES)
+                continue
+            image.seek(frame)
+            buffer = io.BytesIO()
+            image.convert('L').save(buffer, format='PNG')
+            jobs[key] = (buffer.getvalue(), settings.OCR_LANGUAGES)
+
+    if jobs:
+        recognized = _run(_ocr_image, jobs)
+        _store_texts(recognized, 0)
+        texts.update(recognized)
+    return '\n\n'.join(texts[key] for key in keys if texts.get(key))
@@ -0,0 +1,212 @@
+"""
+One-time analysis of extracted pages.
+
+When a document's text is extracted, every page is analysed once and the
+results are kept in Document.metadata["page_analysis"], keyed by page
+number:
+
+    {"12": {"language": "en", "tokens": 812, "chars": 3391, "words": 561,
+            "density": 0.82, "score": 0.77, "boilerplate": null}, ...}
+
+- language: ISO code from the dominant Unicode script (Tamil, Devanagari,
+  ...); Latin-script pages use langdetect when it is installed, else "en"
+- tokens: exact gpt-4o token count (config.tokens, cached encoder)
+- density: share of non-space characters that are letters; tables of
+  numbers, indexes and tables of contents score low
+- boilerplate: "toc", "index", "front_matter" or "references" when the
+  page looks like one, else None
+- score: 0-1 "question-worthiness", combining length, density, how much
+  of the page is running prose, and a boilerplate penalty
+
+Generation planning (plan_pages) reads these instead of re-scanning text.
+"""
+
+import bisect
+import logging
+import random
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from config.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# (start, end, language) of the scripts taught in our schools, sorted by start
+SCRIPT_RANGES = [
+    (0x0600, 0x06FF, 'ar'),
+    (0x0900, 0x097F, 'hi'),
+    (0x0980, 0x09FF, 'bn'),
+    (0x0B80, 0x0BFF, 'ta'),
+    (0x0C00, 0x0C7F, 'te'),
+    (0x0C80, 0x0CFF, 'kn'),
+    (0x0D00, 0x0D7F, 'ml'),
+    (0x4E00, 0x9FFF, 'zh'),
+]
+_SCRIPT_STARTS = [start for start, _, _ in SCRIPT_RANGES]
+
+LANGUAGE_NAMES = {
+    'en': 'English', 'ta': 'Tamil', 'hi': 'Hindi', 'te': 'Telugu', 'kn': 'Kannada',
+    'ml': 'Malayalam', 'bn': 'Bengali', 'ar': 'Arabic', 'zh': 'Chinese',
+}
+
+MIN_TOKENS = 20          # Pages shorter than this cannot carry a question
+FULL_TOKENS = 150        # Pages this long get the full length factor
+PROSE_LINE_WORDS = 6     # Lines with at least this many words count as running prose
+BOILERPLATE_PENALTY = 0.2
+MIN_PLANNING_SCORE = 0.15
+
+_TOC_LINE = re.compile(r'(\.{3,}|…|\s{3,})\s*\d+\s*$')
+_INDEX_LINE = re.compile(r'^[^\d]{2,40},\s*\d+(\s*[,-]\s*\d+)*\s*$')
+_BOILERPLATE_HEADINGS = [
+    ('toc', re.compile(r'^\s*(table of )?contents\b', re.IGNORECASE)),
+    ('index', re.compile(r'^\s*index\b', re.IGNORECASE)),
+    ('references', re.compile(r'^\s*(references|bibliography|works cited)\b', re.IGNORECASE)),
+    ('front_matter', re.compile(r'copyright|all rights reserved|\bisbn\b|printed (in|by)\b', re.IGNORECASE)),
+]
+
+
+def _script_language(code_point: int) -> Optional[str]:
+    position = bisect.bisect_right(_SCRIPT_STARTS, code_point) - 1
+    if position >= 0:
+        start, end, language = SCRIPT_RANGES[position]
+        if start <= code_point <= end:
+            return language
+    return None
+
+
+def _character_counts(text: str):
+    letters = non_space = 0
+    scripts = {}
+    for ch in text:
+        if ch.isspace():
+            continue
+        non_space += 1
+        if ch.isalpha() or unicodedata.category(ch)[0] == 'M':  # Indic vowel signs are marks
+            letters += 1
+            if ord(ch) >= 0x0600:
+                language = _script_language(ord(ch))
+                if language:
+                    scripts[language] = scripts.get(language, 0) + 1
+    return letters, non_space, scripts
+
+
+def _latin_language(text: str) -> str:
+    try:
+        from langdetect import DetectorFactory, detect
+        DetectorFactory.seed = 0  # deterministic results
+        return detect(text[:2000])
+    except Exception:
+        return 'en'
+
+
+def detect_language(text: str) -> str:
+    """ISO 639-1 code of the page's language ('en' when unsure)."""
+    letters, _, scripts = _character_counts(text)
+    return _language_from_counts(text, letters, scripts)
+
+
+def _language_from_counts(text, letters, scripts) -> str:
+    if scripts:
+        language, count = max(scripts.items(), key=lambda item: item[1])
+        if count >= letters * 0.3:
+            return language
+    return _latin_language(text) if letters else 'en'
+
+
+def _boilerplate_kind(text: str, lines: List[str]) -> Optional[str]:
+    if lines:
+        toc_lines = sum(1 for line in lines if _TOC_LINE.search(line))
+        if toc_lines >= 3 and toc_lines >= len(lines) * 0.3:
+            return 'toc'
+        index_lines = sum(1 for line in lines if _INDEX_LINE.match(line))
+        if index_lines >= 5 and index_lines >= len(lines) * 0.4:
+            return 'index'
+    head = text[:300]
+    for kind, pattern in _BOILERPLATE_HEADINGS:
+        if pattern.search(head):
+            return kind
+    return None
+
+
+def analyze_page(text: str) -> Dict:
+    """Analyse one page's text. See the module docstring for the fields."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    words = len(text.split())
+    tokens = count_tokens(text)
+    letters, non_space, scripts = _character_counts(text)
+    density = letters / non_space if non_space else 0.0
+    boilerplate = _boilerplate_kind(text, lines)
+
+    if tokens < MIN_TOKENS:
+        score = 0.0
+    else:
+        length_factor = min(1.0, tokens / FULL_TOKENS)
+        density_factor = min(1.0, max(0.0, (density - 0.5) / 0.3))
+        prose_ratio = sum(1 for line in lines if len(line.split()) >= PROSE_LINE_WORDS) / len(lines) if lines else 0
+        # Scripts without spaces between words (e.g. Chinese) have no "prose lines"
+        if scripts and max(scripts, key=scripts.get) == 'zh':
+            prose_ratio = 1.0
+        score = length_factor * density_factor * (0.4 + 0.6 * prose_ratio)
+        if boilerplate:
+            score *= BOILERPLATE_PENALTY
+
+    return {
+        'language': _language_from_counts(text, letters, scripts),
+        'tokens': tokens,
+        'chars': len(text),
+        'words': words,
+        'density': round(density, 3),
+        'score': round(score, 3),
+        'boilerplate': boilerplate,
+    }
+
+
+def analyze_pages(pages: List[Tuple[str, str]]) -> Dict[str, Dict]:
+    """
+    Analyse (page_number, page_content) pairs.
+
+    Returns:
+        dict: page number (str) -> analysis
+    """
+    analysis = {str(page_number): analyze_page(content) for page_number, content in pages}
+    if analysis:
+        skipped = sum(1 for page in analysis.values() if page['score'] < MIN_PLANNING_SCORE)
+        logger.info(
+            f"Analysed {len(analysis)} pages: {sum(page['tokens'] for page in analysis.values())} tokens, "
+            f"{skipped} pages unlikely to yield questions"
+        )
+    return analysis
+
+
+def get_page_analysis(document, pages: List[Tuple[str, str]]) -> Dict[str, Dict]:
+    """
+    Return the stored analysis of a document's pages, analysing (and storing) missing pages.
+
+    The document is not saved; callers save it with their other changes.
+    """
+    metadata = dict(document.metadata or {})
+    stored = dict(metadata.get('page_analysis') or {})
+    missing = [(number, content) for number, content in pages if str(number) not in stored]
+    if missing:
+        stored.update(analyze_pages(missing))
+        metadata['page_analysis'] = stored
+        document.metadata = metadata
+    return stored
+
+
+def plan_pages(pages: List[Tuple[str, str]], analysis: Dict[str, Dict]) -> List[Tuple[str, str]]:
+    """
+    Order pages for question generation.
+
+    Question-worthy pages come first in a random order weighted by score
+    (so repeated runs still vary), followed by low-scoring pages as a
+    last resort.
+    """
+    def score(page):
+        return (analysis.get(str(page[0])) or {}).get('score', 0.5)
+
+    # Weighted random order: sort by u^(1/w) (Efraimidis-Spirakis sampling)
+    keyed = sorted(pages, key=lambda page: random.random() ** (1 / max(score(page), 0.01)), reverse=True)
+    worthy = [page for page in keyed if score(page) >= MIN_PLANNING_SCORE]
+    return worthy + [page for page in keyed if score(page) < MIN_PLANNING_SCORE]
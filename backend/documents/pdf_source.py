@@ -0,0 +1,306 @@
+"""
+Lazy, range-read access to PDFs in Supabase Storage.
+
+pypdf only needs the trailer, the cross-reference table, the page tree and
+the objects of the pages it renders. RangeFile is a seekable file object
+that fetches those bytes on demand with HTTP range requests, in aligned
+blocks, so extracting one page of a large book downloads a small fraction
+of it. Fetched blocks are kept in a process-wide LRU keyed by object path
+and ETag, so the xref and page tree of a recently opened document are
+parsed again without any network round-trips.
+
+Two pypdf behaviours also defeat range reads: in non-strict mode the
+reader seeks to every object in the xref to validate it, and reader.pages
+loads every page dictionary. open_pdf_reader() parses strictly (falling
+back to the lenient parser for damaged files), and page_count()/get_page()
+walk the page tree by /Count, loading only the nodes on the path to the
+requested page.
+
+Example usage:
+    with open_storage_pdf('fileupload', '12/book.pdf') as source:
+        text = extract_single_page_content(source, 42)
+"""
+
+import io
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from django.conf import settings
+from pypdf import PageObject, PdfReader
+from pypdf.errors import PdfReadError
+from pypdf.generic import NameObject
+
+logger = logging.getLogger(__name__)
+
+
+class BlockCache:
+    """Thread-safe LRU of fetched blocks, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._blocks = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+            return block
+
+    def put(self, key, block: bytes):
+        with self._lock:
+            previous = self._blocks.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._blocks[key] = block
+            self._size += len(block)
+            while self._size > self.max_bytes and self._blocks:
+                _, evicted = self._blocks.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self._size = 0
+
+
+_block_cache = None
+_block_cache_lock = threading.Lock()
+
+
+def get_block_cache() -> BlockCache:
+    global _block_cache
+    if _block_cache is None:
+        with _block_cache_lock:
+            if _block_cache is None:
+                _block_cache = BlockCache(getattr(settings, 'PDF_RANGE_CACHE_BYTES', 64 * 1024 * 1024))
+    return _block_cache
+
+
+class RangeFile(io.RawIOBase):
+    """
+    Read-only, seekable file object backed by a range fetch function.
+
+    Args:
+        fetch: Callable (start, end_inclusive) -> bytes
+        size (int): Total object size in bytes
+        cache_key: Identifies this object version in the shared block cache
+        block_size (int): Fetch granularity in bytes
+    """
+
+    def __init__(self, fetch: Callable[[int, int], bytes], size: int, cache_key,
+                 block_size: Optional[int] = None):
+        super().__init__()
+        self._fetch = fetch
+        self.size = size
+        self.cache_key = cache_key
+        self.block_size = block_size or getattr(settings, 'PDF_RANGE_BLOCK_SIZE', 64 * 1024)
+        self._cache = get_block_cache()
+        self._position = 0
+        self.requests = 0
+        self.bytes_fetched = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+
+    def _load_blocks(self, first: int, last: int):
+        """Return blocks first..last, fetching each missing run with one request."""
+        blocks = {}
+        missing = []
+        for index in range(first, last + 1):
+            block = self._cache.get((self.cache_key, index))
+            if block is None:
+                missing.append(index)
+            else:
+                blocks[index] = block
+
+        runs = []
+        for index in missing:
+            if runs and runs[-1][1] == index - 1:
+                runs[-1][1] = index
+            else:
+                runs.append([index, index])
+
+        for run_first, run_last in runs:
+            start = run_first * self.block_size
+            end = min(self.size, (run_last + 1) * self.block_size) - 1
+            data = self._fetch(start, end)
+            self.requests += 1
+            self.bytes_fetched += len(data)
+            for index in range(run_first, run_last + 1):
+                offset = (index - run_first) * self.block_size
+                block = data[offset:offset + self.block_size]
+                self._cache.put((self.cache_key, index), block)
+                blocks[index] = block
+        return blocks
+
+    def readinto(self, buffer):
+        if self._position >= self.size:
+            return 0
+        end = min(self.size, self._position + len(buffer))
+        first = self._position // self.block_size
+        last = (end - 1) // self.block_size
+        blocks = self._load_blocks(first, last)
+
+        data = b''.join(blocks[index] for index in range(first, last + 1))
+        offset = self._position - first * self.block_size
+        chunk = data[offset:offset + (end - self._position)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+
+def open_storage_pdf(bucket: str, path: str):
+    """
+    Open a stored PDF for lazy reading.
+
+    Returns the locally cached copy when the disk cache (config.storage_cache)
+    already holds the current version, otherwise a buffered RangeFile that
+    fetches only the bytes that are read.
+
+    Args:
+        bucket (str): Storage bucket name
+        path (str): Path/filename in the bucket
+
+    Returns:
+        Seekable binary file object
+
+    Raises:
+        FileNotFoundError: If the object does not exist
+    """
+    from config.supabase import SupabaseStorage
+
+    storage = SupabaseStorage()
+    metadata = storage.get_metadata(bucket, path)
+    if metadata is None:
+        raise FileNotFoundError(f"{bucket}/{path} not found in storage")
+
+    version = storage.object_version(metadata)
+    if storage.cache is not None:
+        local_path = storage.cache.get_path(bucket, path, version)
+        if local_path is not None:
+            return open(local_path, 'rb')
+
+    raw = RangeFile(
+        fetch=lambda start, end: storage.read_range(bucket, path, start, end),
+        size=metadata['size'],
+        cache_key=(bucket, path, version),
+    )
+    logger.info(f"Opened {bucket}/{path} ({metadata['size']} bytes) for range reads")
+    return io.BufferedReader(raw, buffer_size=raw.block_size)
+
+
+def open_pdf_reader(source) -> PdfReader:
+    """
+    Open a PdfReader without touching every object in the file.
+
+    Args:
+        source: PDF bytes or a seekable binary file object
+
+    Returns:
+        PdfReader: Reader that parses leniently from here on
+    """
+    stream = source if hasattr(source, 'read') else io.BytesIO(source)
+    try:
+        reader = PdfReader(stream, strict=True)
+    except PdfReadError as e:
+        logger.info(f"Strict PDF parse failed ({e}), retrying leniently")
+        stream.seek(0)
+        return PdfReader(stream)
+    # Strict mode only matters for the up-front xref validation
+    reader.strict = False
+    return reader
+
+
+INHERITABLE_PAGE_ATTRIBUTES = ('/Resources', '/MediaBox', '/CropBox', '/Rotate')
+
+
+def page_count(reader) -> int:
+    """
+    Number of pages, read from the page tree root without loading any page.
+    """
+    try:
+        return int(reader.root_object['/Pages'].get_object()['/Count'])
+    except (KeyError, TypeError, ValueError):
+        return len(reader.pages)
+
+
+def _node_type(node) -> str:
+    if '/Type' in node:
+        return node['/Type']
+    return '/Pages' if '/Kids' in node else '/Page'
+
+
+def _node_count(node) -> int:
+    return int(node.get('/Count', 1)) if _node_type(node) == '/Pages' else 1
+
+
+def get_page(reader, index: int) -> PageObject:
+    """
+    Return page index (0-based) without flattening the whole page tree.
+
+    Intermediate nodes are skipped using their /Count, so only the nodes on
+    the path to the page are loaded. When a node's /Count equals the number
+    of its kids, the kids are all leaves and the page is picked directly.
+    Inherited attributes (resources, boxes, rotation) are applied as pypdf
+    does when flattening.
+
+    Raises:
+        IndexError: If the page does not exist
+    """
+    node = reader.root_object['/Pages'].get_object()
+    if index < 0 or index >= _node_count(node):
+        raise IndexError(f"Page {index + 1} out of range")
+
+    inherited = {}
+    reference = None
+    while _node_type(node) == '/Pages':
+        for attribute in INHERITABLE_PAGE_ATTRIBUTES:
+            if attribute in node:
+                inherited[attribute] = node[attribute]
+        kids = node['/Kids']
+        if int(node.get('/Count', -1)) == len(kids):
+            candidate = kids[index].get_object()
+            if _node_type(candidate) == '/Page':
+                reference, node = kids[index], candidate
+                break
+        for kid in kids:
+            child = kid.get_object()
+            count = _node_count(child)
+            if index < count:
+                reference, node = kid, child
+                break
+            index -= count
+        else:
+            raise IndexError("Page tree /Count does not match its kids")
+
+    page = PageObject(reader, reference)
+    page.update(node)
+    for attribute, value in inherited.items():
+        if attribute not in page:
+            page[NameObject(attribute)] = value
+    return page
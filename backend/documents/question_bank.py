@@ -0,0 +1,173 @@
+"""
+Reusable question bank.
+
+Every validated question generated from a document is kept in
+QuestionBankEntry, keyed by the SHA-256 of the source file, the page it
+came from, its question type and the quiz difficulty. When another quiz is
+built from the same file (our syllabus books are uploaded again every
+term, by every teacher), its questions are drawn from the bank first and
+the LLM is only asked for the shortfall.
+
+Draws prefer the least-used entries, so quizzes on the same chapter do not
+all get the same questions, and skip near-duplicates of the quiz's own
+questions (documents.question_similarity).
+
+Example usage:
+    banked = draw_questions(sha256, ['3', '4'], ['mcq'], 'easy', 10, index)
+    ...generate the rest...
+    deposit_questions(sha256, new_questions, 'mcq', 'easy', ['3', '4'])
+"""
+
+import copy
+import hashlib
+import logging
+import random
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import QuestionBankEntry
+from .question_similarity import QuestionIndex
+
+logger = logging.getLogger(__name__)
+
+MAX_CANDIDATES = 1000
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def question_hash(question: Dict) -> str:
+    text = ' '.join(str(question.get('question', '')).lower().split())
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def document_content_hash(file_data, stored_file=None) -> Optional[str]:
+    """
+    SHA-256 of the source file. Files read from storage (range reads) use
+    their stored blob's hash instead, as hashing them would download the
+    whole file; legacy stored files without a blob have no hash. Local file
+    objects, such as uploads, are hashed in chunks.
+    """
+    if isinstance(file_data, (bytes, bytearray)):
+        return hashlib.sha256(file_data).hexdigest()
+    if stored_file:
+        return stored_file[1].sha256 if stored_file[1] is not None else None
+    if hasattr(file_data, 'read'):
+        hasher = hashlib.sha256()
+        file_data.seek(0)
+        for chunk in iter(lambda: file_data.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+        file_data.seek(0)
+        return hasher.hexdigest()
+    return None
+
+
+def draw_questions(content_hash: str, pages: Iterable[str], question_types: List[str], difficulty: str,
+                   limit: int, index: Optional[QuestionIndex] = None) -> List[Dict]:
+    """
+    Take up to limit banked questions from the given pages.
+
+    Question types are taken in turn, each up to its share of limit,
+    least-used entries first (ties in random order). Accepted questions
+    are added to index and marked with their bank type in
+    'question_type' when missing.
+
+    Args:
+        content_hash (str): SHA-256 of the source file
+        pages (iterable): Page numbers the quiz covers
+        question_types (list): Types wanted, e.g. ['mcq'] or the mixed rotation
+        difficulty (str): Quiz difficulty
+        limit (int): Maximum number of questions
+        index (QuestionIndex): Questions the quiz already has
+
+    Returns:
+        list: Question dicts (copies, without question_number)
+    """
+    if not settings.QUESTION_BANK_ENABLED or not content_hash or limit <= 0:
+        return []
+    entries = list(
+        QuestionBankEntry.objects.filter(
+            content_hash=content_hash,
+            difficulty=difficulty,
+            question_type__in=question_types,
+            page__in=[str(page) for page in pages],
+        ).order_by('times_used')[:MAX_CANDIDATES]
+    )
+    if not entries:
+        return []
+
+    by_type = {question_type: [] for question_type in question_types}
+    for entry in sorted(entries, key=lambda entry: (entry.times_used, random.random())):
+        by_type[entry.question_type].append(entry)
+
+    # Mixed quizzes get at most their share of each type; the rest is generated
+    quota = -(-limit // len(question_types))
+    taken = {question_type: 0 for question_type in question_types}
+    index = index if index is not None else QuestionIndex()
+    chosen = []
+    while len(chosen) < limit and any(by_type.values()):
+        for question_type in question_types:
+            candidates = by_type[question_type]
+            if taken[question_type] >= quota:
+                candidates.clear()
+            while candidates and len(chosen) < limit:
+                entry = candidates.pop(0)
+                if index.find_duplicate(entry.question) is None:
+                    index.add(entry.question)
+                    chosen.append(entry)
+                    taken[question_type] += 1
+                    break
+
+    if chosen:
+        QuestionBankEntry.objects.filter(pk__in=[entry.pk for entry in chosen]).update(
+            times_used=F('times_used') + 1, last_used_at=timezone.now()
+        )
+    logger.info(f"Question bank: {len(chosen)} of {limit} questions reused ({len(entries)} candidates)")
+
+    questions = []
+    for entry in chosen:
+        question = copy.deepcopy(entry.question)
+        question.pop('question_number', None)
+        question.setdefault('question_type', entry.question_type)
+        questions.append(question)
+    return questions
+
+
+def deposit_questions(content_hash: str, questions: List[Dict], question_type: str, difficulty: str,
+                      pages: Iterable[str]) -> int:
+    """
+    Bank newly generated questions.
+
+    Questions are filed under their source_page; ones whose source page is
+    not one of the pages they were generated from are filed under the only
+    page when there is exactly one, and otherwise not banked.
+
+    Returns:
+        int: Number of questions offered to the bank (existing ones are ignored)
+    """
+    if not settings.QUESTION_BANK_ENABLED or not content_hash or not questions:
+        return 0
+    pages = [str(page) for page in pages]
+    entries = []
+    for question in questions:
+        page = str(question.get('source_page', ''))
+        if page not in pages:
+            if len(pages) != 1:
+                continue
+            page = pages[0]
+        stored = {key: value for key, value in question.items() if key != 'question_number'}
+        entries.append(QuestionBankEntry(
+            content_hash=content_hash,
+            page=page,
+            question_type=question_type,
+            difficulty=difficulty,
+            question_hash=question_hash(question),
+            question=stored,
+        ))
+    try:
+        QuestionBankEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    except Exception as e:
+        logger.warning(f"Could not bank questions: {e}")
+        return 0
+    return len(entries)
@@ -0,0 +1,180 @@
+"""
+Near-duplicate detection for generated questions.
+
+Exact string matching let paraphrases through ("Which gas do plants
+absorb?" / "What gas is absorbed by plants?"), and every such duplicate
+costs a "replace question" and another LLM call. Each question is reduced
+to the set of content words of its text and answer (lowercased, stop words
+removed, simple suffix stemming) and summarised by a MinHash signature.
+The share of equal signature slots estimates the Jaccard similarity of two
+word sets, so one candidate is compared against every indexed question
+with a single NumPy comparison.
+
+A candidate is a duplicate when its estimated similarity to an indexed
+question reaches QUESTION_SIMILARITY_THRESHOLD. Including the answer keeps
+similar-looking questions about different facts apart; identical question
+texts are always duplicates, as before. Questions made only of stop words
+have no content words to compare and only match exactly.
+
+Example usage:
+    index = QuestionIndex.for_quiz(quiz, document.storage_path)
+    if index.find_duplicate(question) is None:
+        index.add(question)
+"""
+
+import hashlib
+import json
+import logging
+import re
+import zlib
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+NUM_PERMUTATIONS = 128
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240611)  # fixed: signatures must be comparable across processes
+_A = _rng.randint(1, _PRIME, NUM_PERMUTATIONS).astype(np.uint64)
+_B = _rng.randint(0, _PRIME, NUM_PERMUTATIONS).astype(np.uint64)
+
+STOP_WORDS = frozenset("""
+a an the of in on at to for from by with about into over under between through during and or but not as
+is are was were be been being do does did has have had can could will would shall should may might must
+what which who whom whose when where why how that this these those it its their there here than then
+following statement statements true false correct answer blank fill best describes given known called named
+""".split())
+
+_WORD = re.compile(r'\w+')
+_BLANK = re.compile(r'_{2,}')
+_SUFFIXES = ('ing', 'ed', 'es', 's')
+
+Candidate = Union[str, Dict]
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.isascii():
+        for suffix in _SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                return word[:-len(suffix)]
+    return word
+
+
+def question_words(question: Candidate) -> frozenset:
+    """Content words of a question dict (text and answer) or of a plain question string."""
+    if isinstance(question, dict):
+        answer = question.get('correct_answer')
+        if isinstance(answer, (dict, list)):
+            answer = json.dumps(answer, sort_keys=True, ensure_ascii=False)
+        text = f"{question.get('question', '')} {answer or ''}"
+    else:
+        text = question or ''
+    words = _WORD.findall(_BLANK.sub(' ', text).lower())
+    return frozenset(_stem(word) for word in words if word not in STOP_WORDS and word != '_')
+
+
+def signature(words: Iterable[str]) -> np.ndarray:
+    """MinHash signature of a word set."""
+    hashes = np.fromiter((zlib.crc32(word.encode('utf-8')) for word in words), dtype=np.uint64)
+    if not len(hashes):
+        return np.full(NUM_PERMUTATIONS, _PRIME, dtype=np.uint64)
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def parse_question_items(raw) -> List[Dict]:
+    """Question dicts from a stored question value (JSON string, list or dict)."""
+    try:
+        while isinstance(raw, str):
+            raw = json.loads(raw)
+    except (TypeError, ValueError):
+        return []
+    if isinstance(raw, dict):
+        raw = [raw] if 'question' in raw else list(raw.values())
+    if not isinstance(raw, list):
+        return []
+    return [item for item in raw if isinstance(item, dict) and item.get('question')]
+
+
+class QuestionIndex:
+    """
+    Questions already asked, for rejecting exact and near duplicates.
+
+    Also supports `text in index` and `index.add(text)`, so it can stand in
+    for the plain set of question strings used before.
+    """
+
+    def __init__(self, questions: Iterable[Candidate] = (), threshold: Optional[float] = None):
+        self.threshold = settings.QUESTION_SIMILARITY_THRESHOLD if threshold is None else threshold
+        self._texts = []
+        self._exact = set()
+        self._signatures = []
+        self._signature_texts = []  # texts of the questions with content words, row by row
+        self._matrix = None
+        for question in questions:
+            self.add(question)
+
+    @classmethod
+    def for_quiz(cls, quiz, storage_path: Optional[str] = None) -> 'QuestionIndex':
+        """
+        Index of the quiz's questions, plus those recently generated from the
+        stored file at storage_path (re-uploads and regenerations of a book).
+        """
+        from quiz.models import Question
+
+        rows = list(Question.objects.filter(quiz=quiz).values_list('question', flat=True))
+        if getattr(quiz, 'questions', None):
+            rows.append(quiz.questions)
+        if storage_path:
+            since = timezone.now() - timedelta(days=settings.QUESTION_SIMILARITY_RECENT_DAYS)
+            rows.extend(
+                Question.objects.filter(
+                    document__storage_path=storage_path, created_at__gte=since
+                ).exclude(quiz=quiz).order_by('-created_at').values_list('question', flat=True)[:50]
+            )
+        index = cls(item for raw in rows for item in parse_question_items(raw))
+        logger.info(f"Question index for quiz {quiz.quiz_id}: {len(index)} known questions")
+        return index
+
+    def __len__(self):
+        return len(self._texts)
+
+    def fingerprint(self) -> str:
+        """Hash of the indexed question texts, independent of their order."""
+        return hashlib.sha256('\n'.join(sorted(self._exact)).encode('utf-8')).hexdigest()
+
+    def __contains__(self, question: Candidate) -> bool:
+        return self.find_duplicate(question) is not None
+
+    def add(self, question: Candidate):
+        text = question.get('question', '') if isinstance(question, dict) else question
+        self._texts.append((text or '').strip())
+        self._exact.add(' '.join((text or '').lower().split()))
+        words = question_words(question)
+        if words:
+            self._signatures.append(signature(words))
+            self._signature_texts.append(self._texts[-1])
+            self._matrix = None
+
+    def find_duplicate(self, question: Candidate) -> Optional[str]:
+        """
+        Returns:
+            str: Text of the indexed question the candidate duplicates, or None
+        """
+        text = question.get('question', '') if isinstance(question, dict) else question
+        normalized = ' '.join((text or '').lower().split())
+        if normalized in self._exact:
+            return text
+        words = question_words(question)
+        if not words or not self._signatures:
+            return None
+        if self._matrix is None:
+            self._matrix = np.vstack(self._signatures)
+        similarity = (self._matrix == signature(words)).mean(axis=1)
+        best = int(similarity.argmax())
+        if similarity[best] >= self.threshold:
+            return self._signature_texts[best]
+        return None
@@ -7,12 +7,24 @@ from django.conf import settings
 from .models import Document
 from quiz.models import Question
 from .utils import extract_text_from_file, _extract_text_from_pdf_content, _parse_page_ranges_str, extract_single_page_content, validate_page_range
-from openai import OpenAI
+from .utils import SECTION_EXTENSIONS, extract_sections_text
+from config.llm_gateway import get_llm_gateway
+from config.llm_usage import track_llm_usage
 import json
-from supabase import create_client, Client
+from config.supabase import SupabaseStorage
+from .pdf_source import open_storage_pdf, open_pdf_reader, page_count
+from .blob_storage import add_blob_reference
+from .page_analysis import detect_language, get_page_analysis, plan_pages
+from .content_packing import (
+    content_budget, join_pages, pack_pages, questions_for_pages, response_tokens, select_spread
+)
+from .question_similarity import QuestionIndex
+from .question_bank import deposit_questions, document_content_hash, draw_questions
+from config.tokens import count_tokens
+import math
 import random
+from collections import Counter
 import os
-openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
 logger = logging.getLogger(__name__)
 
@@ -162,18 +174,17 @@ class DocumentProcessingService:
         logger.info(f"Finalized match question. New correct_answer: {final_correct_answer}")
         return q
 
-    def generate_questions_from_text(self, text, question_type, quiz_type, num_questions, existing_questions: set = None):
+    def generate_questions_from_text(self, text, question_type, quiz_type, num_questions, existing_questions: QuestionIndex = None, tenant=None, use_cache=None, cache_variant=None):
         import math
         import logging
         import re
-        from openai import OpenAI
-        from django.conf import settings
 
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        gateway = get_llm_gateway()
         logger = logging.getLogger(__name__)
 
-        if existing_questions is None:
-            existing_questions = set()
+        if not isinstance(existing_questions, QuestionIndex):
+            # Near-duplicates are rejected across all the batches below
+            existing_questions = QuestionIndex(existing_questions or ())
 
         all_questions = []
         start_question_number = 1
@@ -182,28 +193,37 @@ class DocumentProcessingService:
             question_types_to_generate = self.QUESTION_TYPES_ROTATION
             num_question_types = len(question_types_to_generate)
             
-            for i in range(num_questions):
-                q_type = question_types_to_generate[i % num_question_types]
+            # One call per type, each asking for its share of the questions
+            for i, q_type in enumerate(question_types_to_generate):
+                type_count = num_questions // num_question_types + (1 if i < num_questions % num_question_types else 0)
+                if type_count == 0:
+                    continue
                 batch = self._generate_question_batch(
-                    client,
+                    gateway,
                     text,
                     q_type, 
                     quiz_type, # This is the difficulty dict
-                    1, # Generate 1 question at a time
+                    type_count,
                     existing_questions=existing_questions,
-                    start_question_number=start_question_number + i
+                    start_question_number=start_question_number + len(all_questions),
+                    tenant=tenant,
+                    use_cache=use_cache,
+                    cache_variant=cache_variant
                 )
                 if batch:
                     all_questions.extend(batch)
         else:
             all_questions = self._generate_question_batch(
-                client, 
+                gateway, 
                 text, 
                 question_type, 
                 quiz_type, 
                 num_questions,
                 existing_questions=existing_questions,
-                start_question_number=start_question_number
+                start_question_number=start_question_number,
+                tenant=tenant,
+                use_cache=use_cache,
+                cache_variant=cache_variant
             )
 
         return all_questions
@@ -232,19 +252,14 @@ class DocumentProcessingService:
     @staticmethod
     def _detect_language(text: str) -> str:
         """Detects the language of a given text snippet."""
-        try:
-            from langdetect import detect
-            lang_code = detect(text)
-            return "Tamil" if lang_code == "ta" else "English"
-        except Exception:
-            return "English"
+        return "Tamil" if detect_language(text) == "ta" else "English"
 
     @staticmethod
     def _split_text_by_page(text: str) -> list[tuple[str, str]]:
         """Splits the extracted text into a list of (page_number, page_content) tuples."""
         pages = []
         # Regex to find page markers and capture the page number and the content until the next marker
-        pattern = re.compile(r"==================== PAGE (\d+) ====================(.*?)(?=(?:==================== PAGE|==================== END OF DOCUMENT))", re.DOTALL)
+        pattern = re.compile(r"==================== PAGE (\d+) ====================(.*?)(?=(?:==================== PAGE|==================== END OF DOCUMENT|\Z))", re.DOTALL)
         matches = pattern.finditer(text)
         for match in matches:
             page_number = match.group(1).strip()
@@ -270,12 +285,16 @@ class DocumentProcessingService:
             )
         return True
 
-    def _generate_question_batch(self, client, text, question_type, quiz_type, num_questions, existing_questions: set, start_question_number=1, override_source_page=None):
+    def _generate_question_batch(self, gateway, text, question_type, quiz_type, num_questions, existing_questions: QuestionIndex, start_question_number=1, override_source_page=None, tenant=None, use_cache=None, cache_variant=None,
+                                 select_pages=True):
         import re
         import json
         import logging
         logger = logging.getLogger(__name__)
 
+        if not isinstance(existing_questions, QuestionIndex):
+            existing_questions = QuestionIndex(existing_questions or ())
+
         # Handle multi-page text
         text_sections = []
         current_section = []
@@ -299,39 +318,25 @@ class DocumentProcessingService:
         if not text_sections:
             text_sections = [('all', text)]
 
-        # Sample pages from start, middle, and end
-        num_samples = 3
-        total_sections = len(text_sections)
-        if total_sections <= num_samples:
-            sampled_sections = text_sections
-        else:
-            indices = [0, total_sections // 2, total_sections - 1]
-            sampled_sections = [text_sections[i] for i in indices]
-
-        sections_text = ""
-        page_numbers = []
-        for page_num, section_text in sampled_sections:
-            sections_text += f"\nContent from page {page_num}:\n{section_text}\n"
-            page_numbers.append(page_num)
-
-        primary_page = override_source_page if override_source_page else 'all'
-
-        max_content_length = 10000
-        if len(sections_text) > max_content_length:
-            sections_text = sections_text[:max_content_length] + "\n[Content truncated]"
-            logger.warning(f"Content truncated to {max_content_length} characters")
-
         # Determine difficulty from the quiz_type dictionary, defaulting to 'easy'
         difficulty = next(iter(quiz_type)) if isinstance(quiz_type, dict) and quiz_type else 'easy'
 
-        # Build prompt for a single question
+        if num_questions == 1:
+            count_instruction = "generate exactly ONE question."
+        else:
+            count_instruction = (
+                f"generate exactly {num_questions} questions, each from a different part of the content "
+                f"where possible."
+            )
+
+        # Build prompt; the content is filled in once the token budget is known
         base_prompt = f"""
-        You are an expert quiz generator. Based on the following content, generate exactly ONE question.
+        You are an expert quiz generator. Based on the following content, {count_instruction}
         The question type must be: '{question_type}'.
         The difficulty must be: '{difficulty}'.
 
         Content:
-        {sections_text}
+        {{sections_text}}
 
         The question must include:
         - "question", "type", "options", "correct_answer", "explanation", "question_number", "source_page"
@@ -364,14 +369,37 @@ class DocumentProcessingService:
         }}
         """
 
-        response = client.chat.completions.create(
+        # Whole pages spread across the content, up to the prompt's token budget; text already
+        # packed with content_packing.pack_pages (select_pages=False) is sent as it is
+        sampled_sections = text_sections
+        if select_pages:
+            budget = content_budget(count_tokens(base_prompt), num_questions)
+            sampled_sections = select_spread(text_sections, budget)
+            if len(sampled_sections) < len(text_sections):
+                logger.info(f"Prompt carries {len(sampled_sections)} of {len(text_sections)} pages ({budget} token budget)")
+        sections_text = ""
+        for page_num, section_text in sampled_sections:
+            sections_text += f"\nContent from page {page_num}:\n{section_text}\n"
+
+        primary_page = override_source_page if override_source_page else 'all'
+        base_prompt = base_prompt.replace('{sections_text}', sections_text)
+
+        # A cached answer for the same prompt would only repeat questions the quiz has since
+        # gained, so the questions already known are part of the cache key
+        if existing_questions:
+            cache_variant = (cache_variant, existing_questions.fingerprint())
+
+        response = gateway.chat_completion(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a professional quiz question generator that outputs in JSON format."},
                 {"role": "user", "content": base_prompt}
             ],
+            tenant=tenant,
+            use_cache=use_cache,
+            cache_variant=cache_variant,
             temperature=0.7,
-            max_tokens=2000,
+            max_tokens=response_tokens(num_questions),
             response_format={"type": "json_object"}
         )
 
@@ -388,14 +416,15 @@ class DocumentProcessingService:
             parsed = json.loads(content)
             questions = parsed.get('questions', [])
             final_questions = []
-            for i, q in enumerate(questions):
+            for q in questions:
                 question_text = q.get("question", "").strip()
-                if question_text in existing_questions:
-                    logger.warning(f"Skipping duplicate question: {question_text}")
+                duplicate = existing_questions.find_duplicate(q)
+                if duplicate is not None:
+                    logger.warning(f"Skipping duplicate question: {question_text} (similar to: {duplicate})")
                     continue
 
                 if self._is_valid_question(q):
-                    q['question_number'] = start_question_number + i
+                    q['question_number'] = start_question_number + len(final_questions)
                     if 'source_page' not in q or not q['source_page']:
                         q['source_page'] = primary_page
 
@@ -404,7 +433,7 @@ class DocumentProcessingService:
                         q = self._finalize_match_question(q)
 
                     final_questions.append(q)
-                    existing_questions.add(question_text)
+                    existing_questions.add(q)
                 else:
                     logger.warning(f"Skipping invalid question from batch: {q}")
         
@@ -414,7 +443,30 @@ class DocumentProcessingService:
             logger.error("Failed to parse JSON:\n" + content)
             return []
 
-    def process_single_document(self, uploaded_file, quiz, user, page_range=None):
+    @staticmethod
+    def _stored_file(quiz, file_name):
+        """
+        Locate a file previously uploaded for a quiz.
+
+        Files are stored under their content hash (documents.blob_storage);
+        older uploads are stored as {quiz_id}/{file_name}.
+
+        Returns:
+            tuple: (storage path, StoredBlob or None)
+        """
+        document = (
+            Document.objects.filter(quiz=quiz, title=file_name)
+            .exclude(storage_path='')
+            .select_related('blob')
+            .only('storage_path', 'blob')
+            .first()
+        )
+        if document is None:
+            return f"{quiz.quiz_id}/{file_name}", None
+        return document.storage_path, document.blob
+
+    def process_single_document(self, uploaded_file, quiz, user, page_range=None, use_cache=None, file_data=None,
+                                stored_file=None, progress=None):
         """
         Process a single uploaded file, generate questions, and associate with a quiz.
 
@@ -423,13 +475,19 @@ class DocumentProcessingService:
             quiz: Quiz instance to associate document with
             user: User who uploaded the file
             page_range: Optional string specifying page ranges (e.g., "1-5,7,10-15") or single page number (e.g., "3")
+            use_cache: Pass False to bypass the LLM response cache and get fresh questions
+            file_data: Optional raw file bytes or seekable file object; when given the Supabase download is skipped
+            stored_file: Optional (storage path, StoredBlob) the file_data was read from; the new
+                document references the same stored file
+            progress: Optional callable(event, data) told about each question as soon as it is
+                accepted ('started', then one 'question' per question; see documents.generation_jobs)
 
         Returns:
             Dict containing processing results
         """
         import json
         import logging
-        from .utils import _extract_text_from_pdf_content, _parse_page_ranges_str
+        from .utils import _extract_text_from_pdf_content, _parse_page_ranges_str, decompress_if_needed
         logger = logging.getLogger(__name__)
 
         document = None  # Initialize document to None
@@ -446,36 +504,48 @@ class DocumentProcessingService:
                 metadata={'page_range': page_range} if page_range else {}
             )
 
-            # Load file from Supabase bucket
-            logger.info(f"Downloading file from Supabase bucket")
-            supabase_url = os.environ.get('SUPABASE_URL')
-            supabase_key = os.environ.get('SUPABASE_KEY')
-            supabase = create_client(supabase_url, supabase_key)
-            file_path = f"{quiz.quiz_id}/{uploaded_file.name}"
-            file_data = supabase.storage.from_("fileupload").download(file_path)
-
-            # Get total pages for validation
-            from pypdf import PdfReader
-            import io
-            pdf_reader = PdfReader(io.BytesIO(file_data))
-            total_pages = len(pdf_reader.pages)
-            logger.info(f"PDF has {total_pages} total pages")
-
-            # Validate page ranges if provided
-            if page_range:
-                validation_result = validate_page_range(page_range, total_pages)
-                if not validation_result['valid']:
-                    raise ValueError(validation_result['message'])
-                page_range = validation_result['adjusted_ranges'] or page_range
-                logger.info(f"Using validated page range: {page_range}")
-
-            # Parse page ranges
-            page_ranges = _parse_page_ranges_str(page_range) if page_range else None
-            logger.info(f"Parsed page ranges: {page_ranges}")
-
-            # Extract text
-            logger.info(f"Extracting text with page range: {page_range}")
-            extracted_text = _extract_text_from_pdf_content(file_data, page_ranges)
+            if file_data is None:
+                # Load file from Supabase bucket
+                logger.info(f"Downloading file from Supabase bucket")
+                stored_file = self._stored_file(quiz, uploaded_file.name)
+                file_data = SupabaseStorage().download_file("fileupload", stored_file[0])
+
+            # Files over the upload limit are stored zipped
+            file_data = decompress_if_needed(file_data)
+
+            # Add 5 additional questions as requested
+            target_questions = (quiz.no_of_questions or 0) + 5
+
+            extension = os.path.splitext(uploaded_file.name)[1].lower()
+            if extension in SECTION_EXTENSIONS:
+                # Word/Excel: streamed in page-like sections; one question is generated per
+                # section, so reading stops once there are twice as many sections as questions
+                page_ranges = _parse_page_ranges_str(page_range) if page_range else None
+                logger.info(f"Extracting {extension} sections with page range: {page_range}")
+                extracted_text = extract_sections_text(
+                    file_data, extension, page_ranges, max_sections=None if page_ranges else target_questions * 2
+                )
+            else:
+                # Get total pages for validation
+                pdf_reader = open_pdf_reader(file_data)
+                total_pages = page_count(pdf_reader)
+                logger.info(f"PDF has {total_pages} total pages")
+
+                # Validate page ranges if provided
+                if page_range:
+                    validation_result = validate_page_range(page_range, total_pages)
+                    if not validation_result['valid']:
+                        raise ValueError(validation_result['message'])
+                    page_range = validation_result['adjusted_ranges'] or page_range
+                    logger.info(f"Using validated page range: {page_range}")
+
+                # Parse page ranges
+                page_ranges = _parse_page_ranges_str(page_range) if page_range else None
+                logger.info(f"Parsed page ranges: {page_ranges}")
+
+                # Extract text
+                logger.info(f"Extracting text with page range: {page_range}")
+                extracted_text = _extract_text_from_pdf_content(pdf_reader, page_ranges)
             if not extracted_text or extracted_text.startswith('[Error'):
                 raise ValueError('Failed to extract text from file.')
 
@@ -484,47 +554,105 @@ class DocumentProcessingService:
             logger.info(f"Successfully extracted {len(extracted_text)} characters of text.")
 
             # Step 3: Generate questions
-            # Add 5 additional questions as requested
-            target_questions = (quiz.no_of_questions or 0) + 5
             logger.info(f"Targeting {target_questions} questions for quiz {quiz.quiz_id}")
 
             pages = self._split_text_by_page(extracted_text)
             if not pages:
                 raise ValueError('Failed to parse pages from extracted text.')
 
-            logger.info(f"Split text into {len(pages)} pages. Randomizing for question generation.")
-            random.shuffle(pages)
+            # Analyse every page once (language, tokens, quality); stored with the document
+            page_analysis = get_page_analysis(document, pages)
+            document.save(update_fields=['metadata'])
+
+            logger.info(f"Split text into {len(pages)} pages. Ordering them by question-worthiness.")
+            pages = plan_pages(pages, page_analysis)
 
             questions = []
-            existing_questions = set()
+            # Reject near-duplicates of the quiz's questions and of recent ones from the same file
+            storage_path = stored_file[0] if stored_file else f"{quiz.quiz_id}/{uploaded_file.name}"
+            existing_questions = QuestionIndex.for_quiz(quiz, storage_path)
             current_question_number = 1
             question_types_to_generate = self.QUESTION_TYPES_ROTATION if quiz.question_type == 'mixed' else [quiz.question_type]
             type_index = 0
 
-            for page_num, page_content in pages:
-                if len(questions) >= target_questions:
-                    logger.info(f"Reached target of {target_questions} questions.")
-                    break
-
-                q_type = question_types_to_generate[type_index % len(question_types_to_generate)]
-                type_index += 1
-
-                logger.info(f"Generating one '{q_type}' question from page {page_num}")
-                batch = self._generate_question_batch(
-                    client=openai_client,
-                    text=page_content,
-                    question_type=q_type,
-                    quiz_type=quiz.quiz_type,
-                    num_questions=1,
-                    existing_questions=existing_questions,
-                    start_question_number=current_question_number,
-                    override_source_page=page_num
+            # Questions other quizzes already generated from these pages of the same file come
+            # first; the LLM is only asked for the shortfall (not when fresh questions are wanted)
+            content_hash = document_content_hash(file_data, stored_file)
+            if content_hash:
+                document.metadata = {**(document.metadata or {}), 'content_hash': content_hash}
+                # Saved now: LLM usage tracking reloads the metadata from the database
+                document.save(update_fields=['metadata'])
+            difficulty = str(quiz.quiz_type)
+
+            def report(batch):
+                if progress:
+                    for q in batch[:max(0, target_questions - len(questions))]:
+                        progress('question', {'question': q})
+
+            if progress:
+                progress('started', {'target': target_questions, 'pages': len(pages)})
+            if use_cache is not False:
+                banked = draw_questions(
+                    content_hash, [page_num for page_num, _ in pages], question_types_to_generate,
+                    difficulty, target_questions, existing_questions
                 )
-
-                if batch:
-                    questions.extend(batch)
-                    current_question_number += len(batch)
-                    logger.info(f"Successfully generated question #{len(questions)} from page {page_num}")
+                for q in banked:
+                    q['question_number'] = current_question_number
+                    current_question_number += 1
+                report(banked)
+                questions.extend(banked)
+                # Types and pages the bank covered least are generated first
+                banked_types = Counter(q['question_type'] for q in banked)
+                question_types_to_generate = sorted(question_types_to_generate, key=lambda t: banked_types[t])
+                banked_pages = {str(q.get('source_page')) for q in banked}
+                pages = [page for page in pages if page[0] not in banked_pages] + \
+                        [page for page in pages if page[0] in banked_pages]
+
+            # Several questions per call, from as many whole pages as fit the token budget;
+            # mixed quizzes keep calls small enough that every type gets its turn
+            shortfall = target_questions - len(questions)
+            questions_per_call = settings.GENERATION_MAX_QUESTIONS_PER_CALL
+            if len(question_types_to_generate) > 1:
+                questions_per_call = min(questions_per_call, math.ceil(shortfall / len(question_types_to_generate)))
+            questions_per_call = max(1, questions_per_call)
+            page_groups = pack_pages(
+                pages, questions_per_call, calls=math.ceil(shortfall / questions_per_call), analysis=page_analysis
+            ) if shortfall > 0 else []
+
+            # Record tokens, latency and cost of every call against this document and quiz
+            with track_llm_usage(document=document, quiz=quiz, user=user):
+                for group in page_groups:
+                    remaining = target_questions - len(questions)
+                    if remaining <= 0:
+                        logger.info(f"Reached target of {target_questions} questions.")
+                        break
+
+                    q_type = question_types_to_generate[type_index % len(question_types_to_generate)]
+                    type_index += 1
+                    count = questions_for_pages(group, min(questions_per_call, remaining), page_analysis)
+                    page_numbers = [page_num for page_num, _ in group]
+
+                    logger.info(f"Generating {count} '{q_type}' questions from pages {', '.join(page_numbers)}")
+                    batch = self._generate_question_batch(
+                        gateway=get_llm_gateway(),
+                        text=join_pages(group),
+                        question_type=q_type,
+                        quiz_type=quiz.quiz_type,
+                        num_questions=count,
+                        existing_questions=existing_questions,
+                        start_question_number=current_question_number,
+                        override_source_page=page_numbers[0] if len(page_numbers) == 1 else None,
+                        tenant=user.pk,
+                        use_cache=use_cache,
+                        select_pages=False
+                    )
+
+                    if batch:
+                        report(batch)
+                        questions.extend(batch)
+                        current_question_number += len(batch)
+                        deposit_questions(content_hash, batch, q_type, difficulty, page_numbers)
+                        logger.info(f"Generated {len(batch)} questions ({len(questions)} so far)")
 
             if len(questions) > target_questions:
                 questions = questions[:target_questions]
@@ -546,7 +674,11 @@ class DocumentProcessingService:
             document.is_processed = True
             document.processing_status = 'success'
             document.storage_path = f"{quiz.quiz_id}/{uploaded_file.name}"
+            if stored_file:
+                document.storage_path = stored_file[0]
             document.save()
+            if stored_file and stored_file[1] is not None:
+                add_blob_reference(document, stored_file[1])
 
             return {
                 "success": True,
@@ -628,7 +760,7 @@ class DocumentProcessingService:
             logger.error(f"Full error details:", exc_info=True)
             return {"success": False, "error": str(e)}
 
-    def generate_questions_from_single_page(self, uploaded_file, quiz, user, page_number):
+    def generate_questions_from_single_page(self, uploaded_file, quiz, user, page_number, use_cache=None):
         """
         Generate questions from a specific single page of a document.
         
@@ -637,6 +769,7 @@ class DocumentProcessingService:
             quiz: Quiz instance to associate document with
             user: User who uploaded the file
             page_number: Single page number (1-indexed) as integer or string
+            use_cache: Pass False to bypass the LLM response cache and get fresh questions
             
         Returns:
             Dict containing processing results
@@ -646,8 +779,13 @@ class DocumentProcessingService:
             page_range = str(page_number)
             logger.info(f"Generating questions from single page {page_number}")
             
-            # Use the existing process_single_document method
-            result = self.process_single_document(uploaded_file, quiz, user, page_range)
+            # Read only the bytes needed for this page instead of downloading the whole file
+            stored_file = self._stored_file(quiz, uploaded_file.name)
+            with open_storage_pdf("fileupload", stored_file[0]) as source:
+                result = self.process_single_document(
+                    uploaded_file, quiz, user, page_range, use_cache=use_cache, file_data=source,
+                    stored_file=stored_file
+                )
             
             if result.get('success'):
                 logger.info(f"Successfully generated questions from page {page_number}")
@@ -0,0 +1,364 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import Future
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from quiz.models import Quiz
+from config.tokens import count_tokens
+from . import chunked_upload
+from .blob_storage import BlobUpload, blob_path, collect_garbage, content_hash, release_blobs
+from .content_packing import PAGE_HEADER_TOKENS, content_budget, fit_text, pack_pages, select_spread
+from .models import Document, StoredBlob, UploadSession
+from .question_similarity import QuestionIndex
+from .utils import extract_sections_text
+
+
+class FakeStorage:
+    """In-memory stand-in for SupabaseStorage; uploads finish immediately."""
+
+    def __init__(self, fail_uploads=False):
+        self.objects = {}
+        self.fail_uploads = fail_uploads
+
+    def upload_file(self, bucket, path, file, file_options=None):
+        if self.fail_uploads:
+            raise ConnectionError('upload failed')
+        self.objects[(bucket, path)] = file
+
+    def upload_file_async(self, bucket, path, file, file_options=None):
+        future = Future()
+        try:
+            future.set_result(self.upload_file(bucket, path, file, file_options))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def remove_file(self, bucket, paths):
+        self.objects.pop((bucket, paths), None)
+
+
+class BlobStorageTests(TestCase):
+    data = b'%PDF-1.4 the same content'
+
+    def setUp(self):
+        self.storage = FakeStorage()
+        self.user = get_user_model().objects.create_user(email='teacher@example.com', password='x')
+        self.key = ('fileupload', blob_path(content_hash(self.data)))
+
+    def document(self):
+        return Document.objects.create(title='notes.pdf', user=self.user)
+
+    def blob(self):
+        return StoredBlob.objects.get(sha256=content_hash(self.data))
+
+    def test_attach_references_reserved_blob(self):
+        upload = BlobUpload(self.data, 'application/pdf', storage=self.storage)
+        self.assertFalse(upload.skipped)
+        self.assertEqual(self.blob().pending_uploads, 1)
+        self.assertIsNone(upload.wait())
+        document = self.document()
+        upload.attach(document)
+
+        blob = self.blob()
+        self.assertEqual((blob.ref_count, blob.pending_uploads), (1, 0))
+        self.assertEqual(document.storage_path, self.key[1])
+        self.assertIn(self.key, self.storage.objects)
+
+    def test_second_upload_of_stored_content_is_skipped(self):
+        first = BlobUpload(self.data, storage=self.storage)
+        first.wait()
+        first.attach(self.document())
+        self.storage.objects.clear()
+
+        second = BlobUpload(self.data, storage=self.storage)
+        self.assertTrue(second.skipped)
+        second.attach(self.document())
+        self.assertEqual(self.blob().ref_count, 2)
+        self.assertNotIn(self.key, self.storage.objects)
+
+    def test_discard_keeps_object_while_another_upload_is_pending(self):
+        kept = BlobUpload(self.data, storage=self.storage)
+        dropped = BlobUpload(self.data, storage=self.storage)
+        self.assertFalse(dropped.skipped)
+        self.assertEqual(self.blob().pending_uploads, 2)
+
+        dropped.wait()
+        dropped.discard()
+        self.assertIn(self.key, self.storage.objects)
+        self.assertEqual(self.blob().pending_uploads, 1)
+
+        kept.wait()
+        kept.attach(self.document())
+        blob = self.blob()
+        self.assertEqual((blob.ref_count, blob.pending_uploads), (1, 0))
+        self.assertIn(self.key, self.storage.objects)
+
+    def test_discard_of_last_reservation_removes_object_and_row(self):
+        upload = BlobUpload(self.data, storage=self.storage)
+        upload.wait()
+        upload.discard()
+        upload.discard()  # a second call does nothing
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertNotIn(self.key, self.storage.objects)
+
+    def test_discard_keeps_referenced_blob(self):
+        first = BlobUpload(self.data, storage=self.storage)
+        first.wait()
+        first.attach(self.document())
+
+        second = BlobUpload(self.data, storage=self.storage)
+        second.discard()
+        blob = self.blob()
+        self.assertEqual((blob.ref_count, blob.pending_uploads), (1, 0))
+        self.assertIn(self.key, self.storage.objects)
+
+    def test_failed_upload_does_not_leave_a_stored_row(self):
+        upload = BlobUpload(self.data, storage=FakeStorage(fail_uploads=True))
+        self.assertIsNotNone(upload.wait())
+        upload.discard()
+        self.assertFalse(StoredBlob.objects.exists())
+        # The next upload of the content is not skipped
+        self.assertFalse(BlobUpload(self.data, storage=self.storage).skipped)
+
+    def test_release_blobs_removes_blob_after_last_reference(self):
+        documents = []
+        for _ in range(2):
+            upload = BlobUpload(self.data, storage=self.storage)
+            upload.wait()
+            documents.append(self.document())
+            upload.attach(documents[-1])
+        blob_id = self.blob().pk
+
+        Document.objects.filter(pk=documents[0].pk).delete()
+        self.assertEqual(release_blobs([blob_id], storage=self.storage), 0)
+        self.assertEqual(self.blob().ref_count, 1)
+
+        Document.objects.filter(pk=documents[1].pk).delete()
+        self.assertEqual(release_blobs([blob_id, None], storage=self.storage), 1)
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertNotIn(self.key, self.storage.objects)
+
+    def test_collect_garbage_skips_blobs_with_pending_uploads(self):
+        upload = BlobUpload(self.data, storage=self.storage)
+        upload.wait()
+        self.assertEqual(collect_garbage(storage=self.storage), 0)
+        self.assertIn(self.key, self.storage.objects)
+
+        upload.attach(self.document())
+        self.assertEqual(collect_garbage(storage=self.storage), 0)
+
+    def test_collect_garbage_reconciles_counts_and_stale_reservations(self):
+        upload = BlobUpload(self.data, storage=self.storage)
+        upload.wait()
+        document = self.document()
+        upload.attach(document)
+        # Deleted without release_blobs(); the count is now stale
+        Document.objects.filter(pk=document.pk).delete()
+        StoredBlob.objects.update(pending_uploads=1, last_referenced_at='2000-01-01T00:00:00Z')
+
+        self.assertEqual(collect_garbage(storage=self.storage), 0)
+        self.assertEqual(collect_garbage(reconcile=True, storage=self.storage), 1)
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertNotIn(self.key, self.storage.objects)
+
+
+class QuestionIndexTests(TestCase):
+    def setUp(self):
+        self.index = QuestionIndex(
+            [{'question': 'Which gas do plants absorb?', 'correct_answer': 'Carbon dioxide'}], threshold=0.7
+        )
+
+    def test_paraphrase_is_duplicate(self):
+        candidate = {'question': 'What gas is absorbed by plants?', 'correct_answer': 'Carbon dioxide'}
+        self.assertEqual(self.index.find_duplicate(candidate), 'Which gas do plants absorb?')
+
+    def test_different_answer_is_not_duplicate(self):
+        candidate = {'question': 'What gas is absorbed by plants?', 'correct_answer': 'Oxygen'}
+        self.assertIsNone(self.index.find_duplicate(candidate))
+
+    def test_exact_text_is_duplicate(self):
+        self.assertIn('which GAS do plants  absorb?', self.index)
+
+    def test_questions_without_content_words_only_match_exactly(self):
+        index = QuestionIndex(['What is it?'], threshold=0.7)
+        self.assertIsNone(index.find_duplicate('Which is this?'))
+        self.assertIsNotNone(index.find_duplicate('what is it?'))
+
+        self.index.add('What is it?')
+        self.assertIsNone(self.index.find_duplicate('Which is this?'))
+        candidate = {'question': 'What gas is absorbed by plants?', 'correct_answer': 'Carbon dioxide'}
+        self.assertEqual(self.index.find_duplicate(candidate), 'Which gas do plants absorb?')
+
+
+class ChunkedUploadTests(TestCase):
+    part_size = chunked_upload.MIN_PART_SIZE
+
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.upload_dir, ignore_errors=True)
+        upload_settings = override_settings(CHUNKED_UPLOAD_DIR=self.upload_dir)
+        upload_settings.enable()
+        self.addCleanup(upload_settings.disable)
+
+        self.user = get_user_model().objects.create_user(email='teacher@example.com', password='x')
+        self.quiz = Quiz.objects.create(title='Cells', quiz_type='easy')
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+        # Three parts, the last one short
+        self.data = os.urandom(self.part_size * 2 + 1000)
+        response = self.client.post(reverse('quiz:chunked-upload-init', args=[self.quiz.pk]), {
+            'file_name': 'notes.pdf',
+            'size': len(self.data),
+            'part_size': self.part_size,
+            'sha256': hashlib.sha256(self.data).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_parts'], 3)
+        self.session = UploadSession.objects.get(pk=response.data['upload_id'])
+
+    def part(self, part_number):
+        start = (part_number - 1) * self.part_size
+        return self.data[start:start + self.part_size]
+
+    def put_part(self, part_number, body=None, checksum=None):
+        body = self.part(part_number) if body is None else body
+        return self.client.generic(
+            'PUT', reverse('quiz:chunked-upload-part', args=[self.quiz.pk, self.session.pk, part_number]), body,
+            content_type='application/octet-stream',
+            HTTP_X_CONTENT_SHA256=checksum or hashlib.sha256(body).hexdigest(),
+        )
+
+    def complete(self):
+        return self.client.post(reverse('quiz:chunked-upload-complete', args=[self.quiz.pk, self.session.pk]))
+
+    def test_parts_out_of_order_assemble_in_order(self):
+        for part_number in (3, 1, 2):
+            self.assertEqual(self.put_part(part_number).status_code, 200)
+        self.assertEqual(chunked_upload.missing_parts(self.session), [])
+
+        with chunked_upload.assemble(self.session) as assembled:
+            self.assertEqual(assembled.read(), self.data)
+
+    def test_checksum_mismatch_is_rejected(self):
+        response = self.put_part(1, checksum=hashlib.sha256(b'something else').hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Checksum mismatch', response.data['error'])
+        self.assertEqual(chunked_upload.received_parts(self.session), {})
+        # Only the verified part file is left in the session directory
+        self.assertEqual(self.put_part(1).status_code, 200)
+        self.assertEqual(os.listdir(chunked_upload.session_dir(self.session)), ['00001.part'])
+
+    def test_complete_with_missing_part(self):
+        self.put_part(1)
+        self.put_part(3)
+        response = self.complete()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['missing_parts'], [2])
+        self.session.refresh_from_db()
+        # Still open: the missing part can be sent and completion retried
+        self.assertEqual(self.session.status, 'uploading')
+
+    def test_repeated_part_replaces_earlier_copy(self):
+        self.assertEqual(self.put_part(2, body=os.urandom(self.part_size)).status_code, 200)
+        self.assertEqual(self.put_part(2).status_code, 200)
+        # A failed resend keeps the verified copy
+        self.assertEqual(self.put_part(2, checksum='0' * 64).status_code, 400)
+        self.put_part(1)
+        self.put_part(3)
+
+        self.assertEqual(chunked_upload.received_parts(self.session), {1: self.part_size, 2: self.part_size, 3: 1000})
+        with chunked_upload.assemble(self.session) as assembled:
+            self.assertEqual(assembled.read(), self.data)
+
+    def test_delete_removes_session_and_parts(self):
+        self.put_part(1)
+        directory = chunked_upload.session_dir(self.session)
+        self.assertTrue(os.path.isdir(directory))
+
+        response = self.client.delete(reverse('quiz:chunked-upload-detail', args=[self.quiz.pk, self.session.pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(os.path.exists(directory))
+        self.assertFalse(UploadSession.objects.filter(pk=self.session.pk).exists())
+
+
+class ContentPackingTests(TestCase):
+    def pages(self, *numbers, tokens=300):
+        pages = [(str(n), f"Page {n} explains photosynthesis.") for n in numbers]
+        analysis = {str(n): {'tokens': tokens} for n in numbers}
+        return pages, analysis
+
+    def test_pages_fit_one_prompt(self):
+        pages, analysis = self.pages(1, 2, 3, 4, 5, 6)
+        groups = pack_pages(pages, questions_per_call=5, analysis=analysis)
+        self.assertEqual(groups, [pages])
+
+    def test_calls_spread_pages_over_prompts(self):
+        pages, analysis = self.pages(1, 2, 3, 4, 5, 6)
+        groups = pack_pages(pages, questions_per_call=5, calls=3, analysis=analysis)
+        self.assertEqual(len(groups), 3)
+        self.assertEqual([len(group) for group in groups], [2, 2, 2])
+        self.assertCountEqual([page for group in groups for page in group], pages)
+
+    def test_pages_within_group_are_in_page_order(self):
+        pages, analysis = self.pages(10, 2, 9, 1)
+        groups = pack_pages(pages, questions_per_call=5, analysis=analysis)
+        self.assertEqual([page for page, _ in groups[0]], ['1', '2', '9', '10'])
+
+    def test_large_page_is_cut_at_sentence_boundary(self):
+        budget = content_budget(700, 1)
+        text = ' '.join(f"Sentence {i} is about the water cycle." for i in range(budget))
+        pages = [('1', text), ('2', 'A short page.')]
+        groups = pack_pages(pages, questions_per_call=1, analysis={'1': {'tokens': count_tokens(text)}})
+
+        cut = groups[0][0][1]
+        self.assertEqual(groups[0], [('1', cut)])
+        self.assertLessEqual(count_tokens(cut), budget - PAGE_HEADER_TOKENS)
+        self.assertTrue(cut.endswith('water cycle.'))
+        self.assertTrue(text.startswith(cut))
+        self.assertEqual(groups[1], [('2', 'A short page.')])
+
+    def test_fit_text_keeps_at_least_one_token(self):
+        text = 'Plants absorb carbon dioxide. ' * 200
+        self.assertLessEqual(count_tokens(fit_text(text, -PAGE_HEADER_TOKENS)), 1)
+        self.assertLessEqual(count_tokens(fit_text(text, 0)), 1)
+
+    @override_settings(GENERATION_CONTEXT_TOKENS=1000)
+    def test_zero_budget_does_not_keep_whole_page(self):
+        self.assertEqual(content_budget(700, 5), 0)
+        text = 'Plants absorb carbon dioxide. ' * 200
+        pages = [('1', text)]
+
+        groups = pack_pages(pages, questions_per_call=5)
+        self.assertLessEqual(count_tokens(groups[0][0][1]), 1)
+        selected = select_spread(pages, 0)
+        self.assertLessEqual(count_tokens(selected[0][1]), 1)
+
+
+class SectionExtractionTests(TestCase):
+    def docx(self):
+        namespace = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+        paragraphs = ''.join(f'<w:p><w:r><w:t>Paragraph {i} about cells.</w:t></w:r></w:p>' for i in range(30))
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as package:
+            package.writestr('word/document.xml', f'<w:document xmlns:w="{namespace}"><w:body>{paragraphs}</w:body></w:document>')
+        return buffer.getvalue()
+
+    def test_file_object_is_read_in_place(self):
+        data = self.docx()
+        upload = TemporaryUploadedFile('notes.docx', 'application/octet-stream', len(data), None)
+        self.addCleanup(upload.close)
+        upload.write(data)
+        upload.seek(10)  # extraction starts from the beginning wherever the file was left
+
+        text = extract_sections_text(upload, '.docx')
+        self.assertIn('Paragraph 29 about cells.', text)
+        self.assertEqual(text, extract_sections_text(data, '.docx'))
@@ -2,6 +2,7 @@
 import io
 import os
 import re
+import zipfile
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
@@ -9,16 +10,12 @@ logger = logging.getLogger(__name__)
 # Import necessary packages for different file types
 try:
     from pypdf import PdfReader
+    from .pdf_source import open_pdf_reader, page_count, get_page
     PDF_SUPPORT = True
 except ImportError:
     PDF_SUPPORT = False
 
-try:
-    import pytesseract
-    from PIL import Image
-    OCR_SUPPORT = True
-except ImportError:
-    OCR_SUPPORT = False
+from .ocr import image_ocr_available, needs_ocr, ocr_pdf_pages, ocr_image
 
 try:
     import pandas as pd
@@ -27,10 +24,10 @@ except ImportError:
     PANDAS_SUPPORT = False
 
 try:
-    import docx
-    DOCX_SUPPORT = True
+    import openpyxl
+    OPENPYXL_SUPPORT = True
 except ImportError:
-    DOCX_SUPPORT = False
+    OPENPYXL_SUPPORT = False
 
 def extract_text_from_pdf(document):
     """Legacy function for backward compatibility"""
@@ -67,7 +64,9 @@ def extract_text_from_pdf(document):
 
 def extract_text_from_file(file_obj, page_range_str: str = None, filename: str = None):
     """
-    Extract text from a file (PDF, TXT) with optional page range for PDFs.
+    Extract text from a file (PDF, TXT, DOCX, Excel) with optional page range.
+
+    For Word and Excel files the page range selects sections (see extract_sections_text).
 
     Args:
         file_obj: File-like object (e.g., from request.FILES)
@@ -125,6 +124,12 @@ def extract_text_from_file(file_obj, page_range_str: str = None, filename: str =
         # Handle TXT files
         elif file_extension == '.txt' or (hasattr(file_obj, 'name') and file_obj.name.lower().endswith('.txt')):
             return file_obj.read().decode('utf-8')
+
+        # Handle Word and Excel files, streamed section by section
+        elif (file_extension or os.path.splitext(getattr(file_obj, 'name', '') or '')[1].lower()) in SECTION_EXTENSIONS:
+            extension = file_extension or os.path.splitext(file_obj.name)[1].lower()
+            page_ranges = _parse_page_ranges_str(page_range_str) if page_range_str else None
+            return extract_sections_text(file_obj, extension, page_ranges)
             
         else:
             return f"[Error: Unsupported file type with extension '{file_extension}']"
@@ -132,12 +137,39 @@ def extract_text_from_file(file_obj, page_range_str: str = None, filename: str =
     except Exception as e:
         return f"[Error extracting text: {str(e)}]"
 
+def decompress_if_needed(content):
+    """
+    Return the original bytes of a file stored by quiz.utils.compress_file_if_needed.
+
+    Content that is not a single-member zip (including DOCX/XLSX, which are
+    zips with many members) is returned unchanged.
+    """
+    if not isinstance(content, (bytes, bytearray)) or content[:4] != b'PK\x03\x04':
+        return content
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            members = zf.infolist()
+            if len(members) != 1:
+                return content
+            return zf.read(members[0])
+    except zipfile.BadZipFile:
+        return content
+
+def _format_page_text(page_number, page_text):
+    """Wrap a page's text in the page boundary markers used to attribute questions to pages"""
+    return (
+        f"==================== PAGE {page_number} ====================\n"
+        f"{page_text}\n"
+        f"==================== END OF PAGE {page_number} ===================="
+        "\n"
+    )
+
 def _extract_text_from_pdf_content(file_content, page_ranges=None):
     """
     Extract text from PDF content, optionally from specific pages.
     
     Args:
-        file_content: Binary content of the PDF file
+        file_content: Binary content of the PDF file, a seekable file object or an open PdfReader
         page_ranges: Optional list of page ranges to extract. Format:
                      - [1, 5, 10] - Extract pages 1, 5, and 10 (1-indexed)
                      - [(1, 5), 10, (20, 30)] - Extract pages 1-5, 10, and 20-30
@@ -150,9 +182,13 @@ def _extract_text_from_pdf_content(file_content, page_ranges=None):
         return "[PDF support not available. Install PyPDF2]"
         
     try:
-        logger.info("Creating PDF reader from file content")
-        pdf = PdfReader(io.BytesIO(file_content))
-        total_pages = len(pdf.pages)
+        if isinstance(file_content, PdfReader):
+            pdf = file_content
+        else:
+            logger.info("Creating PDF reader from file content")
+            file_content = decompress_if_needed(file_content)
+            pdf = open_pdf_reader(file_content)
+        total_pages = page_count(pdf)
         logger.info(f"PDF has {total_pages} pages")
         text = ""
         
@@ -190,43 +226,39 @@ def _extract_text_from_pdf_content(file_content, page_ranges=None):
             if not pages_to_extract:
                 logger.warning("No valid pages to extract based on provided page ranges")
                 return "[No valid pages to extract based on provided page ranges]"
-            
-            # Extract text from selected pages
-            for page_num in pages_to_extract:
-                try:
-                    logger.info(f"Extracting text from page {page_num + 1}")
-                    page = pdf.pages[page_num]
-                    page_text = page.extract_text()
-                    if page_text:
-                        # Add clear page boundary markers
-                        text += f"==================== PAGE {page_num + 1} ====================\n"
-                        text += page_text + "\n"
-                        text += f"==================== END OF PAGE {page_num + 1} ====================\n\n"
-                        logger.info(f"Successfully extracted {len(page_text)} characters from page {page_num + 1}")
-                    else:
-                        logger.warning(f"No text extracted from page {page_num + 1}")
-                except Exception as e:
-                    logger.error(f"Error extracting text from page {page_num + 1}: {str(e)}")
-                    text += f"[Error extracting text from page {page_num + 1}: {str(e)}]\n"
         else:
             # Extract text from all pages (original behavior)
             logger.info(f"Extracting text from all {total_pages} pages")
-            for page_num in range(total_pages):
-                try:
-                    logger.info(f"Extracting text from page {page_num + 1}")
-                    page = pdf.pages[page_num]
-                    page_text = page.extract_text()
-                    if page_text:
-                        # Add page markers even when extracting all pages
-                        text += f"==================== PAGE {page_num + 1} ====================\n"
-                        text += page_text + "\n"
-                        text += f"==================== END OF PAGE {page_num + 1} ====================\n\n"
-                        logger.info(f"Successfully extracted {len(page_text)} characters from page {page_num + 1}")
-                    else:
-                        logger.warning(f"No text extracted from page {page_num + 1}")
-                except Exception as e:
-                    logger.error(f"Error extracting text from page {page_num + 1}: {str(e)}")
-                    text += f"[Error extracting text from page {page_num + 1}: {str(e)}]\n"
+            pages_to_extract = range(total_pages)
+
+        page_texts = {}
+        scanned_pages = []
+        for page_num in pages_to_extract:
+            try:
+                logger.info(f"Extracting text from page {page_num + 1}")
+                page_text = get_page(pdf, page_num).extract_text()
+                if needs_ocr(page_text):
+                    logger.warning(f"No text layer on page {page_num + 1}, queued for OCR")
+                    scanned_pages.append(page_num)
+                if page_text:
+                    page_texts[page_num] = page_text
+                    logger.info(f"Successfully extracted {len(page_text)} characters from page {page_num + 1}")
+            except Exception as e:
+                logger.error(f"Error extracting text from page {page_num + 1}: {str(e)}")
+                page_texts[page_num] = e
+
+        # Scanned pages have no text layer: OCR them (in parallel, cached by page content)
+        for page_num, ocr_text in ocr_pdf_pages(pdf, scanned_pages).items():
+            if len(ocr_text.strip()) > len((page_texts.get(page_num) or '').strip()):
+                page_texts[page_num] = ocr_text
+
+        for page_num in sorted(page_texts):
+            page_text = page_texts[page_num]
+            if isinstance(page_text, Exception):
+                text += f"[Error extracting text from page {page_num + 1}: {str(page_text)}]\n"
+            else:
+                # Add clear page boundary markers
+                text += _format_page_text(page_num + 1, page_text) + "\n"
         
         if not text.strip():
             logger.error("No text was extracted from any page")
@@ -256,68 +288,254 @@ def _extract_text_from_text_file(file_content):
 
 def _extract_text_from_image(file_content):
     """Extract text from image files using OCR"""
-    if not OCR_SUPPORT:
+    if not image_ocr_available():
         return "[OCR support not available. Install pytesseract and pillow]"
         
     try:
-        # Open image from binary content
-        image = Image.open(io.BytesIO(file_content))
-        
-        # Use pytesseract to extract text
-        text = pytesseract.image_to_string(image)
+        # OCR each frame (multi-page scans run in parallel), cached by content hash
+        text = ocr_image(file_content)
         
         return text.strip() or "[No text detected in image]"
     except Exception as e:
         logger.error(f"Error extracting text from image: {e}")
         return f"[Error extracting text from image: {str(e)}]"
 
-def _extract_text_from_docx(file_content):
+# Streaming DOCX/Excel extraction: documents are cut into page-like sections
+# (wrapped in the same PAGE markers as PDF pages) and reading stops as soon
+# as enough sections have been gathered, so large files are never fully loaded
+SECTION_EXTENSIONS = ('.docx', '.xlsx', '.xlsm', '.xls')
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_RUN_TEXT = {
+    f'{_W}t': lambda node: node.text or '',
+    f'{_W}tab': lambda node: '\t',
+    f'{_W}br': lambda node: '\n',
+}
+
+
+def _cap(text, limit):
+    return text if len(text) <= limit else text[:limit].rstrip() + '…'
+
+
+class _SectionBuilder:
+    """Accumulate lines into sections of at most section_chars characters"""
+
+    def __init__(self, section_chars, header=''):
+        self.section_chars = section_chars
+        self.header = header
+        self.lines = []
+        self.size = 0
+
+    def add(self, line):
+        """Add a line; returns the finished section when this line starts a new one"""
+        finished = None
+        if self.lines and self.size + len(line) > self.section_chars:
+            finished = self.flush()
+        if not self.lines and self.header:
+            self.lines.append(self.header)
+            self.size = len(self.header)
+        self.lines.append(line)
+        self.size += len(line) + 1
+        return finished
+
+    def flush(self):
+        section = '\n'.join(self.lines).strip()
+        self.lines = []
+        self.size = 0
+        return section or None
+
+
+def _seekable(file_content):
+    """A seekable binary file for bytes or a file object, rewound to the start; files are not read into memory."""
+    if isinstance(file_content, (bytes, bytearray)):
+        return io.BytesIO(file_content)
+    if not getattr(file_content, 'seekable', lambda: False)():
+        return io.BytesIO(file_content.read())
+    file_content.seek(0)
+    return file_content
+
+
+def iter_docx_sections(file_content, section_chars=None):
+    """
+    Yield the text of a Word document (bytes or a file object) as sections, in document order.
+
+    word/document.xml is parsed incrementally and each paragraph or table
+    row is discarded once its text is taken, so memory stays bounded by
+    the section size. Headings start a new section once the current one
+    is reasonably full; table rows are rendered as "cell | cell".
+    """
+    from xml.etree.ElementTree import iterparse
+
+    section_chars = section_chars or settings.EXTRACT_SECTION_CHARS
+    cell_chars = settings.EXTRACT_MAX_CELL_CHARS
+    builder = _SectionBuilder(section_chars)
+    table_depth = 0
+    row, cell = [], []
+
+    with zipfile.ZipFile(_seekable(file_content)) as package:
+        with package.open('word/document.xml') as document_xml:
+            for event, element in iterparse(document_xml, events=('start', 'end')):
+                tag = element.tag
+                if event == 'start':
+                    if tag == f'{_W}tbl':
+                        table_depth += 1
+                    continue
+
+                if tag == f'{_W}p':
+                    text = ''.join(_RUN_TEXT[node.tag](node) for node in element.iter() if node.tag in _RUN_TEXT).strip()
+                    if table_depth:
+                        if text:
+                            cell.append(text)
+                    elif text:
+                        style = element.find(f'{_W}pPr/{_W}pStyle')
+                        is_heading = style is not None and style.get(f'{_W}val', '').lower().startswith(('heading', 'title'))
+                        if is_heading and builder.size > section_chars // 4:
+                            finished = builder.flush()
+                            if finished:
+                                yield finished
+                        finished = builder.add(text)
+                        if finished:
+                            yield finished
+                    element.clear()
+                elif tag == f'{_W}tc' and table_depth == 1:
+                    row.append(_cap(' '.join(cell), cell_chars))
+                    cell = []
+                elif tag == f'{_W}tr' and table_depth == 1:
+                    # Merged cells repeat their text; keep one copy
+                    cells = [text for i, text in enumerate(row) if text and (i == 0 or text != row[i - 1])]
+                    if cells:
+                        finished = builder.add(' | '.join(cells))
+                        if finished:
+                            yield finished
+                    row = []
+                    element.clear()
+                elif tag == f'{_W}tbl':
+                    table_depth -= 1
+                    if not table_depth:
+                        element.clear()
+
+    finished = builder.flush()
+    if finished:
+        yield finished
+
+
+def iter_excel_sections(file_content, section_chars=None):
+    """
+    Yield the rows of a workbook (bytes or a file object) as sections, sheet by sheet.
+
+    Sheets are read row by row with openpyxl in read-only mode, so the
+    workbook is never loaded into DataFrames. Each section repeats the
+    sheet name and header row so it can be understood on its own. Legacy
+    .xls files, which openpyxl cannot read, fall back to pandas.
+    """
+    section_chars = section_chars or settings.EXTRACT_SECTION_CHARS
+    cell_chars = settings.EXTRACT_MAX_CELL_CHARS
+
+    def format_row(values):
+        return ' | '.join(_cap(str(value).strip(), cell_chars) for value in values if value is not None and str(value).strip())
+
+    try:
+        if not OPENPYXL_SUPPORT:
+            raise ImportError("openpyxl is not installed")
+        workbook = openpyxl.load_workbook(_seekable(file_content), read_only=True, data_only=True)
+    except Exception as e:
+        if not PANDAS_SUPPORT:
+            raise
+        logger.info(f"openpyxl could not open the workbook ({e}), reading it with pandas")
+        for sheet_name, df in pd.read_excel(_seekable(file_content), sheet_name=None, header=None).items():
+            builder = _SectionBuilder(section_chars, header=f"SHEET: {sheet_name}")
+            for values in df.itertuples(index=False):
+                line = format_row(value for value in values if not pd.isna(value))
+                if line:
+                    finished = builder.add(line)
+                    if finished:
+                        yield finished
+            finished = builder.flush()
+            if finished:
+                yield finished
+        return
+
+    try:
+        for sheet in workbook.worksheets:
+            builder = None
+            for values in sheet.iter_rows(values_only=True):
+                line = format_row(values)
+                if not line:
+                    continue
+                if builder is None:
+                    # First non-empty row: treat it as the header
+                    builder = _SectionBuilder(section_chars, header=f"SHEET: {sheet.title}\n{line}")
+                    continue
+                finished = builder.add(line)
+                if finished:
+                    yield finished
+            if builder is not None:
+                finished = builder.flush() if builder.lines else builder.header
+                if finished:
+                    yield finished
+    finally:
+        workbook.close()
+
+
+def extract_sections_text(file_content, extension, page_ranges=None, max_sections=None):
+    """
+    Extract a DOCX or Excel file as page-marked text, one "page" per section.
+
+    Args:
+        file_content: File bytes or a readable file object (read in place, not loaded into memory)
+        extension (str): File extension, one of SECTION_EXTENSIONS
+        page_ranges: Optional parsed page ranges (see _parse_page_ranges_str) selecting sections
+        max_sections (int): Stop reading once this many sections have been gathered
+
+    Returns:
+        str: Text with the same PAGE markers as PDF extraction
+    """
+    sections = iter_docx_sections(file_content) if extension == '.docx' else iter_excel_sections(file_content)
+
+    wanted = None
+    if page_ranges:
+        wanted = set()
+        for page_range in page_ranges:
+            if isinstance(page_range, (tuple, list)):
+                wanted.update(range(page_range[0], page_range[1] + 1))
+            else:
+                wanted.add(page_range)
+
+    max_chars = settings.EXTRACT_MAX_CHARS
+    text = ''
+    gathered = 0
+    for number, section in enumerate(sections, start=1):
+        if wanted is not None:
+            if number > max(wanted):
+                break
+            if number not in wanted:
+                continue
+        text += _format_page_text(number, section) + "\n"
+        gathered += 1
+        if max_sections and gathered >= max_sections:
+            logger.info(f"Gathered {gathered} sections, enough for the requested questions; stopping early")
+            break
+        if len(text) >= max_chars:
+            logger.info(f"Reached the {max_chars} character extraction cap after {gathered} sections")
+            break
+    return text.strip()
+
+
+def _extract_text_from_docx(file_content, max_sections=None):
     """Extract text from Word documents"""
-    if not DOCX_SUPPORT:
-        return "[DOCX support not available. Install python-docx]"
-        
     try:
-        # Save temporary file
-        temp_file = io.BytesIO(file_content)
-        
-        # Open with python-docx
-        doc = docx.Document(temp_file)
-        
-        # Extract text from paragraphs
-        text = "\n\n".join([paragraph.text for paragraph in doc.paragraphs if paragraph.text])
-        
-        # Extract text from tables
-        for table in doc.tables:
-            for row in table.rows:
-                text += "\n" + " | ".join([cell.text for cell in row.cells if cell.text]) + "\n"
-        
-        return text.strip() or "[No text content in document]"
+        return extract_sections_text(file_content, '.docx', max_sections=max_sections) or "[No text content in document]"
     except Exception as e:
         logger.error(f"Error extracting text from DOCX: {e}")
         return f"[Error extracting text from DOCX: {str(e)}]"
 
-def _extract_text_from_excel(file_content):
+def _extract_text_from_excel(file_content, max_sections=None):
     """Extract text from Excel files"""
-    if not PANDAS_SUPPORT:
-        return "[Excel support not available. Install pandas and openpyxl]"
+    if not (OPENPYXL_SUPPORT or PANDAS_SUPPORT):
+        return "[Excel support not available. Install openpyxl]"
         
     try:
-        # Use pandas to read Excel
-        excel_file = io.BytesIO(file_content)
-        
-        # Read all sheets
-        excel_data = pd.read_excel(excel_file, sheet_name=None)
-        
-        text = ""
-        
-        # Process each sheet
-        for sheet_name, df in excel_data.items():
-            text += f"===== SHEET: {sheet_name} =====\n\n"
-            
-            # Convert dataframe to string
-            text += df.to_string(index=False) + "\n\n"
-        
-        return text.strip() or "[No text content in Excel file]"
+        return extract_sections_text(file_content, '.xlsx', max_sections=max_sections) or "[No text content in Excel file]"
     except Exception as e:
         logger.error(f"Error extracting text from Excel: {e}")
         return f"[Error extracting text from Excel: {str(e)}]"
@@ -359,7 +577,7 @@ def extract_single_page_content(file_obj, page_number):
     Extract content from a specific single page of a PDF.
     
     Args:
-        file_obj: File-like object (e.g., from request.FILES)
+        file_obj: File-like object (e.g., from request.FILES or documents.pdf_source.open_storage_pdf)
         page_number: Single page number (1-indexed)
         
     Returns:
@@ -373,8 +591,8 @@ def extract_single_page_content(file_obj, page_number):
         # Reset file position
         file_obj.seek(0)
         
-        pdf_reader = PdfReader(file_obj)
-        total_pages = len(pdf_reader.pages)
+        pdf_reader = open_pdf_reader(file_obj)
+        total_pages = page_count(pdf_reader)
         
         # Validate page number
         if page_number < 1 or page_number > total_pages:
@@ -384,18 +602,22 @@ def extract_single_page_content(file_obj, page_number):
         # Convert to 0-indexed
         page_index = page_number - 1
         
-        # Extract text from the specific page
-        page = pdf_reader.pages[page_index]
+        # Extract text from the specific page, loading only that page
+        page = get_page(pdf_reader, page_index)
         page_text = page.extract_text()
         
+        if needs_ocr(page_text):
+            # Scanned page: fall back to OCR
+            ocr_text = ocr_pdf_pages(pdf_reader, [page_index]).get(page_index, '')
+            if len(ocr_text.strip()) > len((page_text or '').strip()):
+                page_text = ocr_text
+        
         if not page_text:
             logger.warning(f"No text found on page {page_number}")
             return f"[No text found on page {page_number}]"
         
         # Format with page markers for consistency
-        formatted_text = f"==================== PAGE {page_number} ====================\n"
-        formatted_text += page_text + "\n"
-        formatted_text += f"==================== END OF PAGE {page_number} ====================\n"
+        formatted_text = _format_page_text(page_number, page_text)
         
         logger.info(f"Successfully extracted {len(page_text)} characters from page {page_number}")
         return formatted_text
@@ -0,0 +1,3 @@
+"""
+Command modules for the quiz app.
+"""
@@ -0,0 +1,359 @@
+"""
+Management command to generate synthetic load-testing data.
+
+Creates departments, teachers (with department_ids), students per
+department/class/section, published quizzes with JSON question blobs and
+quiz attempts with realistic score distributions. Rows are inserted with
+bulk_create in batches from a seeded RNG, so the same options always produce
+the same dataset. Every generated row is tagged so --clear can remove it.
+
+Example usage:
+    python manage.py generate_synthetic_data --attempts 1000000
+    python manage.py generate_synthetic_data --clear
+"""
+
+import json
+import math
+import time
+import random
+import logging
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import User, UserProfile
+from departments.models import Department
+from quiz.models import Quiz, Question, QuizAttempt
+from students.models import Student
+from teacher.models import Teacher
+
+# Written to created_by on every generated row
+SYNTHETIC_MARKER = 'synthetic-data@loadtest.local'
+SYNTHETIC_EMAIL_DOMAIN = '@loadtest.local'
+
+QUESTION_TYPES = ["mcq", "fill", "truefalse", "oneline"]
+
+FILLER_WORDS = ("energy matter force motion cell atom reaction equation history river "
+                "economy climate poem grammar fraction angle circuit planet").split()
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create synthetic departments, teachers, students, quizzes and attempts for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departments', type=int, default=10, help='Number of departments')
+        parser.add_argument('--classes', type=int, default=4, help='Classes per department')
+        parser.add_argument('--sections', type=int, default=3, help='Sections per class')
+        parser.add_argument('--students-per-section', type=int, default=40, help='Students in each class/section')
+        parser.add_argument('--teachers', type=int, default=50, help='Number of teachers')
+        parser.add_argument('--quizzes', type=int, default=500, help='Number of published quizzes')
+        parser.add_argument('--questions-per-quiz', type=int, default=20, help='Questions in each quiz blob')
+        parser.add_argument('--question-size', type=int, default=200,
+                            help='Approximate characters of text per question')
+        parser.add_argument('--attempts', type=int, default=100000, help='Number of quiz attempts')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+        parser.add_argument('--password', default='loadtest123',
+                            help='Password for the generated teacher and student users')
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete previously generated data instead of creating more')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self._clear()
+            return
+
+        if Department.objects.filter(created_by=SYNTHETIC_MARKER).exists():
+            raise CommandError('Synthetic data already exists; run with --clear first')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = max(1, options['batch_size'])
+        self.password_hash = make_password(options['password'])
+        self.now = timezone.now()
+        started = time.monotonic()
+
+        try:
+            departments = self._create_departments(options['departments'])
+            groups = self._create_students(departments, options['classes'], options['sections'],
+                                           options['students_per_section'])
+            self._create_teachers(departments, options['teachers'], options['classes'], options['sections'])
+            quizzes = self._create_quizzes(departments, groups, options['quizzes'],
+                                           options['questions_per_quiz'], options['question_size'])
+            self._create_attempts(quizzes, groups, options['attempts'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error generating synthetic data: {e}'))
+            logging.error(f'Error generating synthetic data: {e}')
+            raise
+
+        self.stdout.write(self.style.SUCCESS(f'Synthetic data generated in {time.monotonic() - started:.1f}s'))
+        self.stdout.write(self.style.WARNING(
+            f"Generated users log in with password '{options['password']}'; remove them with --clear"
+        ))
+
+    def _bulk_create(self, model, objects, label):
+        """Insert objects in batches, reporting throughput."""
+        started = time.monotonic()
+        created = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+                elapsed = max(time.monotonic() - started, 1e-9)
+                self.stdout.write(f'  {label}: {created} ({created / elapsed:.0f} rows/sec)')
+        if batch:
+            model.objects.bulk_create(batch)
+            created += len(batch)
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(f'Created {created} {label} in {elapsed:.1f}s'))
+        return created
+
+    def _create_users(self, emails, role):
+        self._bulk_create(User, (
+            User(email=email, role=role, password=self.password_hash, is_active=True)
+            for email in emails
+        ), f'{role.lower()} users')
+        # bulk_create skips the post_save signal that normally creates profiles
+        user_ids = User.objects.filter(role=role, email__endswith=SYNTHETIC_EMAIL_DOMAIN).values_list('id', flat=True)
+        self._bulk_create(UserProfile, (UserProfile(user_id=user_id) for user_id in user_ids),
+                          f'{role.lower()} profiles')
+
+    def _create_departments(self, count):
+        self._bulk_create(Department, (
+            Department(
+                name=f'Synthetic Department {i + 1}',
+                code=f'SYN{i + 1:03d}',
+                class_name='',
+                created_by=SYNTHETIC_MARKER,
+                last_modified_by=SYNTHETIC_MARKER,
+            )
+            for i in range(count)
+        ), 'departments')
+        return list(Department.objects.filter(created_by=SYNTHETIC_MARKER).order_by('department_id'))
+
+    @staticmethod
+    def _class_names(classes):
+        return [str(6 + i) for i in range(classes)]
+
+    @staticmethod
+    def _section_names(sections):
+        return [chr(ord('A') + i) for i in range(sections)]
+
+    def _create_students(self, departments, classes, sections, per_section):
+        """Create students and return their ids grouped by (department_id, class, section)."""
+        rows = []
+        for department in departments:
+            for class_name in self._class_names(classes):
+                for section in self._section_names(sections):
+                    for _ in range(per_section):
+                        rows.append((department.department_id, class_name, section))
+
+        emails = [f'synthetic-student-{n}{SYNTHETIC_EMAIL_DOMAIN}' for n in range(1, len(rows) + 1)]
+        self._bulk_create(Student, (
+            Student(
+                register_number=f'SYN{n:08d}',
+                class_name=class_name,
+                section=section,
+                name=f'Student {n}',
+                email=email,
+                department_id=department_id,
+                is_verified=True,
+                created_by=SYNTHETIC_MARKER,
+                last_modified_by=SYNTHETIC_MARKER,
+            )
+            for n, ((department_id, class_name, section), email) in enumerate(zip(rows, emails), start=1)
+        ), 'students')
+        self._create_users(emails, User.Role.STUDENT)
+
+        groups = {}
+        students = Student.objects.filter(created_by=SYNTHETIC_MARKER).values_list(
+            'student_id', 'department_id', 'class_name', 'section'
+        )
+        for student_id, department_id, class_name, section in students.iterator(chunk_size=self.batch_size):
+            groups.setdefault((department_id, class_name, section), []).append(student_id)
+        return groups
+
+    def _create_teachers(self, departments, count, classes, sections):
+        department_ids = [d.department_id for d in departments]
+        class_names = self._class_names(classes)
+        section_names = self._section_names(sections)
+        emails = [f'synthetic-teacher-{n}{SYNTHETIC_EMAIL_DOMAIN}' for n in range(1, count + 1)]
+        self._bulk_create(Teacher, (
+            Teacher(
+                name=f'Teacher {n}',
+                email=email,
+                department_ids=self.rng.sample(department_ids, min(len(department_ids), self.rng.randint(1, 3))),
+                class_name=self.rng.choice(class_names),
+                section=self.rng.choice(section_names),
+                join_date=self.now - timedelta(days=self.rng.randint(30, 3000)),
+                created_by=SYNTHETIC_MARKER,
+                last_modified_by=SYNTHETIC_MARKER,
+            )
+            for n, email in enumerate(emails, start=1)
+        ), 'teachers')
+        self._create_users(emails, User.Role.TEACHER)
+
+    def _question_text(self, number, size):
+        words = []
+        length = 0
+        while length < size:
+            word = self.rng.choice(FILLER_WORDS)
+            words.append(word)
+            length += len(word) + 1
+        return f'Question {number}: ' + ' '.join(words) + '?'
+
+    def _question_blob(self, count, size):
+        questions = []
+        for number in range(1, count + 1):
+            question_type = QUESTION_TYPES[(number - 1) % len(QUESTION_TYPES)]
+            if question_type == 'mcq':
+                options = {letter: f'Option {letter} {self.rng.choice(FILLER_WORDS)}' for letter in 'ABCD'}
+                answer = options[self.rng.choice('ABCD')]
+            elif question_type == 'truefalse':
+                options = {}
+                answer = self.rng.choice(['True', 'False'])
+            else:
+                options = {}
+                answer = self.rng.choice(FILLER_WORDS)
+            questions.append({
+                'question': self._question_text(number, size),
+                'type': question_type,
+                'options': options,
+                'correct_answer': answer,
+                'explanation': f'Synthetic explanation for question {number}.',
+                'question_number': number,
+                'source_page': str(self.rng.randint(1, 200)),
+            })
+        return questions
+
+    def _create_quizzes(self, departments, groups, count, questions_per_quiz, question_size):
+        """Create quizzes and their question rows; return per-quiz grading data."""
+        group_keys = sorted(groups)
+        assignments = [self.rng.choice(group_keys) for _ in range(count)]
+        self._bulk_create(Quiz, (
+            Quiz(
+                title=f'Synthetic Quiz {n}',
+                description='Generated for load testing',
+                quiz_type={'easy': questions_per_quiz},
+                question_type='mixed',
+                no_of_questions=questions_per_quiz,
+                time_limit_minutes=self.rng.choice([15, 30, 45, 60]),
+                passing_score=math.ceil(questions_per_quiz * 0.4),
+                department_id=department_id,
+                class_name=class_name,
+                section=section,
+                quiz_date=self.now + timedelta(days=self.rng.randint(-120, 30)),
+                is_published=True,
+                published_at=self.now,
+                creator='Synthetic Teacher',
+                created_by=SYNTHETIC_MARKER,
+                last_modified_by=SYNTHETIC_MARKER,
+            )
+            for n, (department_id, class_name, section) in enumerate(assignments, start=1)
+        ), 'quizzes')
+        quizzes = list(
+            Quiz.objects.filter(created_by=SYNTHETIC_MARKER)
+            .order_by('quiz_id')
+            .values_list('quiz_id', 'department_id', 'class_name', 'section', 'passing_score')
+        )
+
+        blobs = {}
+
+        def questions():
+            for quiz_id, *_ in quizzes:
+                blob = self._question_blob(questions_per_quiz, question_size)
+                blobs[quiz_id] = blob
+                yield Question(
+                    quiz_id=quiz_id,
+                    question=json.dumps(blob),
+                    question_type='mixed',
+                    difficulty='easy',
+                    options={},
+                    correct_answer='',
+                    explanation='',
+                    created_by=SYNTHETIC_MARKER,
+                    last_modified_by=SYNTHETIC_MARKER,
+                )
+
+        self._bulk_create(Question, questions(), 'question rows')
+        question_ids = dict(
+            Question.objects.filter(created_by=SYNTHETIC_MARKER).values_list('quiz_id', 'question_id')
+        )
+
+        graded = []
+        for quiz_id, department_id, class_name, section, passing_score in quizzes:
+            question_id = question_ids[quiz_id]
+            # Prebuilt answer entries are shared between attempts; only the
+            # choice of right or wrong entry differs per attempt.
+            answers = []
+            for q in blobs.pop(quiz_id):
+                base = {
+                    'question_id': question_id,
+                    'question_number': q['question_number'],
+                    'question': q['question'],
+                    'question_type': q['type'],
+                    'options': q['options'],
+                    'correct_answer': q['correct_answer'],
+                    'explanation': q['explanation'],
+                }
+                answers.append((
+                    {**base, 'answer': q['correct_answer'], 'is_correct': True},
+                    {**base, 'answer': 'not sure', 'is_correct': False},
+                ))
+            graded.append({
+                'quiz_id': quiz_id,
+                'group': (department_id, class_name, section),
+                'passing_score': passing_score,
+                # Some quizzes are harder than others
+                'difficulty': self.rng.gauss(0.0, 0.6),
+                'answers': answers,
+            })
+        return graded
+
+    def _create_attempts(self, quizzes, groups, count):
+        rng = self.rng
+        ability = {}
+
+        def attempts():
+            for _ in range(count):
+                quiz = rng.choice(quizzes)
+                student_id = rng.choice(groups[quiz['group']])
+                if student_id not in ability:
+                    ability[student_id] = rng.gauss(0.5, 1.0)
+                # Logistic item response: stronger students and easier quizzes score higher
+                p_correct = 1.0 / (1.0 + math.exp(quiz['difficulty'] - ability[student_id]))
+                answers = [right if rng.random() < p_correct else wrong for right, wrong in quiz['answers']]
+                # A few students leave the last questions unanswered
+                if rng.random() < 0.1:
+                    answers = answers[:rng.randint(1, len(answers))]
+                score = sum(1 for a in answers if a['is_correct'])
+                yield QuizAttempt(
+                    student_id=student_id,
+                    quiz_id=quiz['quiz_id'],
+                    question_answer=answers,
+                    score=score,
+                    result='pass' if score >= quiz['passing_score'] else 'fail',
+                    created_by=SYNTHETIC_MARKER,
+                    last_modified_by=SYNTHETIC_MARKER,
+                )
+
+        self._bulk_create(QuizAttempt, attempts(), 'quiz attempts')
+
+    def _clear(self):
+        """Delete every row created by this command."""
+        with transaction.atomic():
+            quiz_ids = Quiz.objects.filter(created_by=SYNTHETIC_MARKER).values('quiz_id')
+            deleted = {
+                'attempts': QuizAttempt.objects.filter(quiz_id__in=quiz_ids).delete()[0],
+                'questions': Question.objects.filter(quiz_id__in=quiz_ids).delete()[0],
+                'quizzes': Quiz.objects.filter(created_by=SYNTHETIC_MARKER).delete()[0],
+                'students': Student.objects.filter(created_by=SYNTHETIC_MARKER).delete()[0],
+                'teachers': Teacher.objects.filter(created_by=SYNTHETIC_MARKER).delete()[0],
+                'departments': Department.objects.filter(created_by=SYNTHETIC_MARKER).delete()[0],
+                'users': User.objects.filter(email__endswith=SYNTHETIC_EMAIL_DOMAIN).delete()[0],
+            }
+        for label, count in deleted.items():
+            self.stdout.write(self.style.SUCCESS(f'Deleted {count} {label}'))
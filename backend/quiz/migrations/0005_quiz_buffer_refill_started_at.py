@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_quiz_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='buffer_refill_started_at',
+            field=models.DateTimeField(blank=True, help_text='When the running replacement question refill started', null=True),
+        ),
+    ]
@@ -55,6 +55,7 @@ class Quiz(models.Model):
     last_modified_at = models.DateTimeField(auto_now=True)
     last_modified_by = models.CharField(max_length=255, null=True, blank=True, help_text="Email of the user who last modified the quiz")
     metadata = models.JSONField(default=dict, blank=True, null=True, help_text="Additional metadata for the quiz")
+    buffer_refill_started_at = models.DateTimeField(null=True, blank=True, help_text="When the running replacement question refill started")
     
     class Meta:
         db_table = 'quizzes'  
@@ -0,0 +1,199 @@
+"""
+Ready replacement questions for each quiz.
+
+A quiz's questions beyond no_of_questions are its replacement buffer: the
+quiz detail view returns them as additional_question_list, and replacing a
+question removes it so the next buffered question takes its place. Once
+the extras generated with the quiz were used up, replacing meant waiting
+for a new LLM round-trip.
+
+After every replacement the buffer is checked; when it has fewer than
+REPLACEMENT_BUFFER_MIN questions it is topped up to REPLACEMENT_BUFFER_SIZE
+in a background thread: first from the question bank
+(documents.question_bank), then by generating the rest from the quiz's
+document. Replacing a question therefore never waits for the LLM.
+
+Replacements and refills of a quiz take turns on its Quiz row lock
+(lock_quiz), and buffered questions are appended to the question row the
+replace view edits (replaceable_row). A refill is claimed in the database
+(Quiz.buffer_refill_started_at), so at most one per quiz runs at a time
+across all processes.
+
+Example usage:
+    ensure_buffer(quiz, user_pk=request.user.pk)   # after removing a question
+"""
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from config.llm_usage import track_llm_usage
+from documents.models import Document
+from documents.question_bank import deposit_questions, draw_questions
+from documents.question_similarity import QuestionIndex, parse_question_items
+from .models import Quiz, Question
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.REPLACEMENT_BUFFER_WORKERS,
+                    thread_name_prefix='replacement-buffer',
+                )
+    return _executor
+
+
+def lock_quiz(quiz) -> Quiz:
+    """Lock and reload the quiz row; call inside transaction.atomic() before editing its questions."""
+    return Quiz.objects.select_for_update().get(pk=quiz.pk)
+
+
+def replaceable_row(quiz) -> Optional[Question]:
+    """The question row the replace view removes questions from (the quiz's first)."""
+    return Question.objects.filter(quiz=quiz).order_by('question_id').first()
+
+
+def quiz_questions(quiz) -> List[Dict]:
+    """All of the quiz's question dicts, in the order the detail view lists them."""
+    rows = Question.objects.filter(quiz=quiz).order_by('question_id').values_list('question', flat=True)
+    return [item for raw in rows for item in parse_question_items(raw)]
+
+
+def buffer_count(quiz) -> int:
+    return max(0, len(quiz_questions(quiz)) - (quiz.no_of_questions or 0))
+
+
+def ensure_buffer(quiz, user_pk=None) -> bool:
+    """
+    Start a background refill if the quiz's buffer is running low.
+
+    Returns:
+        bool: Whether a refill was started
+    """
+    if buffer_count(quiz) >= settings.REPLACEMENT_BUFFER_MIN or not claim_refill(quiz):
+        return False
+    _get_executor().submit(_refill_job, quiz.pk, user_pk)
+    logger.info(f"Refilling replacement questions for quiz {quiz.pk} in the background")
+    return True
+
+
+def claim_refill(quiz) -> bool:
+    """
+    Mark a refill of the quiz as started.
+
+    Returns:
+        bool: False if another refill started less than REPLACEMENT_BUFFER_REFILL_TIMEOUT ago
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        started = lock_quiz(quiz).buffer_refill_started_at
+        if started and now - started < timedelta(seconds=settings.REPLACEMENT_BUFFER_REFILL_TIMEOUT):
+            return False
+        Quiz.objects.filter(pk=quiz.pk).update(buffer_refill_started_at=now)
+    return True
+
+
+def release_refill(quiz_id):
+    Quiz.objects.filter(pk=quiz_id).update(buffer_refill_started_at=None)
+
+
+def _refill_job(quiz_id, user_pk):
+    try:
+        quiz = Quiz.objects.filter(pk=quiz_id, is_deleted=False).first()
+        if quiz:
+            refill_buffer(quiz, user_pk)
+    except Exception as e:
+        logger.error(f"Refilling replacement questions for quiz {quiz_id} failed: {e}", exc_info=True)
+    finally:
+        release_refill(quiz_id)
+        close_old_connections()
+
+
+def _source_document(quiz) -> Optional[Document]:
+    return Document.objects.filter(quiz=quiz, is_processed=True).exclude(
+        extracted_text__isnull=True
+    ).exclude(extracted_text='').order_by('-id').first()
+
+
+def refill_buffer(quiz, user_pk=None) -> int:
+    """
+    Top the quiz's buffer up to REPLACEMENT_BUFFER_SIZE questions.
+
+    Returns:
+        int: Number of questions added
+    """
+    from documents.services import DocumentProcessingService
+
+    needed = settings.REPLACEMENT_BUFFER_SIZE - buffer_count(quiz)
+    document = _source_document(quiz)
+    if needed <= 0 or document is None:
+        return 0
+
+    service = DocumentProcessingService()
+    question_types = service.QUESTION_TYPES_ROTATION if quiz.question_type == 'mixed' else [quiz.question_type]
+    difficulty = str(quiz.quiz_type)
+    content_hash = (document.metadata or {}).get('content_hash')
+    pages = list(((document.metadata or {}).get('page_analysis') or {}).keys())
+    index = QuestionIndex.for_quiz(quiz, document.storage_path)
+
+    new_questions = draw_questions(content_hash, pages, question_types, difficulty, needed, index)
+    shortfall = needed - len(new_questions)
+    if shortfall > 0:
+        with track_llm_usage(document=document, quiz=quiz, user=document.user):
+            generated = service.generate_questions_from_text(
+                document.extracted_text, quiz.question_type, quiz.quiz_type, shortfall,
+                existing_questions=index, tenant=user_pk or document.user_id,
+                # A cached response would repeat questions the quiz already has
+                use_cache=False
+            )
+        generated = generated[:shortfall]
+        by_type = {}
+        for q in generated:
+            question_type = quiz.question_type if len(question_types) == 1 else (q.get('question_type') or q.get('type'))
+            by_type.setdefault(question_type, []).append(q)
+        for question_type, batch in by_type.items():
+            deposit_questions(content_hash, batch, question_type, difficulty, pages)
+        new_questions.extend(generated)
+
+    added = append_questions(quiz, new_questions)
+    logger.info(f"Added {added} replacement questions to quiz {quiz.pk}")
+    return added
+
+
+def append_questions(quiz, questions: List[Dict]) -> int:
+    """Append questions, numbered after the quiz's highest question number, to the row replacements edit."""
+    if not questions:
+        return 0
+    with transaction.atomic():
+        lock_quiz(quiz)
+        row = replaceable_row(quiz)
+        if row is None:
+            return 0
+        numbers = [item.get('question_number') for item in quiz_questions(quiz)]
+        next_number = max([n for n in numbers if isinstance(n, int)], default=0) + 1
+        items = row.question
+        while isinstance(items, str):
+            items = json.loads(items)
+        if isinstance(items, dict):
+            items = [items]
+        for offset, question in enumerate(questions):
+            question['question_number'] = next_number + offset
+            items.append(question)
+        row.question = json.dumps(items)
+        row.save(update_fields=['question'])
+    return len(questions)
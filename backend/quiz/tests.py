@@ -0,0 +1,79 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import replacement_buffer
+from .models import Question, Quiz
+
+
+def make_questions(*numbers):
+    return [
+        {'question_number': n, 'type': 'mcq', 'question': f'Question {n}?', 'correct_answer': 'A'}
+        for n in numbers
+    ]
+
+
+class ReplacementBufferTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='teacher@example.com', password='x')
+        self.quiz = Quiz.objects.create(title='Cells', quiz_type='easy', no_of_questions=2)
+        # Two uploads: the replace view edits the first row
+        self.first = Question.objects.create(
+            quiz=self.quiz, question=json.dumps(make_questions(1, 2, 3)), question_type='mcq', difficulty='easy'
+        )
+        self.second = Question.objects.create(
+            quiz=self.quiz, question=json.dumps(make_questions(4, 5)), question_type='mcq', difficulty='easy'
+        )
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+        executor = mock.patch.object(replacement_buffer, '_get_executor')
+        self.executor = executor.start()
+        self.addCleanup(executor.stop)
+
+    def numbers(self, row):
+        row.refresh_from_db()
+        return [item['question_number'] for item in json.loads(row.question)]
+
+    def replace(self, question_number):
+        return self.client.post(
+            reverse('quiz:replace-quiz-question', args=[self.quiz.pk]), {'question_number': question_number},
+            format='json'
+        )
+
+    def test_refilled_questions_can_be_replaced(self):
+        added = replacement_buffer.append_questions(self.quiz, make_questions(None, None))
+        self.assertEqual(added, 2)
+        self.assertEqual(self.numbers(self.first), [1, 2, 3, 6, 7])
+        self.assertEqual(self.numbers(self.second), [4, 5])
+
+        response = self.replace(6)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.numbers(self.first), [1, 2, 3, 7])
+
+        response = self.replace(1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([q['question_number'] for q in response.data], [2, 3, 7])
+
+    def test_replace_starts_one_refill_per_quiz(self):
+        with self.settings(REPLACEMENT_BUFFER_MIN=10):
+            self.assertEqual(self.replace(1).status_code, 200)
+            self.assertEqual(self.replace(2).status_code, 200)
+        self.assertEqual(self.executor.return_value.submit.call_count, 1)
+        self.quiz.refresh_from_db()
+        self.assertIsNotNone(self.quiz.buffer_refill_started_at)
+
+    def test_refill_claim_is_released_and_expires(self):
+        self.assertTrue(replacement_buffer.claim_refill(self.quiz))
+        self.assertFalse(replacement_buffer.claim_refill(self.quiz))
+
+        replacement_buffer.release_refill(self.quiz.pk)
+        self.assertTrue(replacement_buffer.claim_refill(self.quiz))
+
+        Quiz.objects.filter(pk=self.quiz.pk).update(buffer_refill_started_at=timezone.now() - timedelta(hours=1))
+        self.assertTrue(replacement_buffer.claim_refill(self.quiz))
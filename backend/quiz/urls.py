@@ -17,6 +17,13 @@ urlpatterns = [
     
     # Dedicated file upload endpoint
     path('<int:quiz_id>/upload/', QuizFileUploadView.as_view(), name='quiz-file-upload'),
+    path('<int:quiz_id>/generation/<uuid:job_id>/events/', GenerationEventsView.as_view(), name='generation-events'),
+
+    # Resumable chunked upload: init, PUT parts, complete
+    path('<int:quiz_id>/upload/chunked/', ChunkedUploadInitView.as_view(), name='chunked-upload-init'),
+    path('<int:quiz_id>/upload/chunked/<uuid:upload_id>/', ChunkedUploadDetailView.as_view(), name='chunked-upload-detail'),
+    path('<int:quiz_id>/upload/chunked/<uuid:upload_id>/parts/<int:part_number>/', ChunkedUploadPartView.as_view(), name='chunked-upload-part'),
+    path('<int:quiz_id>/upload/chunked/<uuid:upload_id>/complete/', ChunkedUploadCompleteView.as_view(), name='chunked-upload-complete'),
     
     # Other quiz actions
     path('<int:quiz_id>/publish/', QuizPublishView.as_view(), name='quiz-publish'),
@@ -1,36 +1,143 @@
-import io
+import os
+import zlib
 import zipfile
-from openai import OpenAI
+import tempfile
 from django.conf import settings
+from rest_framework.exceptions import ValidationError
 from documents.models import DocumentVector
-import tiktoken
-
-def compress_file_if_needed(file_obj, max_size_mb=60):
-    file_size_mb = file_obj.size / (1024 * 1024)
-    if file_size_mb <= max_size_mb:
-        return file_obj, file_obj.name  # No compression neede  d
-
-    # Compress the file into a ZIP
-    compressed_io = io.BytesIO()
-    with zipfile.ZipFile(compressed_io, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr(file_obj.name, file_obj.read())
-    compressed_io.seek(0)
-
-    # Check compressed size
-    compressed_size_mb = len(compressed_io.getvalue()) / (1024 * 1024)
-    if compressed_size_mb > max_size_mb:
-        raise ValidationError(f"File is too large even after compression (>{max_size_mb} MB). Please upload a smaller file.")
-
-    # Create a pseudo file-like object for Supabase upload
-    compressed_file = compressed_io.read()
+from config.llm_gateway import get_llm_gateway
+from config.tokens import CHARS_PER_TOKEN, get_encoder
+
+# Formats that are already compressed internally; zipping them again gains almost nothing
+COMPRESSED_EXTENSIONS = {
+    '.pdf', '.zip', '.gz', '.bz2', '.xz', '.7z', '.rar',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp', '.epub',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.mp3', '.mp4', '.mov',
+}
+
+CHUNK_SIZE = 1024 * 1024
+PROBE_SAMPLES = 4
+PROBE_SAMPLE_SIZE = 64 * 1024
+# Compress only when the probe shrinks the samples below this fraction of their size
+MIN_COMPRESSION_RATIO = 0.9
+
+
+def _iter_chunks(file_obj, chunk_size=CHUNK_SIZE):
+    if hasattr(file_obj, 'chunks'):
+        yield from file_obj.chunks(chunk_size)
+        return
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def estimate_compression_ratio(file_obj, size):
+    """
+    Estimate how well a file compresses by deflating a few evenly spaced samples.
+
+    Args:
+        file_obj: Seekable file object
+        size (int): File size in bytes
+
+    Returns:
+        float: Compressed size / original size of the samples (1.0 = incompressible)
+    """
+    offsets = [int(size * i / PROBE_SAMPLES) for i in range(PROBE_SAMPLES)]
+    original = compressed = 0
+    for offset in offsets:
+        file_obj.seek(offset)
+        sample = file_obj.read(PROBE_SAMPLE_SIZE)
+        if not sample:
+            continue
+        original += len(sample)
+        compressed += len(zlib.compress(sample, 1))
+    file_obj.seek(0)
+    return compressed / original if original else 1.0
+
+
+def is_worth_compressing(file_obj):
+    """
+    Decide whether zipping a file is likely to make it meaningfully smaller.
+    """
+    extension = os.path.splitext(file_obj.name or '')[1].lower()
+    if extension in COMPRESSED_EXTENSIONS:
+        return False
+    return estimate_compression_ratio(file_obj, file_obj.size) < MIN_COMPRESSION_RATIO
+
+
+def check_storable(file_name, size, max_size_mb=None):
+    """
+    Reject an already-compressed file over the stored size limit before any of it is sent.
+
+    Files in other formats may still be zipped below the limit, which is
+    only known once the content has arrived.
+
+    Raises:
+        ValidationError: If the file cannot be stored
+    """
+    max_size_mb = max_size_mb or settings.STORED_FILE_MAX_SIZE_MB
+    extension = os.path.splitext(file_name or '')[1].lower()
+    if size > max_size_mb * 1024 * 1024 and extension in COMPRESSED_EXTENSIONS:
+        raise ValidationError(f"File is too large (>{max_size_mb} MB) and cannot be compressed further. Please upload a smaller file.")
+
+
+def compress_file_if_needed(file_obj, max_size_mb=None):
+    """
+    Zip an upload that exceeds max_size_mb, if it is compressible.
+
+    The file is streamed in chunks into a temporary file on disk, so memory
+    use stays bounded whatever the upload size, and the zip can be uploaded
+    from its path (documents.blob_storage.BlobUpload). Files that are already compressed
+    (PDF, Office, images, archives) or that fail the sampling probe are not
+    zipped; if they are too large they are rejected straight away.
+
+    Args:
+        file_obj: Uploaded file
+        max_size_mb (int): Size limit for the stored file (default STORED_FILE_MAX_SIZE_MB)
+
+    Returns:
+        tuple: (file object positioned at 0, stored file name); a new file is
+            deleted when it is closed
+
+    Raises:
+        ValidationError: If the file cannot be brought under max_size_mb
+    """
+    max_size_mb = max_size_mb or settings.STORED_FILE_MAX_SIZE_MB
+    max_bytes = max_size_mb * 1024 * 1024
+    if file_obj.size <= max_bytes:
+        return file_obj, file_obj.name
+
+    if not is_worth_compressing(file_obj):
+        raise ValidationError(f"File is too large (>{max_size_mb} MB) and cannot be compressed further. Please upload a smaller file.")
+
+    file_obj.seek(0)
+    compressed = tempfile.NamedTemporaryFile(suffix='.zip')
+    try:
+        with zipfile.ZipFile(compressed, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+            with zf.open(file_obj.name, mode='w', force_zip64=True) as entry:
+                for chunk in _iter_chunks(file_obj):
+                    entry.write(chunk)
+                    if compressed.tell() > max_bytes:
+                        raise ValidationError(f"File is too large even after compression (>{max_size_mb} MB). Please upload a smaller file.")
+        if compressed.tell() > max_bytes:
+            raise ValidationError(f"File is too large even after compression (>{max_size_mb} MB). Please upload a smaller file.")
+    except Exception:
+        compressed.close()
+        raise
+
+    compressed.seek(0)
     compressed_name = f"{file_obj.name.rsplit('.', 1)[0]}.zip"
-    return compressed_file, compressed_name
+    return compressed, compressed_name
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
 def chunk_text(text: str, max_tokens: int = 500) -> list[str]:
-    enc = tiktoken.encoding_for_model("gpt-4o")
-    tokens = enc.encode(text)
+    enc = get_encoder("gpt-4o")
+    if enc is None:
+        step = max_tokens * CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    tokens = enc.encode(text, disallowed_special=())
     chunks = []
     i = 0
     while i < len(tokens):
@@ -43,9 +150,10 @@ def embed_and_store(document, page_number, text: str):
     chunks = chunk_text(text)
     for idx, chunk in enumerate(chunks):
         try:
-            response = client.embeddings.create(
+            response = get_llm_gateway().create_embeddings(
                 input=chunk,
-                model="text-embedding-3-small"
+                model="text-embedding-3-small",
+                tenant=document.user_id
             )
             embedding = response.data[0].embedding
 
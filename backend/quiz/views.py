@@ -3,6 +3,8 @@ from rest_framework import status, permissions, generics, viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import ValidationError
 from django.core.files.storage import default_storage
 from django.conf import settings
 from django.shortcuts import get_object_or_404
@@ -13,7 +15,8 @@ from .serializers import QuizSerializer, QuizCreateSerializer, QuizUpdateSeriali
 import os
 from datetime import datetime
 from accounts.permissions import IsTeacherOrAdmin, IsOwnerOrAdminOrReadOnly
-from openai import OpenAI
+from config.llm_gateway import get_llm_gateway
+from config.llm_usage import track_llm_usage
 import pypdf as PyPDF2
 import io
 from rest_framework.decorators import action
@@ -36,32 +39,24 @@ from quiz.models import QuizAttempt
 from documents.models import Document, DocumentVector
 
 from documents.services import DocumentProcessingService
+from documents.question_similarity import QuestionIndex
 from django.utils.dateparse import parse_datetime
-from supabase import create_client, Client, ClientOptions
-import httpx
+from config.supabase import SupabaseStorage
+from documents.blob_storage import BlobUpload, release_blobs
+from documents import chunked_upload
+from documents.models import UploadSession
 from quiz.utils import *
-from openai import OpenAI
+from quiz.replacement_buffer import ensure_buffer, lock_quiz, replaceable_row
+from documents import generation_jobs
+from documents.models import GenerationJob
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
-supabase_url = os.environ.get('SUPABASE_URL')
-supabase_key = os.environ.get('SUPABASE_KEY')
 SUPABASE_BUCKET = "fileupload"  # Your bucket name
 
-def get_supabase_client():
-    return create_client(supabase_url, supabase_key)
-
-def chunk_text(text: str, max_tokens: int = 500) -> list[str]:
-    enc = tiktoken.encoding_for_model("gpt-4o")
-    tokens = enc.encode(text)
-    chunks, i = [], 0
-    while i < len(tokens):
-        chunk = tokens[i:i + max_tokens]
-        chunks.append(enc.decode(chunk))
-        i += max_tokens
-    return chunks
-
 class QuizFileUploadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
@@ -76,41 +71,99 @@ class QuizFileUploadView(APIView):
 
         uploaded_file = request.FILES.get('file')
         page_range = request.POST.get('page_range')  # Optional
+        # Bypass the LLM response cache when fresh questions are wanted
+        fresh = str(request.POST.get('fresh', '')).lower() in ('1', 'true', 'yes')
+
+        # Generate in the background and stream questions to GenerationEventsView as they come
+        stream = str(request.POST.get('stream', '')).lower() in ('1', 'true', 'yes')
 
         if not uploaded_file:
             return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            # ✅ Compress file if needed
-            compressed_file_data, new_file_name = compress_file_if_needed(uploaded_file)
-            compressed_file_data.seek(0)
+        if stream:
+            # The request's temporary file is gone once the response is sent; the job gets a copy on disk
+            file_copy = TemporaryUploadedFile(
+                uploaded_file.name, uploaded_file.content_type, uploaded_file.size, uploaded_file.charset
+            )
+            for chunk in uploaded_file.chunks():
+                file_copy.write(chunk)
+            file_copy.seek(0)
+            job = generation_jobs.create_job(quiz, request.user)
+            generation_jobs.start_job(job, _generate_for_job, quiz, request.user, file_copy, page_range, fresh)
+            return Response({
+                "job_id": str(job.pk),
+                "status": job.status,
+                "events_url": reverse('quiz:generation-events', kwargs={'quiz_id': quiz.quiz_id, 'job_id': job.pk}),
+            }, status=status.HTTP_202_ACCEPTED)
+
+        return process_uploaded_file(quiz, request.user, uploaded_file, page_range, fresh)
+
+
+def _generate_for_job(quiz, user, uploaded_file, page_range, fresh, progress):
+    """process_uploaded_file for a generation job; returns the response data with 'success'."""
+    with uploaded_file:
+        response = process_uploaded_file(quiz, user, uploaded_file, page_range, fresh, progress=progress)
+    return {**response.data, "success": response.status_code == status.HTTP_201_CREATED}
+
+
+def process_uploaded_file(quiz, user, uploaded_file, page_range=None, fresh=False, progress=None):
+    """
+    Store an uploaded file and generate questions from it.
 
-            # ✅ Upload to Supabase
-            file_path = f"{quiz.quiz_id}/{new_file_name}"
-            # Set a longer timeout for the upload
-            timeout = httpx.Timeout(60.0, connect=10.0)  # 60s read, 10s connect
-            client_options = ClientOptions(httpx_client=httpx.Client(timeout=timeout))
-            supa = create_client(supabase_url, supabase_key, options=client_options)
-            supa.storage.from_("fileupload").upload(file_path, compressed_file_data.read())
+    Shared by the single-request upload, the chunked upload completion and
+    streamed generation jobs (progress, see documents.generation_jobs).
 
-            # Reset pointer before processing
-            compressed_file_data.seek(0)
+    Returns:
+        Response: 201 with the processing summary, 400 or 500 on failure
+    """
+    quiz_id = quiz.quiz_id
+    try:
+        # ✅ Compress file if needed
+        compressed_file_data, new_file_name = compress_file_if_needed(uploaded_file)
+        try:
+            # Extraction reads the original file and storage gets the (possibly compressed) copy,
+            # both as files: uploads on disk are never loaded into memory as a whole
+            content_type = uploaded_file.content_type if compressed_file_data is uploaded_file else 'application/zip'
+
+            # ✅ Upload to Supabase in the background while the file is processed.
+            # Files are stored once per content hash; known content is not uploaded again.
+            upload = BlobUpload(compressed_file_data, content_type)
 
             # ✅ Process the file: extract text & generate questions
             service = DocumentProcessingService()
             processing_result = service.process_single_document(
-                uploaded_file=compressed_file_data,
+                uploaded_file=uploaded_file,
                 quiz=quiz,
-                user=request.user,
-                page_range=page_range  # This can be None or "3-5"
+                user=user,
+                page_range=page_range,  # This can be None or "3-5"
+                use_cache=not fresh,
+                file_data=uploaded_file,
+                progress=progress
             )
 
+            upload_error = upload.wait()
+            if upload_error is not None:
+                logger.error(f"❌ Supabase upload of {upload.path} failed: {str(upload_error)}")
+
             if not processing_result or not processing_result.get("success", False):
+                # Nothing references the stored file when processing failed
+                upload.discard()
                 return Response(
                     {"error": processing_result.get("error", "Failed to process file.")},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
 
+            document = Document.objects.filter(pk=processing_result.get("document_id")).first()
+            if document and upload_error is None:
+                upload.attach(document)
+            else:
+                upload.discard()
+                if document:
+                    # Questions were generated, but the source file is not in storage
+                    document.storage_path = ''
+                    document.metadata = {**(document.metadata or {}), 'storage_error': str(upload_error)}
+                    document.save(update_fields=['storage_path', 'metadata'])
+
             return Response({
                 "message": "File uploaded and processed successfully",
                 "quiz_id": quiz_id,
@@ -119,14 +172,191 @@ class QuizFileUploadView(APIView):
                 "pages_used": processing_result.get("page_ranges_used"),
                 "extracted_pages": processing_result.get("pages_processed"),
                 "questions_with_page_attribution": processing_result.get("questions_with_page_attribution"),
+                "file_stored": upload_error is None,
+                "upload_skipped": upload.skipped,
             }, status=status.HTTP_201_CREATED)
+        finally:
+            if compressed_file_data is not uploaded_file:
+                # Deletes the temporary zip; the upload has finished by now
+                compressed_file_data.close()
+
+    except ValidationError as e:
+        return Response({"error": e.detail[0] if isinstance(e.detail, list) else e.detail},
+                        status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"❌ Unexpected error during file upload: {str(e)}", exc_info=True)
+        return Response(
+            {"error": f"An unexpected error occurred: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
 
-        except Exception as e:
-            logger.error(f"❌ Unexpected error during file upload: {str(e)}", exc_info=True)
-            return Response(
-                {"error": f"An unexpected error occurred: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+def _validation_error_message(e):
+    return e.detail[0] if isinstance(e.detail, list) else e.detail
+
+
+def _upload_session_status(session):
+    parts = chunked_upload.received_parts(session)
+    return {
+        "upload_id": str(session.pk),
+        "status": session.status,
+        "file_name": session.file_name,
+        "size": session.size,
+        "part_size": session.part_size,
+        "total_parts": session.total_parts,
+        "received_parts": list(parts),
+        "received_bytes": sum(parts.values()),
+        "expires_at": session.expires_at,
+        "document_id": session.document_id,
+        "error": session.error,
+    }
+
+
+class ChunkedUploadInitView(APIView):
+    """Start a resumable upload; parts are then sent with ChunkedUploadPartView."""
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, FormParser]
+
+    def post(self, request, quiz_id):
+        quiz = Quiz.objects.filter(pk=quiz_id).first()
+        if not quiz:
+            return Response({"error": "Quiz not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        data = request.data
+        try:
+            session = chunked_upload.create_session(
+                quiz=quiz,
+                user=request.user,
+                file_name=data.get('file_name'),
+                size=data.get('size'),
+                content_type=data.get('content_type', ''),
+                part_size=data.get('part_size'),
+                sha256=data.get('sha256', ''),
+                options={
+                    'page_range': data.get('page_range'),
+                    'fresh': str(data.get('fresh', '')).lower() in ('1', 'true', 'yes'),
+                },
             )
+        except ValidationError as e:
+            return Response({"error": _validation_error_message(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(_upload_session_status(session), status=status.HTTP_201_CREATED)
+
+
+class ChunkedUploadDetailView(APIView):
+    """Report which parts have arrived (to resume an upload), or abort it."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, quiz_id, upload_id):
+        session = get_object_or_404(UploadSession, pk=upload_id, quiz_id=quiz_id, user=request.user)
+        return Response(_upload_session_status(session))
+
+    def delete(self, request, quiz_id, upload_id):
+        session = get_object_or_404(UploadSession, pk=upload_id, quiz_id=quiz_id, user=request.user)
+        if session.status == 'processing':
+            return Response({"error": "Upload is being processed"}, status=status.HTTP_409_CONFLICT)
+        chunked_upload.remove_session_files(session)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class GenerationEventsView(APIView):
+    """
+    Server-sent events for a streamed upload (QuizFileUploadView with stream=true).
+
+    Browsers' EventSource cannot send the Authorization header, so clients
+    read the stream with fetch. Reconnects resume after the Last-Event-ID
+    header or the last_event_id query parameter.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [generation_jobs.EventStreamRenderer, JSONRenderer]
+
+    def get(self, request, quiz_id, job_id):
+        job = get_object_or_404(GenerationJob, pk=job_id, quiz_id=quiz_id, user=request.user)
+        last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id') or 0
+        try:
+            last_event_id = int(last_event_id)
+        except (TypeError, ValueError):
+            last_event_id = 0
+
+        response = StreamingHttpResponse(
+            generation_jobs.event_stream(job.pk, last_event_id), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # nginx must not buffer the stream
+        return response
+
+
+class ChunkedUploadPartView(APIView):
+    """
+    Receive one part as the raw request body.
+
+    The body is streamed to disk, so parts are not limited by
+    DATA_UPLOAD_MAX_MEMORY_SIZE. Parts can be sent concurrently.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def put(self, request, quiz_id, upload_id, part_number):
+        session = get_object_or_404(UploadSession, pk=upload_id, quiz_id=quiz_id, user=request.user)
+        if session.status != 'uploading':
+            return Response({"error": f"Upload is {session.status}"}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            checksum = chunked_upload.parse_checksum(request.headers)
+            size = chunked_upload.write_part(session, part_number, request.stream, checksum)
+        except ValidationError as e:
+            return Response({"error": _validation_error_message(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"upload_id": str(session.pk), "part_number": part_number, "size": size})
+
+
+class ChunkedUploadCompleteView(APIView):
+    """Assemble the parts and process the file as QuizFileUploadView does."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, quiz_id, upload_id):
+        with transaction.atomic():
+            session = get_object_or_404(
+                UploadSession.objects.select_for_update(), pk=upload_id, quiz_id=quiz_id, user=request.user
+            )
+            if session.status != 'uploading':
+                return Response({"error": f"Upload is {session.status}"}, status=status.HTTP_409_CONFLICT)
+            session.status = 'processing'
+            session.save(update_fields=['status', 'updated_at'])
+
+        try:
+            uploaded_file = chunked_upload.assemble(session)
+        except ValidationError as e:
+            session.status = 'uploading'
+            session.error = str(_validation_error_message(e))
+            session.save(update_fields=['status', 'error', 'updated_at'])
+            return Response({"error": session.error, "missing_parts": chunked_upload.missing_parts(session)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        with uploaded_file:
+            response = process_uploaded_file(
+                session.quiz, request.user, uploaded_file,
+                page_range=session.options.get('page_range'),
+                fresh=session.options.get('fresh', False),
+            )
+
+        if response.status_code == status.HTTP_201_CREATED:
+            session.status = 'completed'
+            session.error = ''
+            session.document_id = response.data.get('document_id')
+            chunked_upload.remove_session_files(session)
+        elif response.status_code == status.HTTP_400_BAD_REQUEST:
+            # The file itself was rejected (e.g. too large to store); retrying cannot succeed
+            session.status = 'failed'
+            session.error = str(response.data.get('error', ''))
+            chunked_upload.remove_session_files(session)
+        else:
+            # Keep the parts so completion can be retried without sending them again
+            session.status = 'uploading'
+            session.error = str(response.data.get('error', ''))
+        session.save(update_fields=['status', 'error', 'document', 'updated_at'])
+        response.data['upload_id'] = str(session.pk)
+        return response
+
 
 class QuizListCreateView(generics.ListCreateAPIView):
     """API endpoint for listing and creating quizzes"""
@@ -717,15 +947,14 @@ class QuizRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         try:
             quiz = self.get_object()
 
-            # 1. Delete associated files from Supabase Storage
-            supabase = create_client(supabase_url, supabase_key)
-
+            # 1. Delete associated files from Supabase Storage. Files stored before
+            # deduplication are per quiz; shared blobs are released below.
             documents = Document.objects.filter(quiz=quiz)
-            file_paths_to_delete = [doc.storage_path for doc in documents if doc.storage_path]
+            blob_ids = [doc.blob_id for doc in documents if doc.blob_id]
+            file_paths_to_delete = [doc.storage_path for doc in documents if doc.storage_path and not doc.blob_id]
 
             if file_paths_to_delete:
-                for path in file_paths_to_delete:
-                    supabase.storage.from_(SUPABASE_BUCKET).remove([path])
+                SupabaseStorage().remove_file(SUPABASE_BUCKET, file_paths_to_delete)
 
             # 1. Hard delete all related Question entries
             questions_deleted, _ = Question.objects.filter(quiz=quiz).delete()
@@ -736,6 +965,9 @@ class QuizRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             # 3. Hard delete all related StudentQuizAttempt entries
             student_attempts_deleted, _ = documents.delete()
 
+            # Drop this quiz's references to shared files; unreferenced ones are removed
+            blobs_deleted = release_blobs(blob_ids)
+
             # 4. Soft delete the quiz
             quiz.is_deleted = True
             quiz.is_published = False
@@ -743,7 +975,7 @@ class QuizRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
 
             return Response({
                 "message": "Quiz soft-deleted successfully. Related data removed.",
-                "files_deleted": len(file_paths_to_delete),
+                "files_deleted": len(file_paths_to_delete) + blobs_deleted,
                 "questions_deleted": questions_deleted,
                 "quiz_attempts_deleted": attempts_deleted,
                 "student_quiz_attempts_deleted": student_attempts_deleted,
@@ -795,12 +1027,17 @@ class QuizQuestionGenerateView(APIView):
         # Step 4: Use the DocumentProcessingService to generate questions
         try:
             service = DocumentProcessingService()
-            generated_questions = service.generate_questions_from_text(
-                text=file_content,
-                question_type=question_type,
-                quiz_type=quiz_type,
-                num_questions=num_questions
-            )
+            with track_llm_usage(document=document, quiz=quiz, user=request.user):
+                generated_questions = service.generate_questions_from_text(
+                    text=file_content,
+                    question_type=question_type,
+                    quiz_type=quiz_type,
+                    num_questions=num_questions,
+                    existing_questions=QuestionIndex.for_quiz(quiz, document.storage_path),
+                    tenant=request.user.pk,
+                    # More questions for the same quiz: a cached response would repeat the last ones
+                    use_cache=False
+                )
 
             if not generated_questions:
                 return Response({"error": "Failed to generate questions. The document might not have enough content."}, status=status.HTTP_400_BAD_REQUEST)
@@ -1049,9 +1286,6 @@ class QuizQuestionGenerateFromPromptView(APIView):
         quiz.save()
 
         try:
-            # Initialize OpenAI client
-            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-            
             # Read the file content
             with open(abs_file_path, 'r', encoding='utf-8') as file:
                 file_content = file.read()
@@ -1076,15 +1310,18 @@ class QuizQuestionGenerateFromPromptView(APIView):
             }}
             """
             # Generate questions using OpenAI
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": "Generate questions based on the provided content and prompt."}
-                ],
-                temperature=0.7,
-                max_tokens=2000
-            )
+            with track_llm_usage(quiz=quiz, user=request.user):
+                response = get_llm_gateway().chat_completion(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": "Generate questions based on the provided content and prompt."}
+                    ],
+                    tenant=request.user.pk,
+                    use_cache=False,  # fresh questions on every request
+                    temperature=0.7,
+                    max_tokens=2000
+                )
             
             # Parse the generated questions
             generated_questions = json.loads(response.choices[0].message.content)
@@ -1379,7 +1616,12 @@ class QuizQuestionGenerateFromExistingFileView(APIView):
             
             # Generate questions using the document processing service
             service = DocumentProcessingService()
-            questions = service.generate_questions_from_text(content, question_type, quiz_type, num_questions)
+            with track_llm_usage(quiz=quiz, user=request.user):
+                questions = service.generate_questions_from_text(
+                    content, question_type, quiz_type, num_questions,
+                    existing_questions=QuestionIndex.for_quiz(quiz), tenant=request.user.pk,
+                    use_cache=False  # fresh questions on every request
+                )
             
             # Get file info
             file_info = quiz.uploadedfiles[-1]  # Get the last uploaded file
@@ -1446,7 +1688,12 @@ class QuizQuestionGenerateFromExistingFileView(APIView):
             
             # Generate questions using the document processing service
             service = DocumentProcessingService()
-            questions = service.generate_questions_from_text(content, question_type, quiz_type, num_questions)
+            with track_llm_usage(quiz=quiz, user=request.user):
+                questions = service.generate_questions_from_text(
+                    content, question_type, quiz_type, num_questions,
+                    existing_questions=QuestionIndex.for_quiz(quiz), tenant=request.user.pk,
+                    use_cache=False  # fresh questions on every request
+                )
             
             return Response({
                 "quiz_id": quiz.quiz_id,
@@ -1539,9 +1786,6 @@ class QuizQuestionGenerateByTypeView(APIView):
             )
 
         try:
-            # Initialize OpenAI client
-            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-            
             # Prepare the prompt based on quiz type and question type
             base_prompt = f"Generate {num_questions} {question_type} questions for a {quiz.quiz_type} level quiz. "
             base_prompt += self.QUESTION_TYPE_PROMPTS[question_type]
@@ -1550,15 +1794,18 @@ class QuizQuestionGenerateByTypeView(APIView):
                 base_prompt += f" Topic: {quiz.description}"
             
             # Generate questions using OpenAI
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a professional quiz question generator."},
-                    {"role": "user", "content": base_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
+            with track_llm_usage(quiz=quiz, user=request.user):
+                response = get_llm_gateway().chat_completion(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": "You are a professional quiz question generator."},
+                        {"role": "user", "content": base_prompt}
+                    ],
+                    tenant=request.user.pk,
+                    use_cache=False,  # fresh questions on every request
+                    temperature=0.7,
+                    max_tokens=1000
+                )
             
             # Process the generated questions
             generated_questions = response.choices[0].message.content
@@ -1889,64 +2136,71 @@ class ReplaceQuizQuestionAPIView(APIView):
         # Step 2: Get quiz
         quiz = get_object_or_404(Quiz, quiz_id=quiz_id, is_deleted=False)
 
-        # Step 3: Get the Question object OR load from quiz.questions
-        question_obj = Question.objects.filter(quiz=quiz).first()
-        question_list_source = 'model'
+        # Steps 3-6 hold the quiz row lock, so a background buffer refill cannot interleave
+        with transaction.atomic():
+            quiz = lock_quiz(quiz)
 
-        if not question_obj:
-            # Fallback to the quiz.questions field if it exists and is not empty
-            if quiz.questions and isinstance(quiz.questions, (str, list, dict)):
-                question_list_source = 'field'
-                raw_data = quiz.questions
+            # Step 3: Get the Question object OR load from quiz.questions
+            question_obj = replaceable_row(quiz)
+            question_list_source = 'model'
+
+            if not question_obj:
+                # Fallback to the quiz.questions field if it exists and is not empty
+                if quiz.questions and isinstance(quiz.questions, (str, list, dict)):
+                    question_list_source = 'field'
+                    raw_data = quiz.questions
+                else:
+                    return Response({"error": "No question data found for this quiz."}, status=404)
             else:
-                return Response({"error": "No question data found for this quiz."}, status=404)
-        else:
-            raw_data = question_obj.question
+                raw_data = question_obj.question
 
 
-        # Step 4: Safely parse the question list
-        try:
-            if isinstance(raw_data, str):
-                question_list = json.loads(raw_data)
-            else:
-                question_list = raw_data
+            # Step 4: Safely parse the question list
+            try:
+                if isinstance(raw_data, str):
+                    question_list = json.loads(raw_data)
+                else:
+                    question_list = raw_data
 
-            if isinstance(question_list, str): # Handle double-encoding
-                question_list = json.loads(question_list)
+                if isinstance(question_list, str): # Handle double-encoding
+                    question_list = json.loads(question_list)
 
-            if isinstance(question_list, dict): # Handle dict of questions
-                question_list = list(question_list.values())
+                if isinstance(question_list, dict): # Handle dict of questions
+                    question_list = list(question_list.values())
 
-        except (json.JSONDecodeError, TypeError) as e:
-            logger.error(f"Error decoding question data for quiz {quiz_id}: {e}")
-            return Response({"error": "Failed to decode question data."}, status=500)
+            except (json.JSONDecodeError, TypeError) as e:
+                logger.error(f"Error decoding question data for quiz {quiz_id}: {e}")
+                return Response({"error": "Failed to decode question data."}, status=500)
 
-        if not isinstance(question_list, list):
-            return Response({"error": "Stored question data is not in a valid list format."}, status=500)
+            if not isinstance(question_list, list):
+                return Response({"error": "Stored question data is not in a valid list format."}, status=500)
 
-        # Step 5: Remove the target question
-        original_len = len(question_list)
-        # Ensure consistent key access, checking for both 'question_number' and 'id'
-        question_list = [
-            q for q in question_list
-            if q and int(q.get("question_number", q.get("id", -1))) != question_number_to_remove
-        ]
+            # Step 5: Remove the target question
+            original_len = len(question_list)
+            # Ensure consistent key access, checking for both 'question_number' and 'id'
+            question_list = [
+                q for q in question_list
+                if q and int(q.get("question_number", q.get("id", -1))) != question_number_to_remove
+            ]
         
-        if len(question_list) == original_len:
-            return Response({
-                "error": f"Question number {question_number_to_remove} not found in the quiz."
-            }, status=404)
+            if len(question_list) == original_len:
+                return Response({
+                    "error": f"Question number {question_number_to_remove} not found in the quiz."
+                }, status=404)
 
-        # Step 6: Save updated list back to the correct source
-        updated_question_json = json.dumps(question_list)
+            # Step 6: Save updated list back to the correct source
+            updated_question_json = json.dumps(question_list)
 
-        if question_list_source == 'model':
-            question_obj.question = updated_question_json
-            question_obj.save()
+            if question_list_source == 'model':
+                question_obj.question = updated_question_json
+                question_obj.save()
         
-        # Always update the quiz.questions field for consistency
-        quiz.questions = updated_question_json
-        quiz.save()
+            # Always update the quiz.questions field for consistency
+            quiz.questions = updated_question_json
+            quiz.save()
+
+        # The next buffered question has moved up; top the buffer up in the background
+        ensure_buffer(quiz, user_pk=request.user.pk)
 
         return Response(question_list, status=200)
 